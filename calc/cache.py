@@ -0,0 +1,109 @@
+"""
+Composition keyed cache of computed share tables.
+
+The result of a calculation only depends on the sex of the deceased and the
+number of heirs of each type, the estate just scales the amounts. Families
+with the same shape share one engine run, the amounts are applied on the
+way out.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+from django.conf import settings
+
+from .engine import Engine, ShareTable, HEIR_TYPES
+from .table import get_lookup_table
+from .instrumentation import mark
+from .metrics import share_tables
+
+
+def composition_key(composition, deceased_sex, order=HEIR_TYPES):
+    """Canonical key of a composition, the deceased sex and a count per heir type"""
+    return (deceased_sex, tuple(composition.get(kind, 0) for kind in HEIR_TYPES), order)
+
+
+class ResultCache:
+    """Thread safe LRU cache with a time to live and hit/miss/eviction counters"""
+
+    def __init__(self, maxsize=4096, ttl=3600, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if self.ttl is None or expires > self.timer():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        expires = self.timer() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def __len__(self):
+        return len(self.entries)
+
+
+results = ResultCache(
+    maxsize=getattr(settings, 'CALC_RESULT_CACHE_SIZE', 4096),
+    ttl=getattr(settings, 'CALC_RESULT_CACHE_TTL', 3600),
+)
+
+
+def get_share_table(composition, deceased_sex, order=HEIR_TYPES, recorder=None):
+    """Return the share table of a composition from the lookup table, the cache or the engine, recorder gets the source and times the engine steps"""
+    lookup_table = get_lookup_table()
+    if lookup_table is not None:
+        table = lookup_table.lookup(composition, deceased_sex, order)
+        if table is not None:
+            share_tables.labels('lookup_table').inc()
+            mark(recorder, source='lookup_table')
+            return table
+    key = composition_key(composition, deceased_sex, order)
+    table = results.get(key)
+    if table is not None:
+        share_tables.labels('cache').inc()
+        mark(recorder, source='cache')
+        return table
+    share_tables.labels('engine').inc()
+    mark(recorder, source='engine')
+    engine = Engine.from_composition(composition, deceased_sex=deceased_sex, order=order).compute(recorder)
+    table = ShareTable(engine, engine.heirs)
+    results.set(key, table)
+    return table
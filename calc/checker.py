@@ -0,0 +1,162 @@
+"""
+Differential check of an engine against the ORM step pipeline.
+
+The reference is Calculation.compute_steps(), the Heir.get_quote() and
+friends pipeline, run on real rows inside a transaction that is rolled
+back. The candidate is any function with the signature of
+calc.engine.compute() returning an object with the CALC_FIELDS and a heirs
+list in HEIR_TYPES order, of single heirs or of groups with a count. Both outcomes are normalized the way they are
+stored (exact fractions for quotes, quantized decimal amounts, translated reasons) and
+compared field by field; a mismatch is shrunk to a minimal composition
+that still mismatches.
+"""
+from decimal import Decimal
+from fractions import Fraction
+from itertools import product
+import os
+import shutil
+
+import django
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+from django.utils.translation import gettext as _
+
+from .engine import CALC_FIELDS, HEIR_FIELDS, HEIR_SEX, HEIR_TYPES, is_valid
+from .table import SEXES
+from . import models
+
+
+def enumerate_compositions(bounds):
+    """Every valid (composition, deceased sex) with at most bounds[kind] heirs of each bounded type"""
+    kinds = [kind for kind in HEIR_TYPES if kind in bounds]
+    for deceased_sex in SEXES:
+        for counts in product(*(range(bounds[kind] + 1) for kind in kinds)):
+            composition = {kind: count for kind, count in zip(kinds, counts) if count}
+            if composition and is_valid(composition, deceased_sex):
+                yield composition, deceased_sex
+
+
+def get_error(e):
+    return f"{type(e).__name__}: {e}"
+
+
+def heir_outcome(heir, quote, amount):
+    outcome = {field: getattr(heir, field) for field in HEIR_FIELDS if field not in ('quote', 'amount', 'quote_reason')}
+    outcome.update(quote=quote, amount=amount, quote_reason=heir.quote_reason)
+    return outcome
+
+
+def reference(composition, deceased_sex, estate):
+    """Outcome of compute_steps() on rows created for the composition and rolled back afterwards"""
+    with transaction.atomic():
+        calc = models.Calculation.objects.create(name="check_engine")
+        models.Deceased.objects.create(first_name="Deceased", sex=deceased_sex, estate=estate, calc=calc)
+        for kind in HEIR_TYPES:
+            for i in range(composition.get(kind, 0)):
+                getattr(models, kind).objects.create(first_name=kind, sex=HEIR_SEX[kind], calc=calc)
+        try:
+            with transaction.atomic():
+                calc.compute_steps()
+        except Exception as e:
+            outcome = {'error': get_error(e)}
+        else:
+            calc = models.Calculation.objects.get(pk=calc.pk)
+            outcome = {
+                'calc': {field: getattr(calc, field) for field in CALC_FIELDS},
+                'heirs': [heir_outcome(heir, heir.quote, heir.amount) for heir in calc.heir_set.order_by('pk')],
+            }
+        transaction.set_rollback(True)
+    return outcome
+
+
+def candidate(engine, composition, deceased_sex, estate, order):
+    """Outcome of an engine function, normalized the way Heir.set_state() stores it"""
+    try:
+        result = engine(composition, deceased_sex, estate, order)
+    except Exception as e:
+        return {'error': get_error(e)}
+    heirs = []
+    for heir in result.heirs:
+        quote = Fraction(heir.quote)
+        amount = Decimal(heir.amount).quantize(models.AMOUNT_PLACES)
+        outcome = heir_outcome(heir, quote, amount)
+        outcome['quote_reason'] = _(outcome['quote_reason']) if outcome['quote_reason'] else ""
+        # a group stands for count heirs in a row
+        heirs.extend([outcome] * getattr(heir, 'count', 1))
+    return {'calc': {field: getattr(result, field) for field in CALC_FIELDS}, 'heirs': heirs}
+
+
+def diff(expected, actual):
+    """(field, expected, actual) of every difference between two outcomes"""
+    if 'error' in expected or 'error' in actual:
+        if expected.get('error', '').split(':')[0] == actual.get('error', '').split(':')[0]:
+            return []
+        return [('error', expected.get('error'), actual.get('error'))]
+    differences = [(field, expected['calc'][field], actual['calc'][field]) for field in CALC_FIELDS if expected['calc'][field] != actual['calc'][field]]
+    if len(expected['heirs']) != len(actual['heirs']):
+        return differences + [('heirs', len(expected['heirs']), len(actual['heirs']))]
+    for i, (expected_heir, actual_heir) in enumerate(zip(expected['heirs'], actual['heirs'])):
+        for field in expected_heir:
+            if expected_heir[field] != actual_heir[field]:
+                differences.append((f"heirs[{i}].{field}", expected_heir[field], actual_heir[field]))
+    return differences
+
+
+class Checker:
+    """Compare an engine with the ORM pipeline on compositions"""
+
+    def __init__(self, engine='calc.engine.compute', estate=1000000, order=HEIR_TYPES):
+        self.engine = import_string(engine) if isinstance(engine, str) else engine
+        self.estate = estate
+        self.order = order
+
+    def check(self, composition, deceased_sex):
+        """Differences between the reference and the engine for a composition, empty when they agree"""
+        return diff(
+            reference(composition, deceased_sex, self.estate),
+            candidate(self.engine, composition, deceased_sex, self.estate, self.order),
+        )
+
+    def shrink(self, composition, deceased_sex):
+        """Drop heirs one at a time while the composition still mismatches"""
+        while True:
+            for kind in HEIR_TYPES:
+                if kind not in composition:
+                    continue
+                smaller = dict(composition)
+                smaller[kind] -= 1
+                if not smaller[kind]:
+                    del smaller[kind]
+                if smaller and self.check(smaller, deceased_sex):
+                    composition = smaller
+                    break
+            else:
+                return composition
+
+    def check_chunk(self, chunk):
+        """Mismatches of a list of (composition, deceased sex), each with its minimal composition and its differences"""
+        mismatches = []
+        for composition, deceased_sex in chunk:
+            if self.check(composition, deceased_sex):
+                minimal = self.shrink(composition, deceased_sex)
+                mismatches.append({
+                    'composition': composition,
+                    'deceased_sex': deceased_sex,
+                    'minimal': minimal,
+                    'differences': [[field, str(expected), str(actual)] for field, expected, actual in self.check(minimal, deceased_sex)],
+                })
+        return mismatches
+
+
+def setup_worker(directory):
+    """Pool initializer, sqlite lets one writer at a time in so every worker rolls back in a copy of the database"""
+    django.setup()
+    if connection.vendor == 'sqlite':
+        name = os.path.join(directory, f"{os.getpid()}.sqlite3")
+        shutil.copyfile(connection.settings_dict['NAME'], name)
+        connection.settings_dict['NAME'] = name
+
+
+def check_chunk(chunk, engine, estate, order):
+    """Checker.check_chunk() for the worker processes, the engine is a dotted path"""
+    return Checker(engine, estate, order).check_chunk(chunk)
@@ -0,0 +1,1250 @@
+"""
+In-memory inheritance engine.
+
+Runs the same pipeline as the step methods on Calculation and Heir, but on
+plain Python objects, so a composition can be computed without a single
+query. Calculation.compute() loads the heirs, runs the engine and persists
+the result.
+"""
+from collections import Counter
+from fractions import Fraction
+from functools import reduce
+import math
+
+from django.utils.translation import gettext_noop
+
+
+# Heir types in model declaration order. Quotes are computed type by type and
+# a few rules look at the asaba state of types computed before them, so the
+# ORM path depends on the polymorphic_ctype_id order of the database, see
+# calc.models.heir_order().
+HEIR_TYPES = (
+    'Father',
+    'Mother',
+    'Husband',
+    'Wife',
+    'Daughter',
+    'Son',
+    'Brother',
+    'Sister',
+    'GrandFather',
+    'GrandMother',
+    'SonOfSon',
+    'DaughterOfSon',
+    'PaternalSister',
+    'PaternalBrother',
+    'MaternalSister',
+    'MaternalBrother',
+    'SonOfBrother',
+    'SonOfPaternalBrother',
+    'Uncle',
+    'PaternalUncle',
+    'SonOfUncle',
+    'SonOfPaternalUncle',
+)
+
+HEIR_SEX = {
+    'Father': 'M',
+    'Mother': 'F',
+    'Husband': 'M',
+    'Wife': 'F',
+    'Daughter': 'F',
+    'Son': 'M',
+    'Brother': 'M',
+    'Sister': 'F',
+    'GrandFather': 'M',
+    'GrandMother': 'F',
+    'SonOfSon': 'M',
+    'DaughterOfSon': 'F',
+    'PaternalSister': 'F',
+    'PaternalBrother': 'M',
+    'MaternalSister': 'F',
+    'MaternalBrother': 'M',
+    'SonOfBrother': 'M',
+    'SonOfPaternalBrother': 'M',
+    'Uncle': 'M',
+    'PaternalUncle': 'M',
+    'SonOfUncle': 'M',
+    'SonOfPaternalUncle': 'M',
+}
+
+# Most heirs of a type a deceased can leave, MAX_COUNT for the other types
+MAX_COUNTS = {
+    'Father': 1,
+    'Mother': 1,
+    'Husband': 1,
+    'Wife': 4,
+    'GrandFather': 1,
+}
+
+MAX_COUNT = 100
+
+SPOUSES = ('Husband', 'Wife')
+SIBLINGS = ('Brother', 'PaternalBrother', 'MaternalBrother', 'Sister', 'PaternalSister', 'MaternalSister')
+COMMON_QUOTE_SIBLINGS = ('MaternalSister', 'MaternalBrother', 'Sister', 'Brother')
+
+# Calculation fields set by the engine
+CALC_FIELDS = (
+    'shares',
+    'excess',
+    'shortage',
+    'residual_shares',
+    'correction',
+    'shortage_calc',
+    'shortage_calc_shares',
+    'shortage_union_shares',
+    'shares_excess',
+    'shares_corrected',
+    'shares_shorted',
+    'maternal_quote',
+    'common_quote',
+)
+
+# Heir fields set by the engine
+HEIR_FIELDS = (
+    'quote',
+    'shared_quote',
+    'share',
+    'corrected_share',
+    'shorted_share',
+    'amount',
+    'asaba',
+    'blocked',
+    'quote_reason',
+    'correction',
+    'shortage_calc',
+    'shortage_calc_share',
+    'shortage_union_share',
+)
+
+
+def lcm(a, b):
+    return abs(a*b) // math.gcd(a, b)
+
+
+def lcm_list(list):
+    return reduce(lambda a, b : lcm(a, b), list)
+
+
+def is_valid(composition, deceased_sex):
+    """Whether a deceased of this sex can leave this composition of heirs"""
+    if deceased_sex == 'M' and composition.get('Husband'):
+        return False
+    if deceased_sex == 'F' and composition.get('Wife'):
+        return False
+    return all(count <= MAX_COUNTS.get(kind, MAX_COUNT) for kind, count in composition.items())
+
+
+def parse_composition(data):
+    """Validate a composition given as {'deceased_sex': 'M', 'estate': 1000, 'heirs': {'Son': 2}}"""
+    if not isinstance(data, dict):
+        raise ValueError("expected an object with deceased_sex, estate and heirs")
+    deceased_sex = data.get('deceased_sex')
+    if deceased_sex not in ('M', 'F'):
+        raise ValueError("deceased_sex must be M or F")
+    estate = data.get('estate', 0)
+    # json.loads reads NaN, Infinity and 1e400 as floats
+    if isinstance(estate, bool) or not isinstance(estate, (int, float)) or not math.isfinite(estate) or estate < 0:
+        raise ValueError("estate must be a non negative number")
+    heirs = data.get('heirs')
+    if not isinstance(heirs, dict):
+        raise ValueError("heirs must map heir types to counts")
+    composition = {}
+    for kind, count in heirs.items():
+        if kind not in HEIR_SEX:
+            raise ValueError(f"unknown heir type: {kind}")
+        if isinstance(count, bool) or not isinstance(count, int) or count < 0:
+            raise ValueError(f"count of {kind} must be a non negative integer")
+        if count:
+            composition[kind] = count
+    if not composition:
+        raise ValueError("at least one heir is needed")
+    if not is_valid(composition, deceased_sex):
+        raise ValueError("this deceased can't leave these heirs")
+    return composition, deceased_sex, estate
+
+
+class HeirState:
+    """Computed state of a group of count heirs of the same type, shares and amounts are those of each of them"""
+    __slots__ = ('kind', 'sex', 'key', 'count') + HEIR_FIELDS
+
+    def __init__(self, kind, sex=None, key=None, count=1):
+        if kind not in HEIR_SEX:
+            raise ValueError(f"unknown heir type: {kind}")
+        self.kind = kind
+        self.sex = sex or HEIR_SEX[kind]
+        self.key = key
+        self.count = count
+        self.clear()
+
+    def clear(self):
+        self.quote = Fraction(0)
+        self.shared_quote = False
+        self.share = 0
+        self.corrected_share = 0
+        self.shorted_share = 0
+        self.amount = 0
+        self.asaba = False
+        self.blocked = False
+        self.quote_reason = ""
+        self.correction = False
+        self.shortage_calc = False
+        self.shortage_calc_share = 0
+        self.shortage_union_share = 0
+
+    def get_fraction(self):
+        return self.quote
+
+    def __repr__(self):
+        return f"<HeirState {self.count} {self.kind} {self.quote}>"
+
+
+class Engine:
+    """
+    Computes a composition of heirs in memory.
+
+    `heirs` is a list of HeirState in HEIR_TYPES order, one per heir type
+    holding the number of heirs of that type. Every heir of a type ends up
+    with the same state, so each step runs once per type and the cost
+    follows the number of types, not of people. `order` is the sequence of
+    heir types the quotes are computed in.
+    """
+
+    def __init__(self, heirs, deceased_sex='M', estate=0, order=HEIR_TYPES):
+        self.heirs = list(heirs)
+        self.deceased_sex = deceased_sex
+        self.estate = estate
+        self.order = {kind: index for index, kind in enumerate(order)}
+        self.counts = Counter()
+        for heir in self.heirs:
+            self.counts[heir.kind] += heir.count
+        self.clear()
+
+    @classmethod
+    def from_composition(cls, composition, deceased_sex='M', estate=0, order=HEIR_TYPES):
+        """Build an engine from a mapping of heir type to count"""
+        heirs = [HeirState(kind, count=composition[kind]) for kind in HEIR_TYPES if composition.get(kind, 0) > 0]
+        unknown = set(composition) - set(HEIR_TYPES)
+        if unknown:
+            raise ValueError(f"unknown heir type: {', '.join(sorted(unknown))}")
+        return cls(heirs, deceased_sex=deceased_sex, estate=estate, order=order)
+
+    def clear(self):
+        self.shares = 0
+        self.excess = False
+        self.shortage = False
+        self.residual_shares = 0
+        self.correction = False
+        self.shortage_calc = False
+        self.shortage_calc_shares = 0
+        self.shortage_union_shares = 0
+        self.shares_excess = 0
+        self.shares_corrected = 0
+        self.shares_shorted = 0
+        self.maternal_quote = False
+        self.common_quote = False
+        for heir in self.heirs:
+            heir.clear()
+
+    def compute(self, recorder=None):
+        """Run every step, each one as a phase of recorder when given (see calc.instrumentation)"""
+        for step in self.steps():
+            if recorder is None:
+                getattr(self, step)()
+            else:
+                with recorder.phase(step):
+                    getattr(self, step)()
+        return self
+
+    def steps(self):
+        """Names of the compute steps in order, the shortage_calc ones only once set_calc_shortage asked for them"""
+        yield from (
+            'clear',
+            'get_quotes',
+            'check_common_quote',
+            'set_calc_shares',
+            'set_shares',
+            'set_remainder',
+            'set_asaba_quotes',
+            'set_asaba_shares',
+            'get_shares',
+            'set_calc_excess',
+            'set_calc_shortage',
+            'set_shortage_shares',
+        )
+        if self.shortage_calc:
+            yield from (
+                'set_shortage_calc_shares',
+                'set_shortage_calc_share',
+                'set_shortage_union_shares',
+                'set_shortage_union_share',
+            )
+        yield 'set_calc_correction'
+        yield 'set_amounts'
+
+    # composition predicates, mirroring the has_* helpers on Calculation
+
+    def count(self, *kinds):
+        return sum(self.counts[kind] for kind in kinds)
+
+    def size(self, heirs):
+        """Number of people in a list of groups"""
+        return sum(heir.count for heir in heirs)
+
+    def has(self, *kinds):
+        return self.count(*kinds) > 0
+
+    def has_descendent(self):
+        return self.has('Son', 'Daughter', 'SonOfSon', 'DaughterOfSon')
+
+    def has_male_descendent(self):
+        return self.has('Son', 'SonOfSon')
+
+    def has_female_descendent(self):
+        return self.has('Daughter', 'DaughterOfSon')
+
+    def has_siblings(self):
+        return self.count(*SIBLINGS) > 1
+
+    def has_spouse(self):
+        return self.has(*SPOUSES)
+
+    def has_sonOfBrother(self):
+        # mirrors Calculation.has_sonOfBrother which looks up paternal brothers
+        return self.has('PaternalBrother')
+
+    def has_asaba(self, kind):
+        return any(heir.asaba for heir in self.heirs if heir.kind == kind)
+
+    def filter(self, *kinds, **fields):
+        heirs = self.heirs
+        if kinds:
+            heirs = [heir for heir in heirs if heir.kind in kinds]
+        for name, value in fields.items():
+            heirs = [heir for heir in heirs if getattr(heir, name) == value]
+        return heirs
+
+    def exclude(self, *kinds):
+        return [heir for heir in self.heirs if heir.kind not in kinds]
+
+    def first(self, heirs):
+        return heirs[0] if heirs else None
+
+    def groups(self, heirs, field):
+        """Count heirs by type and field, like values(ctype, field).annotate(Count)"""
+        groups = Counter()
+        for heir in heirs:
+            groups[(heir.kind, getattr(heir, field))] += heir.count
+        return groups
+
+    def get_fractions(self, heirs):
+        fractions = set()
+        for heir in heirs:
+            fractions.add(heir.get_fraction())
+        return fractions
+
+    # quotes
+
+    def get_quotes(self):
+        for heir in sorted(self.heirs, key=lambda heir: self.order[heir.kind]):
+            getattr(self, 'quote_' + heir.kind)(heir)
+
+    def quote_Father(self, heir):
+        if self.has_male_descendent():
+            heir.quote = Fraction(1, 6)
+            heir.quote_reason = gettext_noop("father gets 1/6 prescribed share because of male descendant")
+        elif self.has_female_descendent():
+            heir.quote = Fraction(1, 6)
+            heir.quote_reason = gettext_noop("father gets 1/6 plus remainder because of female descendant")
+        else:
+            heir.asaba = True
+            heir.quote_reason = gettext_noop("father gets the remainder because there is no descendant")
+
+    def quote_Mother(self, heir):
+        if self.has_descendent():
+            heir.quote = Fraction(1, 6)
+            heir.quote_reason = gettext_noop("mother gets 1/6 because of descendant")
+        elif self.has_siblings():
+            heir.quote = Fraction(1, 6)
+            heir.quote_reason = gettext_noop("mother gets 1/6 because of siblings")
+        elif self.has_spouse() and self.has('Father'):
+            if self.deceased_sex == 'M':
+                heir.quote = Fraction(1, 4)
+                heir.quote_reason = gettext_noop("mother gets 1/3 of the remainder which is 1/4.")
+            else:
+                heir.quote = Fraction(1, 6)
+                heir.quote_reason = gettext_noop("mother gets 1/3 of the remainder which is 1/6")
+        else:
+            heir.quote = Fraction(1, 3)
+            heir.quote_reason = gettext_noop("mother gets 1/3 because no descendant or siblings")
+
+    def quote_Husband(self, heir):
+        if self.has_descendent():
+            heir.quote = Fraction(1, 4)
+            heir.quote_reason = gettext_noop("husband gets 1/4 becuase of descendant")
+        else:
+            heir.quote = Fraction(1, 2)
+            heir.quote_reason = gettext_noop("husband gets 1/2 becuase there is no descendant")
+
+    def quote_Wife(self, heir):
+        if self.count('Wife') == 1:
+            if self.has_descendent():
+                heir.quote = Fraction(1, 8)
+                heir.quote_reason = gettext_noop("wife gets 1/8 becuase of descendant")
+            else:
+                heir.quote = Fraction(1, 4)
+                heir.quote_reason = gettext_noop("wife gets 1/4 becuase there is no descendant")
+        else:
+            if self.has_descendent():
+                heir.quote = Fraction(1, 8)
+                heir.quote_reason = gettext_noop("wives share the qoute of 1/8 becuase of descendant")
+            else:
+                heir.quote = Fraction(1, 4)
+                heir.quote_reason = gettext_noop("wives share the quote of 1/4 becuase there is no descendant")
+            heir.shared_quote = True
+
+    def quote_Daughter(self, heir):
+        if self.has('Son'):
+            heir.asaba = True
+            heir.quote_reason = gettext_noop("Daughter/s with Son/s share the residuary. The son will receive a share of two daughters.")
+            if self.count('Daughter') > 1:
+                heir.shared_quote = True
+        elif self.count('Daughter') == 1:
+            heir.quote = Fraction(1, 2)
+            heir.quote_reason = gettext_noop("Daughter gets 1/2 when she has no other sibling/s")
+        else:
+            heir.quote = Fraction(2, 3)
+            heir.shared_quote = True
+            heir.quote_reason = gettext_noop("Daughters share the quote of 2/3 when there is no son/s")
+
+    def quote_Son(self, heir):
+        if self.count('Son') > 1:
+            heir.shared_quote = True
+        heir.asaba = True
+        heir.quote_reason = gettext_noop("Son/s share the remainder or all amount if no other heir exist")
+
+    def quote_Brother(self, heir):
+        if self.count('Brother') > 1:
+            heir.shared_quote = True
+        if self.has_male_descendent():
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Bother/s are blocked by male descendant")
+        elif self.has('Father'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Brother/s are blocked by father")
+        elif self.has('GrandFather'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Brother/s are blocked by grandfather")
+        else:
+            heir.asaba = True
+            heir.quote_reason = gettext_noop("Brother/s share the remainder or all amount if no other heir exist")
+
+    def quote_Sister(self, heir):
+        sisters = self.count('Sister')
+        if sisters > 1:
+            heir.shared_quote = True
+        if self.has_male_descendent():
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Sister/s are blocked by male descendant")
+        elif self.has('Father'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Sister/s are blocked by father")
+        elif self.has('GrandFather'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Sister/s are blocked by grandfather")
+        elif self.has('Brother'):
+            heir.asaba = True
+            heir.quote_reason = gettext_noop("Sister/s with borther/s share the remainder or all the amount if no other heir exist. The brother will receive a share of two sisters")
+        elif self.has_female_descendent():
+            heir.asaba = True
+            heir.quote_reason = gettext_noop("Sister/s with female descendant share the remainder")
+        else:
+            if sisters == 1:
+                heir.quote = Fraction(1, 2)
+                heir.quote_reason = gettext_noop("Sister gets half when no father or son. ")
+            else:
+                heir.quote = Fraction(2, 3)
+                heir.quote_reason = gettext_noop("Sisters share 2/3 when no father or son.")
+
+    def quote_GrandFather(self, heir):
+        if self.has('Father'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Grandfather is blocked by father")
+        elif self.has_male_descendent():
+            heir.quote = Fraction(1, 6)
+            heir.quote_reason = gettext_noop("Grandfather gets 1/6 prescribed share because of male descendant")
+        elif self.has_female_descendent():
+            heir.quote = Fraction(1, 6)
+            heir.quote_reason = gettext_noop("Grandfather gets 1/6 plus remainder because of female descendant")
+        else:
+            heir.asaba = True
+            heir.quote_reason = gettext_noop("Grandfather gets the remainder because there is no descendant")
+
+    def quote_GrandMother(self, heir):
+        if self.has('Mother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Grandmother is blocked by mother")
+        else:
+            if self.count('GrandMother') > 1:
+                heir.shared_quote = True
+            heir.quote = Fraction(1, 6)
+            heir.quote_reason = gettext_noop("Grandmother gets 1/6 if no mother")
+
+    def quote_SonOfSon(self, heir):
+        if self.has('Son'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son of son is blocked by Son")
+        else:
+            if self.count('SonOfSon') > 1:
+                heir.shared_quote = True
+            heir.asaba = True
+            heir.quote_reason = gettext_noop("Son of son share the remainder or all amount if no other heir exist")
+
+    def quote_DaughterOfSon(self, heir):
+        daughtersOfSon = self.count('DaughterOfSon')
+        if daughtersOfSon > 1:
+            heir.shared_quote = True
+        if self.has('Son'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Daughter of son is blocked by son")
+        elif self.has('SonOfSon'):
+            heir.asaba = True
+            heir.quote_reason = gettext_noop("Daughter/s of son with Son/s of son share the residuary. The son of son will receive a share of two daughters of son.")
+        elif self.has('Daughter'):
+            if self.count('Daughter') == 1:
+                heir.quote = Fraction(1, 6)
+                heir.quote_reason = gettext_noop("Daughter of son get 1/6, with daughter")
+            else:
+                heir.blocked = True
+                heir.quote_reason = gettext_noop("Daughter/s of son are blocked by daugters")
+        elif daughtersOfSon == 1:
+            heir.quote = Fraction(1, 2)
+            heir.quote_reason = gettext_noop("Daughter of son gets 1/2 when she has no other sibling/s")
+        else:
+            heir.quote = Fraction(2, 3)
+            heir.quote_reason = gettext_noop("Daughters of son share the quote of 2/3 when there is no son/s of son")
+
+    def quote_PaternalSister(self, heir):
+        paternalSisters = self.count('PaternalSister')
+        if paternalSisters > 1:
+            heir.shared_quote = True
+        if self.has_male_descendent():
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal sister/s are blocked by male descendant")
+        elif self.has('Father'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal sister/s are blocked by father")
+        elif self.has('GrandFather'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal sister/s are blocked by grandfather")
+        elif self.has('Brother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal sister/s are blocked by borther/s")
+        elif self.has('PaternalBrother'):
+            heir.asaba = True
+            heir.quote_reason = gettext_noop("Paternal sister/s with paternal half borther/s share the remainder or all the amount if no other heir exist. The brother will receive a share of two sisters")
+        elif self.has('Sister'):
+            if self.count('Sister') == 1:
+                heir.quote = Fraction(1, 6)
+                heir.quote_reason = gettext_noop("Paternal sister/s get 1/6 with sister")
+            else:
+                heir.blocked = True
+                heir.quote_reason = gettext_noop("Paternal sisters/s are blocked by sisters")
+        elif self.has_female_descendent():
+            heir.asaba = True
+            heir.quote_reason = gettext_noop("Paternal sister/s with female descendant share the remainder")
+        elif paternalSisters == 1:
+            heir.quote = Fraction(1, 2)
+            heir.quote_reason = gettext_noop("Paternal sister gets half when no father or son. ")
+        else:
+            heir.quote = Fraction(2, 3)
+            heir.quote_reason = gettext_noop("Paternal sisters share 2/3 when no father or son.")
+
+    def quote_PaternalBrother(self, heir):
+        if self.count('PaternalBrother') > 1:
+            heir.shared_quote = True
+        if self.has_male_descendent():
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal brother/s are blocked by male descendant")
+        elif self.has('Father'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal brother/s are blocked by father")
+        elif self.has('GrandFather'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal brother/s are blocked by grandfather")
+        elif self.has('Brother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal brother/s are blocked by brothers")
+        elif self.has('Sister'):
+            if self.has_asaba('Sister'):
+                heir.blocked = True
+                heir.quote_reason = gettext_noop("Paternal brother/s are blocked by sisters")
+            else:
+                heir.asaba = True
+                heir.quote_reason = gettext_noop("Paternal brother/s share the remainder or all amount if no other heir exist")
+        else:
+            heir.asaba = True
+            heir.quote_reason = gettext_noop("Paternal brother/s share the remainder or all amount if no other heir exist")
+
+    def quote_MaternalSister(self, heir):
+        maternalSisters = self.count('MaternalSister')
+        if maternalSisters > 1:
+            heir.shared_quote = True
+        if self.has_descendent():
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Maternal sister/s are blocked by descendant")
+        elif self.has('Father'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Maternal sister/s are blocked by father")
+        elif self.has('GrandFather'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Maternal sister/s are blocked by grandfather")
+        elif self.has('MaternalBrother'):
+            self.maternal_quote = True
+            heir.shared_quote = True
+            heir.quote = Fraction(1, 3)
+            heir.quote_reason = gettext_noop("Maternal sister/s with maternal brother/s share 1/3")
+        elif maternalSisters == 1:
+            heir.quote = Fraction(1, 6)
+            heir.quote_reason = gettext_noop("Maternal sister get 1/6")
+        else:
+            heir.quote = Fraction(1, 3)
+            heir.quote_reason = gettext_noop("Maternal sisters share 1/3")
+
+    def quote_MaternalBrother(self, heir):
+        maternalBrothers = self.count('MaternalBrother')
+        if maternalBrothers > 1:
+            heir.shared_quote = True
+        if self.has_descendent():
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Maternal brother/s are blocked by descendant")
+        elif self.has('Father'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Maternal brother/s are blocked by father")
+        elif self.has('GrandFather'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Maternal brother/s are blocked by grandfather")
+        elif self.has('MaternalSister'):
+            self.maternal_quote = True
+            heir.shared_quote = True
+            heir.quote = Fraction(1, 3)
+            heir.quote_reason = gettext_noop("Maternal brother/s with maternal sister/s share 1/3")
+        elif maternalBrothers == 1:
+            heir.quote = Fraction(1, 6)
+            heir.quote_reason = gettext_noop("Maternal brother get 1/6")
+        else:
+            heir.quote = Fraction(1, 3)
+            heir.quote_reason = gettext_noop("Maternal brothers share 1/3")
+
+    def quote_SonOfBrother(self, heir):
+        if self.count('SonOfBrother') > 1:
+            heir.shared_quote = True
+        if self.has_male_descendent():
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Brother are blocked by male descendant")
+        elif self.has('Father'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Brother are blocked by father")
+        elif self.has('GrandFather'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Brother are blocked by grandfather")
+        elif self.has('Brother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Brother are blocked by brother/s")
+        elif self.has_asaba('Sister'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Brother are blocked by sisters")
+        elif self.has('PaternalBrother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Brother are blocked by paternal brother/s")
+        elif self.has_asaba('PaternalSister'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Brother are blocked by paternal sister/s")
+        else:
+            heir.asaba = True
+            heir.quote_reason = gettext_noop("Son/s of Brother share the remainder or all amount if no other heir exist")
+
+    def quote_SonOfPaternalBrother(self, heir):
+        if self.count('SonOfPaternalBrother') > 1:
+            heir.shared_quote = True
+        if self.has_male_descendent():
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Paternal Brother are blocked by male descendant")
+        elif self.has('Father'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Paternal Brother are blocked by father")
+        elif self.has('GrandFather'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Paternal Brother are blocked by grandfather")
+        elif self.has('Brother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Paternal Brother are blocked by brother/s")
+        elif self.has_asaba('Sister'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Paternal Brother are blocked by sisters")
+        elif self.has('PaternalBrother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Paternal Brother are blocked by paternal brother/s")
+        elif self.has_asaba('PaternalSister'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Paternal Brother are blocked by paternal sister/s")
+        elif self.has_sonOfBrother():
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Paternal Brother are blocked by sons of brother")
+        else:
+            heir.asaba = True
+            heir.quote_reason = gettext_noop("Son/s of Paternal Brother share the remainder or all amount if no other heir exist")
+
+    def quote_Uncle(self, heir):
+        if self.count('Uncle') > 1:
+            heir.shared_quote = True
+        if self.has_male_descendent():
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Uncle/s are blocked by male descendant")
+        elif self.has('Father'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Uncle/s are blocked by father")
+        elif self.has('GrandFather'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Uncle/s are blocked by grandfather")
+        elif self.has('Brother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Uncle/s are blocked by brother/s")
+        elif self.has_asaba('Sister'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Uncle/s are blocked by sisters")
+        elif self.has('PaternalBrother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Uncle/s are blocked by paternal brother/s")
+        elif self.has_asaba('PaternalSister'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Uncle/s are blocked by paternal sister/s")
+        elif self.has_sonOfBrother():
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Uncle/s are blocked by sons of brother")
+        elif self.has('SonOfPaternalBrother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Uncle/s are blocked by sons of paternal brother")
+        else:
+            heir.asaba = True
+            heir.quote_reason = gettext_noop("Uncle/s share the remainder or all amount if no other heir exist")
+
+    def quote_PaternalUncle(self, heir):
+        if self.count('PaternalUncle') > 1:
+            heir.shared_quote = True
+        if self.has_male_descendent():
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal Uncle/s are blocked by male descendant")
+        elif self.has('Father'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal Uncle/s are blocked by father")
+        elif self.has('GrandFather'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal Uncle/s are blocked by grandfather")
+        elif self.has('Brother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal Uncle/s are blocked by brother/s")
+        elif self.has_asaba('Sister'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal Uncle/s are blocked by sisters")
+        elif self.has('PaternalBrother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal Uncle/s are blocked by paternal brother/s")
+        elif self.has_asaba('PaternalSister'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal Uncle/s are blocked by paternal sister/s")
+        elif self.has_sonOfBrother():
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal Uncle/s are blocked by sons of brother")
+        elif self.has('SonOfPaternalBrother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal Uncle/s are blocked by sons of paternal brother")
+        elif self.has('Uncle'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Paternal Uncle/s are blocked by uncle/s")
+        else:
+            heir.asaba = True
+            heir.quote_reason = gettext_noop("Paternal Uncle/s share the remainder or all amount if no other heir exist")
+
+    def quote_SonOfUncle(self, heir):
+        if self.count('SonOfUncle') > 1:
+            heir.shared_quote = True
+        if self.has_male_descendent():
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of uncle are blocked by male descendant")
+        elif self.has('Father'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by father")
+        elif self.has('GrandFather'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by grandfather")
+        elif self.has('Brother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by brother/s")
+        elif self.has_asaba('Sister'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by sisters")
+        elif self.has('PaternalBrother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by paternal brother/s")
+        elif self.has_asaba('PaternalSister'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by paternal sister/s")
+        elif self.has_sonOfBrother():
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by sons of brother")
+        elif self.has('SonOfPaternalBrother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by sons of paternal brother")
+        elif self.has('Uncle'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by uncle/s")
+        elif self.has('PaternalUncle'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by paternal uncle/s")
+        else:
+            heir.asaba = True
+            heir.quote_reason = gettext_noop("Son/s of Uncle/s share the remainder or all amount if no other heir exist")
+
+    def quote_SonOfPaternalUncle(self, heir):
+        if self.count('SonOfPaternalUncle') > 1:
+            heir.shared_quote = True
+        if self.has_male_descendent():
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of paternal uncle are blocked by male descendant")
+        elif self.has('Father'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by father")
+        elif self.has('GrandFather'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by grandfather")
+        elif self.has('Brother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by brother/s")
+        elif self.has_asaba('Sister'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by sisters")
+        elif self.has('PaternalBrother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by paternal brother/s")
+        elif self.has_asaba('PaternalSister'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by paternal sister/s")
+        elif self.has_sonOfBrother():
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by sons of brother")
+        elif self.has('SonOfPaternalBrother'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by sons of paternal brother")
+        elif self.has('Uncle'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by uncle/s")
+        elif self.has('PaternalUncle'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by paternal uncle/s")
+        elif self.has('SonOfUncle'):
+            heir.blocked = True
+            heir.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by son/s of uncle/s")
+        else:
+            heir.asaba = True
+            heir.quote_reason = gettext_noop("Son/s of paternal Uncle/s share the remainder or all amount if no other heir exist")
+
+    # shares
+
+    def check_common_quote(self):
+        maternal = [heir for heir in self.filter('MaternalSister', 'MaternalBrother') if heir.quote > 0]
+        brothers = self.filter('Brother', asaba=True)
+        husband = [heir for heir in self.filter('Husband') if heir.quote > Fraction(1, 4)]
+        mother = [heir for heir in self.filter('Mother') if heir.quote > 0]
+        if self.size(maternal) > 1 and self.size(brothers) >= 1 and husband and mother:
+            self.common_quote = True
+
+    def set_calc_shares(self):
+        heirs = self.filter(blocked=False)
+        count = self.size(heirs)
+        #if all are asaba (agnates)
+        if self.size(self.filter(asaba=True)) == count:
+            males = self.size(self.filter(sex='M', blocked=False))
+            females = self.size(self.filter(sex='F', blocked=False))
+            #if all same gender
+            if males == count or females == count:
+                self.shares = count
+            else:
+                self.shares = males * 2 + females
+        else:
+            denom_list = []
+            for fraction in self.get_fractions(heirs):
+                denom_list.append(fraction.denominator)
+            self.shares = lcm_list(denom_list)
+        return self.shares
+
+    def get_shares(self):
+        shares = 0
+        #first get shares without asaba
+        for heir in self.filter(correction=False, asaba=False, blocked=False):
+            shares = shares + heir.share * heir.count
+        if self.correction == True:
+            for kind, share in self.groups(self.filter(correction=True, asaba=False), 'share'):
+                shares = shares + share
+        #if there is asaba with need for correction
+        asaba = self.first(self.filter(asaba=True, correction=True))
+        if asaba:
+            shares = shares + asaba.share
+        else:
+            for asaba in self.filter(asaba=True, correction=False):
+                shares = shares + asaba.share * asaba.count
+        if shares > self.shares:
+            if self.common_quote == False:
+                self.excess = True
+                self.shares_excess = shares
+                return self.shares_excess
+        return shares
+
+    def set_shares(self):
+        for heir in self.filter(blocked=False):
+            self.set_share(heir)
+
+    def set_share(self, heir):
+        if heir.quote != 0 and heir.asaba == False:
+            fraction = heir.get_fraction()
+            share = self.shares * fraction.numerator // fraction.denominator
+            if heir.shared_quote == True:
+                if self.maternal_quote == True:
+                    if self.common_quote == True:
+                        count = self.count(*COMMON_QUOTE_SIBLINGS)
+                    else:
+                        count = self.count('MaternalSister', 'MaternalBrother')
+                elif self.common_quote == True:
+                    count = self.count(*COMMON_QUOTE_SIBLINGS)
+                else:
+                    count = self.count(heir.kind)
+                if share % count == 0:
+                    heir.share = share // count
+                else:
+                    heir.correction = True
+                    self.correction = True
+                    heir.share = share
+            else:
+                heir.share = share
+            return heir.share
+        else:
+            return 0
+
+    def set_remainder(self):
+        if self.common_quote == False:
+            shares = self.get_shares()
+            self.residual_shares = self.shares - shares
+            return self.residual_shares
+
+    def set_asaba_quotes(self):
+        #check for asaba exclude father with quote
+        asaba = [heir for heir in self.filter(asaba=True) if not heir.quote > 0]
+        if asaba:
+            #check for residual_shares
+            if self.residual_shares > 0 or self.common_quote == True:
+                for heir in asaba:
+                    self.set_asaba_quote(heir)
+
+    def set_asaba_quote(self, heir):
+        remainder = self.residual_shares
+        shares = self.shares
+        if remainder > 0 and shares > 0:
+            if heir.quote == 0:
+                heir.quote = Fraction(remainder, shares)
+            else:
+                heir.quote = Fraction(remainder + heir.share, shares)
+        elif self.common_quote == True:
+            heir.quote = Fraction(1, 3)
+            heir.quote_reason = gettext_noop("Asaba with maternal siblings share 1/3")
+            heir.shared_quote = True
+
+    def set_asaba_shares(self):
+        if self.residual_shares > 0 or self.common_quote == True:
+            for heir in self.filter(blocked=False):
+                self.set_asaba_share(heir)
+
+    def set_asaba_share(self, heir):
+        if heir.asaba == True:
+            if self.common_quote == True:
+                fraction = heir.get_fraction()
+                share = self.shares * fraction.numerator // fraction.denominator
+                count = self.count(*COMMON_QUOTE_SIBLINGS)
+                if share % count == 0:
+                    heir.share = share // count
+                else:
+                    heir.correction = True
+                    self.correction = True
+                    heir.share = share
+            else:
+                remainder = self.residual_shares
+                asaba_count = self.size(self.filter(asaba=True))
+                if asaba_count == 1:
+                    heir.share = remainder
+                else:
+                    #check for correction
+                    males = self.size(self.filter(asaba=True, sex='M'))
+                    females = self.size(self.filter(asaba=True, sex='F'))
+                    if males == asaba_count or females == asaba_count:
+                        if remainder % asaba_count == 0:
+                            heir.share = remainder // asaba_count
+                        else:
+                            heir.share = remainder
+                            heir.correction = True
+                            self.correction = True
+                    elif remainder % (males*2+females) == 0:
+                        if heir.sex == "M":
+                            heir.share = remainder // (2 * males + females) * 2
+                        else:
+                            heir.share = remainder // (2 * males + females)
+                    else:
+                        heir.share = remainder
+                        heir.correction = True
+                        self.correction = True
+            return heir.share
+
+    def set_calc_excess(self):
+        shares = self.get_shares()
+        if shares > self.shares and self.common_quote == False:
+            self.excess = True
+            self.shares_excess = shares
+
+    # shortage (radd)
+
+    def set_calc_shortage(self):
+        shares = self.get_shares()
+        if self.shares > shares:
+            self.shortage = True
+            if self.has('Father') or self.has('GrandFather'):
+                self.shares_shorted = self.shares
+            elif self.has_spouse() == False:
+                self.shares_shorted = shares
+            else:
+                spouse = self.first(self.filter(*SPOUSES))
+                self.shares_shorted = spouse.get_fraction().denominator
+
+    def set_shortage_shares(self):
+        if self.shortage == True:
+            for kind in ('Father', 'GrandFather'):
+                if self.has(kind):
+                    heir = self.first(self.filter(kind))
+                    remainder = self.shares - self.get_shares()
+                    heir.shorted_share = heir.share + remainder
+                    for other in self.exclude(kind):
+                        other.shorted_share = other.share
+                    return
+            for spouse in self.filter(*SPOUSES):
+                spouse.shorted_share = spouse.get_fraction().numerator
+            for heir in self.exclude(*SPOUSES):
+                self.set_shortage_share(heir)
+
+    def set_shortage_share(self, heir):
+        if self.shortage == True:
+            if self.has_spouse():
+                spouse = self.first(self.filter(*SPOUSES))
+                remainder = self.shares_shorted - spouse.shorted_share
+                shorted_types = self.groups(self.exclude(*SPOUSES), 'share')
+                if len(shorted_types) == 1:
+                    if heir.shared_quote == True:
+                        count = self.count(heir.kind)
+                        if remainder % count == 0:
+                            heir.shorted_share = remainder // count
+                        else:
+                            heir.correction = True
+                            self.correction = True
+                            heir.shorted_share = remainder
+                    else:
+                        heir.shorted_share = remainder
+                elif len(shorted_types) > 1:
+                    heir.shorted_share = remainder
+                    heir.shortage_calc = True
+                    self.shortage_calc = True
+            else:
+                heir.shorted_share = heir.share
+        return heir.shorted_share
+
+    def set_shortage_calc_shares(self):
+        if self.shortage_calc == True:
+            denom_list = []
+            for fraction in self.get_fractions(self.exclude(*SPOUSES)):
+                denom_list.append(fraction.denominator)
+            self.shortage_calc_shares = lcm_list(denom_list)
+
+    def set_shortage_calc_share(self):
+        if self.shortage_calc == True:
+            for heir in self.exclude(*SPOUSES):
+                if heir.shortage_calc == True:
+                    fraction = heir.get_fraction()
+                    share = self.shortage_calc_shares * fraction.numerator // fraction.denominator
+                    if heir.shared_quote == True:
+                        count = self.count(heir.kind)
+                        if share % count == 0:
+                            heir.shortage_calc_share = share // count
+                        else:
+                            heir.correction = True
+                            self.correction = True
+                            heir.share = share
+                    else:
+                        heir.shortage_calc_share = share
+
+    def set_shortage_union_shares(self):
+        if self.shortage_calc == True:
+            heirs = self.exclude(*SPOUSES)
+            shorted_shares = 0
+            remainder = heirs[0].shorted_share
+            for heir in heirs:
+                shorted_shares = shorted_shares + heir.shortage_calc_share * heir.count
+            if shorted_shares % remainder == 0:
+                self.shortage_union_shares = self.shortage_calc_shares
+            else:
+                self.shortage_union_shares = shorted_shares * self.shares_shorted
+
+    def set_shortage_union_share(self):
+        if self.shortage_calc == True:
+            multiplier = self.shortage_union_shares // self.shares_shorted
+            for spouse in self.filter(*SPOUSES):
+                spouse.shortage_union_share = spouse.shorted_share * multiplier
+            for heir in self.exclude(*SPOUSES):
+                heir.shortage_union_share = heir.shortage_calc_share * heir.shorted_share
+
+    # correction (tashih)
+
+    def correction_factors(self, groups, factors):
+        for (kind, quote), count in groups.items():
+            heir_share = quote.numerator
+            if heir_share != 0:
+                if heir_share % count == 0:
+                    factors.add(math.gcd(count, heir_share))
+                else:
+                    factors.add(count)
+        return factors
+
+    def set_calc_correction(self):
+        if self.correction == True:
+            if self.excess == True:
+                shares = self.shares_excess
+            elif self.shortage == True:
+                shares = self.shares_shorted
+            else:
+                shares = self.shares
+            corrections = self.filter(correction=True)
+            correction_set = self.groups(corrections, 'quote')
+            asaba_set = self.groups(self.filter(asaba=True, correction=True), 'quote')
+            if self.common_quote == True or len(correction_set) == 1:
+                heir_share = corrections[0].share
+                count = self.size(corrections)
+                if count % heir_share == 0:
+                    self.shares_corrected = math.gcd(count, heir_share) * shares
+                else:
+                    self.shares_corrected = count * shares
+            elif len(asaba_set) == 2:
+                factors = set()
+                males = self.size(self.filter(asaba=True, sex='M'))
+                females = self.size(self.filter(asaba=True, sex='F'))
+                asaba_count = males * 2 + females
+                asaba_share = self.filter(asaba=True)[0].share
+                if asaba_share != 0:
+                    if asaba_share % asaba_count == 0:
+                        factors.add(math.gcd(asaba_count, asaba_share))
+                    else:
+                        factors.add(asaba_count)
+                self.correction_factors(self.groups(self.filter(correction=True, asaba=False), 'quote'), factors)
+                self.shares_corrected = lcm_list(factors) * shares
+            else:
+                factors = self.correction_factors(correction_set, set())
+                self.shares_corrected = lcm_list(factors) * shares
+            self.set_corrected_shares()
+            return self.shares_corrected
+
+    def set_corrected_shares(self):
+        if self.correction == True and self.shares_corrected != 0:
+            correction_set = self.groups(self.filter(correction=True), 'quote')
+            asaba_set = self.groups(self.filter(asaba=True), 'quote')
+            if self.excess == True:
+                multiplier = self.shares_corrected // self.shares_excess
+            elif self.shortage == True:
+                multiplier = self.shares_corrected // self.shares_shorted
+            else:
+                multiplier = self.shares_corrected // self.shares
+            males = self.size(self.filter(asaba=True, sex='M'))
+            females = self.size(self.filter(asaba=True, sex='F'))
+            for heir in self.filter(blocked=False):
+                share = heir.shorted_share if self.shortage == True and self.excess == False else heir.share
+                if self.common_quote == True:
+                    heir.corrected_share = share
+                elif len(correction_set) == 1:
+                    if heir.shared_quote == True:
+                        heir.corrected_share = share
+                    else:
+                        heir.corrected_share = share * multiplier
+                elif heir.asaba == True and len(asaba_set) == 2:
+                    if heir.sex == "M":
+                        heir.corrected_share = share * multiplier // (2 * males + females) * 2
+                    else:
+                        heir.corrected_share = share * multiplier // (2 * males + females)
+                else:
+                    if heir.shared_quote == True:
+                        heir.corrected_share = share * multiplier // self.count(heir.kind)
+                    else:
+                        heir.corrected_share = share * multiplier
+
+    # amounts
+
+    def set_amounts(self, estate=None):
+        if estate is None:
+            estate = self.estate
+        for heir in self.filter(blocked=False):
+            heir.amount = get_amount(self, heir, estate)
+
+
+def get_amount(calc, heir, estate):
+    """Amount of the estate an unblocked heir gets, calc is anything holding the CALC_FIELDS"""
+    if calc.correction == False:
+        if calc.excess == True:
+            return estate / calc.shares_excess * heir.share
+        elif calc.shortage == True:
+            if calc.shortage_calc == True:
+                return estate / calc.shortage_union_shares * heir.shortage_union_share
+            else:
+                return estate / calc.shares_shorted * heir.shorted_share
+        else:
+            return estate / calc.shares * heir.share
+    else:
+        return estate / calc.shares_corrected * heir.corrected_share
+
+
+class ShareTable:
+    """Estate independent result of a composition, one row per heir type"""
+
+    def __init__(self, calc, heirs):
+        for field in CALC_FIELDS:
+            setattr(self, field, getattr(calc, field))
+        # heirs of the same type always end up with the same state
+        self.rows = {}
+        for heir in heirs:
+            self.rows.setdefault(heir.kind, heir)
+
+    def amount(self, kind, estate):
+        row = self.rows[kind]
+        if row.blocked:
+            return 0
+        return get_amount(self, row, estate)
+
+    def as_dict(self, composition, estate):
+        """Plain data of the result for a composition and estate, amounts are per heir and reasons untranslated"""
+        heirs = []
+        for kind in HEIR_TYPES:
+            if composition.get(kind):
+                row = self.rows[kind]
+                heir = {'type': kind, 'count': composition[kind], 'quote': str(row.quote)}
+                heir.update((field, getattr(row, field)) for field in HEIR_FIELDS if field not in ('quote', 'amount', 'quote_reason'))
+                heir['amount'] = round(self.amount(kind, estate), 2)
+                heir['reason'] = row.quote_reason
+                heirs.append(heir)
+        data = {field: getattr(self, field) for field in CALC_FIELDS}
+        data['heirs'] = heirs
+        return data
+
+
+def compute(composition, deceased_sex='M', estate=0, order=HEIR_TYPES):
+    """Compute a mapping of heir type to count and return the engine"""
+    return Engine.from_composition(composition, deceased_sex=deceased_sex, estate=estate, order=order).compute()
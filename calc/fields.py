@@ -0,0 +1,118 @@
+"""
+Exact fractions on models.
+
+A FractionField keeps a Fraction in two integer columns, `<name>_numerator`
+and `<name>_denominator`, always in lowest terms with a positive
+denominator. Reading the attribute returns a Fraction built once per stored
+value, assigning converts ints, Decimals, strings and Fractions exactly.
+Floats are approximated with limit_denominator(), only the legacy float
+literals need it.
+
+Queries compare by cross multiplying the columns, so nothing is rounded:
+
+    Heir.objects.filter(Heir.quote.gt(Fraction(1, 4)))
+    heirs.filter(Heir.quote.exact(0))
+"""
+from fractions import Fraction
+
+from django.db import models
+from django.db.models import F, Func, Q
+
+
+def to_fraction(value):
+    """Exact Fraction of value, floats rounded to the closest fraction with a small denominator"""
+    if isinstance(value, Fraction):
+        return value
+    if isinstance(value, float):
+        return Fraction(value).limit_denominator()
+    if isinstance(value, (list, tuple)):
+        return Fraction(*value)
+    return Fraction(value)
+
+
+class Comparison(Func):
+    """SQL comparison of two expressions usable directly in filter()"""
+    template = '%(expressions)s'
+    output_field = models.BooleanField()
+
+    def __init__(self, lhs, operator, rhs):
+        self.arg_joiner = f" {operator} "
+        super().__init__(lhs, rhs)
+
+
+class FractionDescriptor:
+
+    def __init__(self, field):
+        self.field = field
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self.field
+        key = (getattr(instance, self.field.numerator_attname), getattr(instance, self.field.denominator_attname))
+        cached = instance.__dict__.get(self.field.cache_name)
+        if cached is None or cached[0] != key:
+            cached = (key, Fraction(*key))
+            instance.__dict__[self.field.cache_name] = cached
+        return cached[1]
+
+    def __set__(self, instance, value):
+        value = to_fraction(value)
+        setattr(instance, self.field.numerator_attname, value.numerator)
+        setattr(instance, self.field.denominator_attname, value.denominator)
+        instance.__dict__[self.field.cache_name] = ((value.numerator, value.denominator), value)
+
+
+class FractionField(models.Field):
+    """Fraction stored exactly as a numerator and a denominator column"""
+    descriptor_class = FractionDescriptor
+
+    def __init__(self, *args, default=0, **kwargs):
+        kwargs['editable'] = False
+        super().__init__(*args, default=default, **kwargs)
+
+    def contribute_to_class(self, cls, name, private_only=False):
+        self.numerator_attname = f"{name}_numerator"
+        self.denominator_attname = f"{name}_denominator"
+        self.cache_name = f"_{name}_fraction"
+        # subclasses get a copy of the field, their columns are inherited with the parent's
+        inherited = getattr(self, 'mti_inherited', False) or any(field.name == self.numerator_attname for field in cls._meta.local_fields)
+        if not inherited:
+            default = to_fraction(self.default)
+            cls.add_to_class(self.numerator_attname, models.BigIntegerField(default=default.numerator))
+            cls.add_to_class(self.denominator_attname, models.BigIntegerField(default=default.denominator))
+        super().contribute_to_class(cls, name, private_only=True)
+        setattr(cls, name, self.descriptor_class(self))
+
+    def get_attname_column(self):
+        # no column of its own, the two integer fields hold the value
+        return self.get_attname(), None
+
+    def columns(self, value):
+        """Column values of a fraction, for update() and values() comparisons"""
+        value = to_fraction(value)
+        return {self.numerator_attname: value.numerator, self.denominator_attname: value.denominator}
+
+    def compare(self, operator, value):
+        value = to_fraction(value)
+        return Comparison(
+            F(self.numerator_attname) * value.denominator, operator, F(self.denominator_attname) * value.numerator,
+        )
+
+    def exact(self, value):
+        return Q(**self.columns(value))
+
+    def gt(self, value):
+        value = to_fraction(value)
+        return Q(**{f"{self.numerator_attname}__gt": 0}) if value == 0 else self.compare('>', value)
+
+    def gte(self, value):
+        value = to_fraction(value)
+        return Q(**{f"{self.numerator_attname}__gte": 0}) if value == 0 else self.compare('>=', value)
+
+    def lt(self, value):
+        value = to_fraction(value)
+        return Q(**{f"{self.numerator_attname}__lt": 0}) if value == 0 else self.compare('<', value)
+
+    def lte(self, value):
+        value = to_fraction(value)
+        return Q(**{f"{self.numerator_attname}__lte": 0}) if value == 0 else self.compare('<=', value)
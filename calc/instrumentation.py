@@ -0,0 +1,92 @@
+"""
+Optional per phase instrumentation of Calculation.compute().
+
+Turned on for every compute by CALC_INSTRUMENT, or for one call with
+compute(instrument=True). Each phase records its wall time, the queries it
+ran and the rows they wrote as the database driver counts them. The
+share_table phase also records where its table came from, the lookup
+table, the cache or the engine, and only an engine run has the engine
+steps nested under it. The phases end up on calc.phases for the
+results pages, in the calc.instrumentation log and in the
+compute_instrumented signal for metrics. Turned off, a phase is a shared
+nullcontext and nothing is recorded.
+"""
+from contextlib import contextmanager, nullcontext
+import logging
+import time
+
+from django.db import connection
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+# sent with calc and phases after every instrumented compute
+compute_instrumented = Signal()
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+disabled = nullcontext()
+
+
+class QueryRecorder:
+    """Execute wrapper counting the queries and the rows the driver reports them writing"""
+
+    def __init__(self):
+        self.queries = 0
+        self.rows_written = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        self.queries += 1
+        if sql.lstrip().upper().startswith(WRITES):
+            # -1 when the driver doesn't know, sqlite only counts an INSERT ... RETURNING once it is fetched
+            self.rows_written += max(context['cursor'].rowcount, 0)
+        return result
+
+
+class PhaseRecorder:
+    """Phases of one compute in the order they started, nested phases one level deeper"""
+
+    def __init__(self):
+        self.phases = []
+        self.running = []
+        self.depth = 0
+
+    @contextmanager
+    def phase(self, name):
+        entry = {'name': name, 'depth': self.depth, 'ms': 0, 'queries': 0, 'rows_written': 0}
+        self.phases.append(entry)
+        recorder = QueryRecorder()
+        self.running.append(entry)
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(recorder):
+                yield
+        finally:
+            entry['ms'] = (time.perf_counter() - start) * 1000
+            entry['queries'] = recorder.queries
+            entry['rows_written'] = recorder.rows_written
+            self.depth -= 1
+            self.running.pop()
+
+
+def phase(recorder, name):
+    """Context manager recording a phase on recorder, nothing when recorder is None"""
+    return disabled if recorder is None else recorder.phase(name)
+
+
+def mark(recorder, **fields):
+    """Add fields to the innermost running phase of recorder, nothing when recorder is None"""
+    if recorder is not None and recorder.running:
+        recorder.running[-1].update(fields)
+
+
+def emit(calc, phases):
+    """Send the phases of a compute to the log and the compute_instrumented signal"""
+    logger.info(
+        "compute of calculation %s: %s", calc.pk,
+        ", ".join(f"{entry['name']}{' from ' + entry['source'] if 'source' in entry else ''} {entry['ms']:.2f} ms {entry['queries']} queries {entry['rows_written']} rows" for entry in phases if not entry['depth']),
+        extra={'calc_id': calc.pk, 'phases': phases},
+    )
+    compute_instrumented.send(sender=type(calc), calc=calc, phases=phases)
@@ -0,0 +1,130 @@
+import json
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from calc import views
+from calc.cache import results
+from calc.engine import CALC_FIELDS
+from calc.instrumentation import QueryRecorder
+from calc.models import HEIR_COLUMNS, Calculation, Heir, Result
+from calc.scenarios import SCENARIOS, build_scenario
+
+
+class Command(BaseCommand):
+    help = "Time Calculation.compute() and the results view across the scenario catalogue, with query and written row counts, as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help="Runs of each measurement, the median time is reported")
+        parser.add_argument('--scenario', action='append', default=[], help="Only run this scenario, repeat for more")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of the standard output")
+        parser.add_argument('--compare', help="JSON report of an earlier run to compare against")
+        parser.add_argument('--tolerance', type=float, default=20, help="Percent a median time can grow before --compare calls it a regression")
+
+    def handle(self, *args, **options):
+        scenarios = [scenario for scenario in SCENARIOS if not options['scenario'] or scenario['name'] in options['scenario']]
+        if not scenarios:
+            raise CommandError(f"No scenario named {', '.join(options['scenario'])}, pick from {', '.join(scenario['name'] for scenario in SCENARIOS)}")
+        user = User.objects.create_user(f"benchmark_compute_{time.time_ns()}")
+        try:
+            report = {
+                'commit': self.get_commit(),
+                'database': connection.vendor,
+                'runs': options['runs'],
+                'scenarios': [self.run_scenario(scenario, user, options['runs']) for scenario in scenarios],
+            }
+        finally:
+            # deletes the calculations and their heirs
+            user.delete()
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                baseline = json.load(baseline_file)
+            if self.compare(baseline, report, options['tolerance']):
+                raise CommandError(f"Regressions against {options['compare']}")
+
+    def get_commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def run_scenario(self, scenario, user, runs):
+        calc = build_scenario(scenario, user)
+        request_factory = RequestFactory()
+        view = views.ResultsView.as_view()
+
+        def reset():
+            # back to a never computed calculation with an empty result cache
+            Heir.objects.filter(calc=calc).update(**{column: Heir._meta.get_field(column).default for column in HEIR_COLUMNS})
+            Calculation.objects.filter(pk=calc.pk).update(computed_version=None, **{field: Calculation._meta.get_field(field).default for field in CALC_FIELDS})
+            Result.objects.filter(calc=calc).delete()
+            results.clear()
+
+        def results_view():
+            request = request_factory.get(f"/en/{calc.pk}/results/")
+            request.user = user
+            view(request, pk=calc.pk).render()
+
+        measurements = {
+            'compute_cold': (reset, lambda: Calculation.objects.get(pk=calc.pk).compute()),
+            'compute_warm': (None, lambda: Calculation.objects.get(pk=calc.pk).compute()),
+            'results_view': (None, results_view),
+            'results_view_stale': (lambda: Calculation.mark_stale(calc.pk), results_view),
+        }
+        report = {
+            'name': scenario['name'],
+            'deceased_sex': scenario['deceased_sex'],
+            'heirs': sum(scenario['heirs'].values()),
+            'measurements': {},
+        }
+        for name, (setup, run) in measurements.items():
+            timings = []
+            for i in range(runs):
+                if setup:
+                    setup()
+                recorder = QueryRecorder()
+                with connection.execute_wrapper(recorder):
+                    start = time.perf_counter()
+                    run()
+                    timings.append(time.perf_counter() - start)
+            report['measurements'][name] = {
+                'median_ms': round(statistics.median(timings) * 1000, 3),
+                'min_ms': round(min(timings) * 1000, 3),
+                'queries': recorder.queries,
+                'rows_written': recorder.rows_written,
+            }
+        calc.refresh_from_db()
+        report['flags'] = [field for field in ('excess', 'shortage', 'shortage_calc', 'correction', 'common_quote') if getattr(calc, field)]
+        return report
+
+    def compare(self, baseline, report, tolerance):
+        """Print the change of every measurement against the baseline, return whether any regressed"""
+        self.stderr.write(f"Compared with {baseline.get('commit') or 'the baseline'}")
+        before = {scenario['name']: scenario['measurements'] for scenario in baseline['scenarios']}
+        regressed = False
+        for scenario in report['scenarios']:
+            for name, after in scenario['measurements'].items():
+                previous = before.get(scenario['name'], {}).get(name)
+                if previous is None:
+                    continue
+                change = (after['median_ms'] - previous['median_ms']) / previous['median_ms'] * 100 if previous['median_ms'] else 0
+                regression = change > tolerance or after['queries'] > previous['queries'] or after['rows_written'] > previous['rows_written']
+                regressed = regressed or regression
+                line = (
+                    f"{scenario['name']} {name}: {previous['median_ms']} -> {after['median_ms']} ms ({change:+.0f}%), "
+                    f"queries {previous['queries']} -> {after['queries']}, rows written {previous['rows_written']} -> {after['rows_written']}"
+                )
+                self.stderr.write(self.style.ERROR(line) if regression else line)
+        return regressed
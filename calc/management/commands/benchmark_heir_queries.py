@@ -0,0 +1,92 @@
+import random
+import statistics
+import time
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+
+from calc.engine import HEIR_TYPES, HEIR_SEX
+from calc.models import Calculation, Heir, Person
+import calc.models
+
+
+class Command(BaseCommand):
+    help = "Time the heir queries of compute and the results pages with and without the heir indexes, on a synthetic table rolled back afterwards"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--heirs', type=int, default=2000000, help="Number of synthetic heirs")
+        parser.add_argument('--per-calc', type=int, default=8, help="Heirs per calculation")
+        parser.add_argument('--runs', type=int, default=200, help="Runs of each query, against random calculations")
+        parser.add_argument('--batch', type=int, default=10000, help="Rows per insert")
+
+    def queries(self, calc_id):
+        heirs = Heir.objects.non_polymorphic().filter(calc_id=calc_id)
+        return {
+            'composition': heirs.order_by().values_list('role').annotate(total=Count('pk')),
+            'load heirs': heirs.order_by('pk'),
+            'asaba': heirs.filter(asaba=True, correction=False).values_list('pk'),
+            'unblocked': heirs.filter(blocked=False).values_list('pk'),
+        }
+
+    def handle(self, *args, **options):
+        # sqlite only alters the schema inside a transaction with foreign key checks off
+        with connection.constraint_checks_disabled(), transaction.atomic():
+            calc_ids = self.populate(options['heirs'], options['per_calc'], options['batch'])
+            indexes = Heir._meta.indexes
+            with connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.remove_index(Heir, index)
+            before = self.measure(calc_ids, options['runs'])
+            with connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.add_index(Heir, index)
+            after = self.measure(calc_ids, options['runs'])
+            transaction.set_rollback(True)
+        for name in before:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for label, (plan, latency) in (('without indexes', before[name]), ('with indexes', after[name])):
+                self.stdout.write(f"  {label}: median {latency * 1000:.3f} ms")
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+    def populate(self, total, per_calc, batch):
+        content_types = ContentType.objects.get_for_models(*(getattr(calc.models, kind) for kind in HEIR_TYPES))
+        ctypes = {model.__name__: content_type.id for model, content_type in content_types.items()}
+        calcs = Calculation.objects.bulk_create([Calculation(name="benchmark") for i in range(total // per_calc)], batch_size=batch)
+        calc_ids = [calculation.pk for calculation in calcs]
+        heir_fields = [field for field in Heir._meta.local_concrete_fields]
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in heir_fields)
+        placeholders = ', '.join(['%s'] * len(heir_fields))
+        sql = f"INSERT INTO {connection.ops.quote_name(Heir._meta.db_table)} ({columns}) VALUES ({placeholders})"
+        kinds = random.Random(0).choices(HEIR_TYPES, k=total)
+        for start in range(0, total, batch):
+            people = Person.objects.bulk_create([
+                Person(first_name=kind, sex=HEIR_SEX[kind], polymorphic_ctype_id=ctypes[kind])
+                for kind in kinds[start:start + batch]
+            ])
+            rows = []
+            for i, person in enumerate(people, start):
+                heir = Heir(person_ptr_id=person.pk, role=kinds[i], calc_id=calc_ids[i // per_calc], asaba=i % 3 == 0, blocked=i % 5 == 0)
+                rows.append([field.get_db_prep_save(getattr(heir, field.attname), connection) for field in heir_fields])
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, rows)
+            self.stdout.write(f"\r{min(start + batch, total)} heirs", ending='')
+        self.stdout.write('')
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(Heir._meta.db_table)}")
+        return calc_ids
+
+    def measure(self, calc_ids, runs):
+        rnd = random.Random(1)
+        results = {}
+        for name in self.queries(calc_ids[0]):
+            timings = []
+            for i in range(runs):
+                queryset = self.queries(rnd.choice(calc_ids))[name]
+                start = time.perf_counter()
+                list(queryset)
+                timings.append(time.perf_counter() - start)
+            results[name] = (self.queries(calc_ids[0])[name].explain(), statistics.median(timings))
+        return results
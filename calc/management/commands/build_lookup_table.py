@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from calc.models import heir_order
+from calc.table import DEFAULT_BOUNDS, build_table, parse_bounds
+
+
+class Command(BaseCommand):
+    help = "Precompute the results of every heir composition within bounds into a memory mapped lookup table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.CALC_LOOKUP_TABLE, help="Path of the table, defaults to CALC_LOOKUP_TABLE")
+        parser.add_argument('--bound', action='append', default=[], metavar='TYPE=COUNT', help="Most heirs of a type in the table, repeat for each type")
+
+    def handle(self, *args, **options):
+        if not options['output']:
+            raise CommandError("Give an --output path or set CALC_LOOKUP_TABLE")
+        bounds = dict(DEFAULT_BOUNDS)
+        if options['bound']:
+            try:
+                bounds = parse_bounds(options['bound'])
+            except ValueError as e:
+                raise CommandError(e)
+        records = build_table(options['output'], bounds, heir_order())
+        self.stdout.write(self.style.SUCCESS(f"Wrote {records} compositions to {options['output']}"))
@@ -0,0 +1,151 @@
+from collections import deque
+from itertools import islice
+import csv
+import json
+import multiprocessing
+import os
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from calc.cache import get_share_table
+from calc.engine import CALC_FIELDS, HEIR_SEX, HEIR_TYPES, parse_composition
+from calc.models import Calculation, Deceased, heir_order
+import calc.models
+
+CSV_FIELDS = ['line', 'name', 'deceased_sex', 'estate', 'error', *CALC_FIELDS] + [
+    f"{kind}_{column}" for kind in HEIR_TYPES for column in ('count', 'quote', 'amount')
+]
+
+
+def csv_record(row):
+    """A CSV row with deceased_sex, estate, name and a count column per heir type, in the shape parse_composition takes"""
+    estate = (row.get('estate') or '0').strip()
+    return {
+        'name': row.get('name'),
+        'deceased_sex': row.get('deceased_sex'),
+        'estate': int(estate) if estate.isdigit() else float(estate),
+        'heirs': {kind: int(row[kind]) for kind in HEIR_TYPES if (row.get(kind) or '').strip()},
+    }
+
+
+def compute_chunk(chunk, order):
+    """Results of (line number, JSON line or CSV row) pairs, runs in the worker processes without touching the database"""
+    results = []
+    for number, record in chunk:
+        name = None
+        try:
+            data = json.loads(record) if isinstance(record, str) else csv_record(record)
+            if isinstance(data, dict):
+                name = data.get('name')
+            composition, deceased_sex, estate = parse_composition(data)
+            result = get_share_table(composition, deceased_sex, order).as_dict(composition, estate)
+            result.update(deceased_sex=deceased_sex, estate=estate)
+        except ValueError as e:
+            result = {'error': str(e)}
+        result['line'] = number
+        if name is not None:
+            result['name'] = name
+        results.append(result)
+    return results
+
+
+class Command(BaseCommand):
+    help = "Compute the heir compositions of a CSV or JSONL file across a process pool and write the results to a CSV or JSONL file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="CSV with deceased_sex, estate, name and a column per heir type, or JSONL in the /api/compute/ shape")
+        parser.add_argument('output', help="Results file, CSV when it ends in .csv, JSONL otherwise")
+        parser.add_argument('--processes', type=int, default=os.cpu_count(), help="Worker processes, 1 computes in this process")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Compositions per task, also the calculations per transaction with --persist")
+        parser.add_argument('--persist', action='store_true', help="Also store every composition as a Calculation with its deceased and heirs, computed")
+        parser.add_argument('--user', help="Username the persisted calculations belong to")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"No user {options['user']}")
+        # the heir order needs the database, the workers get it ready made
+        order = heir_order()
+        start = time.perf_counter()
+        total = errors = 0
+        with open(options['input'], newline='') as infile, open(options['output'], 'w', newline='') as outfile:
+            writer = self.get_writer(outfile, options['output'])
+            for results in self.compute(self.read(infile, options['input'], options['chunk_size']), order, options['processes']):
+                writer(results)
+                if options['persist']:
+                    self.persist(results, user, os.path.basename(options['input']))
+                total += len(results)
+                errors += sum('error' in result for result in results)
+                self.stdout.write(f"\r{total} compositions", ending='')
+        elapsed = time.perf_counter() - start
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"Computed {total} compositions ({errors} errors) in {elapsed:.1f} s, {total / elapsed if elapsed else 0:.0f} per second"
+        ))
+
+    def read(self, infile, path, size):
+        """Chunks of (line number, record), read lazily"""
+        if path.endswith('.csv'):
+            # line numbers count the header like an editor would
+            records = ((number, row) for number, row in enumerate(csv.DictReader(infile), 2))
+        else:
+            records = ((number, line) for number, line in enumerate(infile, 1) if line.strip())
+        while True:
+            chunk = list(islice(records, size))
+            if not chunk:
+                return
+            yield chunk
+
+    def compute(self, chunks, order, processes):
+        """Results of each chunk in input order, with a bounded number of chunks in flight"""
+        if processes <= 1:
+            for chunk in chunks:
+                yield compute_chunk(chunk, order)
+            return
+        with multiprocessing.Pool(processes, initializer=django.setup) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.apply_async(compute_chunk, (chunk, order)))
+                if len(pending) >= processes * 2:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+
+    def get_writer(self, outfile, path):
+        if path.endswith('.csv'):
+            writer = csv.DictWriter(outfile, CSV_FIELDS)
+            writer.writeheader()
+            return lambda results: writer.writerows(self.csv_row(result) for result in results)
+        return lambda results: outfile.writelines(json.dumps(result) + '\n' for result in results)
+
+    def csv_row(self, result):
+        row = {field: value for field, value in result.items() if field != 'heirs'}
+        for heir in result.get('heirs', []):
+            row.update({f"{heir['type']}_count": heir['count'], f"{heir['type']}_quote": heir['quote'], f"{heir['type']}_amount": heir['amount']})
+        return row
+
+    def persist(self, results, user, source):
+        """Store every computed composition of a chunk as a Calculation with its deceased and heirs, computed like the site computes it"""
+        with transaction.atomic():
+            for result in results:
+                if 'error' in result:
+                    continue
+                if result['estate'] != int(result['estate']):
+                    self.stderr.write(f"Line {result['line']} not persisted, the estate of a deceased is a whole number")
+                    continue
+                calculation = Calculation.objects.create(user=user, name=result.get('name') or f"{source}:{result['line']}")
+                Deceased.objects.create(first_name="Deceased", sex=result['deceased_sex'], estate=int(result['estate']), calc=calculation)
+                # heirs are multi table models that bulk_create can't insert, the signals keep the composition columns
+                for heir in result['heirs']:
+                    model = getattr(calc.models, heir['type'])
+                    for number in range(1, heir['count'] + 1):
+                        model.objects.create(first_name=f"{heir['type']} {number}", sex=HEIR_SEX[heir['type']], calc=calculation)
+                calculation.refresh_from_db(fields=['version'])
+                # a cache hit when the chunk was computed in this process, one engine run per composition otherwise
+                calculation.compute()
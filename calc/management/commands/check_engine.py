@@ -0,0 +1,87 @@
+from collections import deque
+from itertools import islice
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from calc.checker import check_chunk, enumerate_compositions, setup_worker
+from calc.models import heir_order
+from calc.table import DEFAULT_BOUNDS, parse_bounds
+
+
+class Command(BaseCommand):
+    help = (
+        "Run every valid heir composition within bounds through the ORM pipeline and an engine, "
+        "diff quotes, shares, correction bases and amounts and report each mismatch as a minimal composition"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bound', action='append', default=[], metavar='TYPE=COUNT', help="Most heirs of a type to try, repeat for each type")
+        parser.add_argument('--engine', default='calc.engine.compute', help="Dotted path of the engine function, called like calc.engine.compute")
+        parser.add_argument('--estate', type=int, default=1000000, help="Estate the amounts are computed for")
+        parser.add_argument('--processes', type=int, default=os.cpu_count(), help="Worker processes, 1 checks in this process")
+        parser.add_argument('--chunk-size', type=int, default=100, help="Compositions per task")
+        parser.add_argument('--output', help="Write the mismatches to this file as JSON lines")
+
+    def handle(self, *args, **options):
+        bounds = dict(DEFAULT_BOUNDS)
+        if options['bound']:
+            try:
+                bounds = parse_bounds(options['bound'])
+            except ValueError as e:
+                raise CommandError(e)
+        order = heir_order()
+        start = time.perf_counter()
+        total = 0
+        minimal = {}
+        outfile = open(options['output'], 'w') if options['output'] else None
+        try:
+            for checked, mismatches in self.run_chunks(enumerate_compositions(bounds), options, order):
+                total += checked
+                for mismatch in mismatches:
+                    if outfile:
+                        outfile.write(json.dumps(mismatch) + '\n')
+                    key = (mismatch['deceased_sex'], tuple(sorted(mismatch['minimal'].items())))
+                    minimal.setdefault(key, mismatch)
+                self.stdout.write(f"\r{total} compositions", ending='')
+        finally:
+            if outfile:
+                outfile.close()
+        elapsed = time.perf_counter() - start
+        self.stdout.write('')
+        for mismatch in minimal.values():
+            heirs = ', '.join(f"{kind}={count}" for kind, count in mismatch['minimal'].items())
+            self.stdout.write(self.style.ERROR(f"deceased {mismatch['deceased_sex']}, {heirs}"))
+            for field, expected, actual in mismatch['differences']:
+                self.stdout.write(f"  {field}: {expected} != {actual}")
+        summary = f"Checked {total} compositions in {elapsed:.1f} s, {len(minimal)} minimal mismatches"
+        if minimal:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    def run_chunks(self, compositions, options, order):
+        """(number checked, mismatches) of each chunk, with a bounded number of chunks in flight"""
+        args = (options['engine'], options['estate'], order)
+        chunks = iter(lambda: list(islice(compositions, options['chunk_size'])), [])
+        processes = options['processes']
+        if processes <= 1:
+            for chunk in chunks:
+                yield len(chunk), check_chunk(chunk, *args)
+            return
+        # the workers open their own connections, an inherited one is shared with the parent
+        connections.close_all()
+        with tempfile.TemporaryDirectory() as directory, multiprocessing.Pool(processes, initializer=setup_worker, initargs=(directory,)) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append((len(chunk), pool.apply_async(check_chunk, (chunk, *args))))
+                if len(pending) >= processes * 2:
+                    checked, result = pending.popleft()
+                    yield checked, result.get()
+            while pending:
+                checked, result = pending.popleft()
+                yield checked, result.get()
@@ -0,0 +1,175 @@
+from contextlib import contextmanager
+from importlib import import_module, reload
+import asyncio
+import io
+import json
+import statistics
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import clear_url_caches
+from django.utils.module_loading import import_string
+
+from calc.models import Calculation, Deceased, Husband, Mother, Son
+
+HOST = 'localhost'
+
+
+class Command(BaseCommand):
+    help = "Compare how many requests one process serves through the WSGI application with the sync views, one at a time like a gunicorn sync worker, and through the ASGI application with the async views under concurrent load, both with the configured middleware"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per view and serving mode")
+        parser.add_argument('--concurrency', type=int, default=50, help="Requests in flight at once for the async views")
+        parser.add_argument('--db-latency', type=float, default=2, help="Milliseconds added to every query, to stand for the network round trip to the database")
+
+    def handle(self, *args, **options):
+        latency = options['db_latency'] / 1000
+
+        def delay(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_delay(sender, connection, **kwargs):
+            if delay not in connection.execute_wrappers:
+                connection.execute_wrappers.append(delay)
+
+        user, calc = self.create_calculation()
+        client = Client()
+        client.force_login(user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        # the async views run their queries in other threads, each with its own connection
+        connection_created.connect(add_delay)
+        connection.execute_wrappers.append(delay)
+        try:
+            Calculation.objects.get(pk=calc.pk).compute()
+            body = json.dumps({'deceased_sex': 'F', 'estate': 1200, 'heirs': {'Husband': 1, 'Mother': 1, 'Son': 2}}).encode()
+            cases = {
+                'results page': ('GET', f"/en/{calc.pk}/results/", b''),
+                'compute api': ('POST', '/api/compute/', body),
+            }
+            for path in self.get_sync_middleware():
+                self.stdout.write(self.style.WARNING(
+                    f"{path} is sync only, under ASGI each request holds a thread from it down the middleware chain "
+                    "and its sync_to_async calls run there"
+                ))
+            for name, (method, path, body) in cases.items():
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                with self.routed(async_views=False):
+                    self.report('wsgi, one at a time', *self.run_sync(get_wsgi_application(), method, path, body, cookie, options['requests']))
+                with self.routed(async_views=True):
+                    self.report(
+                        f"asgi, {options['concurrency']} in flight",
+                        *asyncio.run(self.run_async(get_asgi_application(), method, path, body, cookie, options['requests'], options['concurrency'])),
+                    )
+        finally:
+            connection_created.disconnect(add_delay)
+            connection.execute_wrappers.remove(delay)
+            client.logout()
+            calc.delete()
+            user.delete()
+
+    def create_calculation(self):
+        user = User.objects.create_user(f"compare_serving_{time.time_ns()}")
+        calc = Calculation.objects.create(name="compare_serving", user=user)
+        Deceased.objects.create(first_name="Deceased", sex="F", estate=1200, calc=calc)
+        calc.add_husband(Husband.objects.create(first_name="Husband", sex="M", calc=calc))
+        calc.add_mother(Mother.objects.create(first_name="Mother", sex="F", calc=calc))
+        for i in range(2):
+            Son.objects.create(first_name=f"Son{i}", sex="M", calc=calc)
+        return user, calc
+
+    def get_sync_middleware(self):
+        """The configured middleware that can't run on the event loop"""
+        return [path for path in settings.MIDDLEWARE if not getattr(import_string(path), 'async_capable', False)]
+
+    @contextmanager
+    def routed(self, async_views):
+        """The project URLs with the sync or the async compute and results views, as mawareeth.wsgi and mawareeth.asgi route them"""
+        urls = import_module(settings.ROOT_URLCONF)
+        try:
+            with override_settings(CALC_ASYNC_VIEWS=async_views):
+                reload(urls)
+                clear_url_caches()
+                yield
+        finally:
+            reload(urls)
+            clear_url_caches()
+
+    def run_sync(self, application, method, path, body, cookie, total):
+        """Requests through the WSGI application and the configured middleware, one after the other like a gunicorn sync worker"""
+        timings = []
+        start = time.perf_counter()
+        for i in range(total):
+            environ = {
+                'REQUEST_METHOD': method, 'PATH_INFO': path, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+                'SERVER_NAME': HOST, 'SERVER_PORT': '443', 'SERVER_PROTOCOL': 'HTTP/1.1', 'REMOTE_ADDR': '127.0.0.1',
+                'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)), 'HTTP_COOKIE': cookie,
+                'wsgi.version': (1, 0), 'wsgi.url_scheme': 'https', 'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr,
+                'wsgi.multithread': False, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+            }
+            statuses = []
+            request_start = time.perf_counter()
+            response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            b''.join(response)
+            response.close()
+            timings.append(time.perf_counter() - request_start)
+            if not statuses[0].startswith('200'):
+                raise CommandError(f"{method} {path} answered {statuses[0]}")
+        return time.perf_counter() - start, timings, 1
+
+    async def run_async(self, application, method, path, body, cookie, total, concurrency):
+        """Requests through the ASGI application and the configured middleware, concurrency of them in flight"""
+        semaphore = asyncio.Semaphore(concurrency)
+        timings = []
+        in_flight = peak = 0
+
+        async def serve():
+            nonlocal in_flight, peak
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method, 'scheme': 'https',
+                'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+                'headers': [(b'host', HOST.encode()), (b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()), (b'cookie', cookie.encode())],
+                'client': ('127.0.0.1', 0), 'server': (HOST, 443),
+            }
+            messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+            statuses = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # the client stays connected, Django stops listening once the response is sent
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            async with semaphore:
+                in_flight += 1
+                peak = max(peak, in_flight)
+                request_start = time.perf_counter()
+                await application(scope, receive, send)
+                timings.append(time.perf_counter() - request_start)
+                in_flight -= 1
+                if statuses[0] != 200:
+                    raise CommandError(f"{method} {path} answered {statuses[0]}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(serve() for i in range(total)))
+        return time.perf_counter() - start, timings, peak
+
+    def report(self, label, elapsed, timings, peak):
+        self.stdout.write(
+            f"  {label}: {len(timings) / elapsed:.1f} requests/s, median latency {statistics.median(timings) * 1000:.1f} ms, "
+            f"{peak} requests in flight in the process"
+        )
@@ -0,0 +1,247 @@
+import json
+import math
+import random
+import statistics
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.urls import reverse
+
+import waffle
+
+from calc import views
+from calc.engine import HEIR_TYPES
+from calc.instrumentation import QueryRecorder
+from calc.models import Wife
+from calc.scenarios import SCENARIOS
+
+# backends waiting on a lock, sampled while the journeys run
+LOCK_WAITS = {
+    'postgresql': "SELECT count(*) FROM pg_stat_activity WHERE wait_event_type = 'Lock' AND datname = current_database()",
+    'mysql': "SELECT count(*) FROM information_schema.innodb_trx WHERE trx_state = 'LOCK WAIT'",
+}
+
+LOCK_ERRORS = ('database is locked', 'deadlock', 'lock timeout', 'lock wait timeout')
+
+
+class StepFailed(Exception):
+    pass
+
+
+def percentile(values, percent):
+    """Nearest rank percentile of a non empty list"""
+    values = sorted(values)
+    return values[max(math.ceil(percent / 100 * len(values)), 1) - 1]
+
+
+class LockSampler(threading.Thread):
+    """Count the backends waiting on a lock every interval seconds, where the database can tell"""
+
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                with connection.cursor() as cursor:
+                    cursor.execute(LOCK_WAITS[connection.vendor])
+                    self.samples.append(cursor.fetchone()[0])
+        finally:
+            connection.close()
+
+    def report(self):
+        return {
+            'samples': len(self.samples),
+            'samples_waiting': sum(1 for waiting in self.samples if waiting),
+            'max_waiting': max(self.samples, default=0),
+            'wait_s': round(sum(self.samples) * self.interval, 3),
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the user journey (new calculation, deceased, heirs, detail, results, delete) with concurrent clients "
+        "and report the latency percentiles, throughput, queries and lock waits of every step as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--journeys', type=int, default=20, help="Journeys to run in total")
+        parser.add_argument('--concurrency', type=int, default=4, help="Journeys running at the same time, each in its own thread and database connection")
+        parser.add_argument('--scenario', action='append', default=[], help="Only replay this scenario, repeat for more")
+        parser.add_argument('--max-heirs', type=int, default=10, help="Leave out scenarios with more heirs than this")
+        parser.add_argument('--seed', type=int, help="Seed of the scenario picks, for a repeatable mix")
+        parser.add_argument('--lock-interval', type=float, default=0.05, help="Seconds between lock wait samples on PostgreSQL and MySQL")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of the standard output")
+
+    def handle(self, *args, **options):
+        prefix = f"load_test_{time.time_ns()}"
+        users = [User.objects.create_user(f"{prefix}_{i}") for i in range(max(options['concurrency'], 1))]
+        try:
+            scenarios = self.get_scenarios(options, users[0])
+            random_picks = random.Random(options['seed'])
+            picks = [random_picks.choice(scenarios) for i in range(options['journeys'])]
+            report = self.run(picks, users, options)
+        finally:
+            # deletes whatever calculations a failed journey left behind
+            User.objects.filter(username__startswith=prefix).delete()
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def get_scenarios(self, options, user):
+        """Scenarios to replay, those that need an heir form behind an inactive waffle flag are left out"""
+        request = RequestFactory().get('/')
+        request.user = user
+        available = {
+            kind for kind in HEIR_TYPES
+            if not getattr(getattr(views, f"{kind}Create"), 'waffle_flag', None)
+            or waffle.flag_is_active(request, getattr(views, f"{kind}Create").waffle_flag)
+        }
+        scenarios = []
+        for scenario in SCENARIOS:
+            if options['scenario'] and scenario['name'] not in options['scenario']:
+                continue
+            if not options['scenario'] and sum(scenario['heirs'].values()) > options['max_heirs']:
+                continue
+            if set(scenario['heirs']) - available:
+                self.stderr.write(f"Skipped {scenario['name']}, the forms of {', '.join(sorted(set(scenario['heirs']) - available))} are off")
+                continue
+            scenarios.append(scenario)
+        if not scenarios:
+            raise CommandError("No scenario to replay")
+        return scenarios
+
+    def run(self, picks, users, options):
+        samples = []
+        lock = threading.Lock()
+        journeys = iter(picks)
+        sampler = LockSampler(options['lock_interval']) if connection.vendor in LOCK_WAITS else None
+
+        def worker(user):
+            client = Client()
+            client.force_login(user)
+            try:
+                while True:
+                    with lock:
+                        scenario = next(journeys, None)
+                    if scenario is None:
+                        return
+                    journey = self.journey(client, scenario)
+                    with lock:
+                        samples.extend(journey)
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        if sampler:
+            sampler.start()
+        try:
+            if len(users) == 1:
+                client = Client()
+                client.force_login(users[0])
+                for scenario in picks:
+                    samples.extend(self.journey(client, scenario))
+            else:
+                threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            elapsed = time.perf_counter() - start
+            if sampler:
+                sampler.stopped.set()
+                sampler.join()
+        return {
+            'database': connection.vendor,
+            'concurrency': len(users),
+            'journeys': len(picks),
+            # a journey stops at its first failed step
+            'completed': len(picks) - sum(1 for sample in samples if sample['error']),
+            'elapsed_s': round(elapsed, 3),
+            'requests': len(samples),
+            'requests_per_s': round(len(samples) / elapsed, 3) if elapsed else None,
+            'journeys_per_s': round(len(picks) / elapsed, 3) if elapsed else None,
+            'lock_waits': {
+                'errors': sum(1 for sample in samples if sample['lock_error']),
+                'sampled': sampler.report() if sampler else None,
+            },
+            'steps': self.get_steps(samples),
+        }
+
+    def journey(self, client, scenario):
+        """Samples of one journey through the site, it stops at the first failed step"""
+        samples = []
+
+        def step(name, method, url, data=None, expect=(200, 302)):
+            recorder = QueryRecorder()
+            sample = {'step': name, 'ms': 0, 'queries': 0, 'error': None, 'lock_error': False}
+            samples.append(sample)
+            start = time.perf_counter()
+            try:
+                with connection.execute_wrapper(recorder):
+                    response = getattr(client, method)(url, data, secure=True)
+                if response.status_code not in expect:
+                    sample['error'] = f"HTTP {response.status_code}"
+            except Exception as e:
+                sample['error'] = f"{type(e).__name__}: {e}"
+                sample['lock_error'] = any(message in str(e).lower() for message in LOCK_ERRORS)
+            sample['ms'] = (time.perf_counter() - start) * 1000
+            sample['queries'] = recorder.queries
+            if sample['error']:
+                raise StepFailed(sample['error'])
+            return response
+
+        try:
+            response = step('new', 'post', reverse('calc:new'), {'name': scenario['name'], 'next': 'detail'})
+            calc_id = int(response['Location'].rstrip('/').rsplit('/', 1)[1])
+            step('deceased', 'post', reverse('calc:deceased', args=[calc_id]), {
+                'first_name': "Deceased", 'last_name': "", 'sex': scenario['deceased_sex'], 'estate': 1000000,
+            })
+            for kind in HEIR_TYPES:
+                name = kind[0].lower() + kind[1:]
+                for i in range(scenario['heirs'].get(kind, 0)):
+                    data = {'first_name': f"{kind} {i + 1}", 'last_name': ""}
+                    if kind in ('Son', 'Daughter') and scenario['heirs'].get('Wife', 0) > 1:
+                        data['mother'] = Wife.objects.filter(calc_id=calc_id).values_list('pk', flat=True).first()
+                    step(name, 'post', reverse(f"calc:{name}", args=[calc_id]), data)
+            step('detail', 'get', reverse('calc:detail', args=[calc_id]), expect=(200,))
+            step('results', 'get', reverse('calc:results', args=[calc_id]), expect=(200,))
+            step('delete', 'post', reverse('calc:delete', args=[calc_id]))
+        except StepFailed:
+            pass
+        return samples
+
+    def get_steps(self, samples):
+        """Report of every step in journey order"""
+        order = ['new', 'deceased'] + [kind[0].lower() + kind[1:] for kind in HEIR_TYPES] + ['detail', 'results', 'delete']
+        steps = {name: [] for name in order}
+        for sample in samples:
+            steps[sample['step']].append(sample)
+        report = {}
+        for name, step_samples in steps.items():
+            if not step_samples:
+                continue
+            timings = [sample['ms'] for sample in step_samples]
+            queries = [sample['queries'] for sample in step_samples]
+            report[name] = {
+                'requests': len(step_samples),
+                'errors': sum(1 for sample in step_samples if sample['error']),
+                'p50_ms': round(percentile(timings, 50), 3),
+                'p95_ms': round(percentile(timings, 95), 3),
+                'p99_ms': round(percentile(timings, 99), 3),
+                'mean_queries': round(statistics.mean(queries), 1),
+                'max_queries': max(queries),
+                'first_error': next((sample['error'] for sample in step_samples if sample['error']), None),
+            }
+        return report
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from calc.models import Calculation
+
+
+class Command(BaseCommand):
+    help = "Recount the composition columns of calculations from the heir and deceased tables and report the ones that had drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calc', type=int, action='append', default=[], help="Only rebuild this calculation, repeat for more")
+
+    def handle(self, *args, **options):
+        calcs = Calculation.objects.order_by('pk')
+        if options['calc']:
+            calcs = calcs.filter(pk__in=options['calc'])
+        total = 0
+        drifted = []
+        for calc in calcs.iterator():
+            total += 1
+            if calc.rebuild_composition():
+                drifted.append(calc.pk)
+        for pk in drifted:
+            self.stdout.write(self.style.WARNING(f"Repaired calculation {pk}"))
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} calculations, {len(drifted)} had drifted"))
@@ -0,0 +1,49 @@
+"""
+Prometheus metrics of the calculations.
+
+Served at /metrics/ in the Prometheus text format. Every process keeps its
+own registry; when PROMETHEUS_MULTIPROC_DIR is set (gunicorn.conf.py does)
+the values are kept in files in that directory and /metrics/ adds them up
+across the gunicorn workers.
+"""
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+compute_seconds = Histogram(
+    'calc_compute_seconds', "Latency of Calculation.compute() by outcome: normal, awl, radd or tashih", ['outcome'],
+)
+results_view_seconds = Histogram(
+    'calc_results_view_seconds', "Latency of the results pages", ['view'],
+)
+request_queries = Histogram(
+    'calc_request_queries', "SQL queries per request",
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float('inf')),
+)
+share_tables = Counter(
+    'calc_share_tables', "Share tables by where they came from, engine is a composition cache miss", ['source'],
+)
+heir_rows_written = Counter(
+    'calc_heir_rows_written', "Heir rows updated by Calculation.compute()",
+)
+
+
+def get_outcome(calc):
+    """Outcome label of a computed calculation, anything holding the CALC_FIELDS"""
+    if calc.excess:
+        return 'awl'
+    if calc.shortage:
+        return 'radd'
+    if calc.correction:
+        return 'tashih'
+    return 'normal'
+
+
+def render():
+    """Every metric in the Prometheus text format and its content type"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,205 @@
+"""
+Request metrics and on demand profiling of single requests.
+
+MetricsMiddleware counts the queries of every request and times the
+results pages into the calc.metrics histograms. It serves sync and async
+requests alike, the queries are counted on every connection through a
+context variable since the async views run them in other threads.
+
+While the `profile_requests` waffle flag is active for a request, the
+request runs under cProfile with tracemalloc tracing allocations. The
+profile (`<name>.prof`, for pstats or snakeviz) and a JSON report with the
+top allocation sites, the calculation id and its composition are saved to
+CALC_PROFILE_DIR. The name is sent back in the X-Profile header.
+tracemalloc is process wide, so one request is profiled at a time, the
+flagged requests that arrive meanwhile are served without profiling. Under
+ASGI a profiled request is served in one thread, where cProfile sees it.
+"""
+from contextvars import ContextVar
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+import waffle
+
+from .instrumentation import QueryRecorder
+from .metrics import request_queries, results_view_seconds
+from .models import Calculation
+
+PROFILE_FLAG = "profile_requests"
+
+RESULTS_VIEWS = ('results', 'new_results')
+
+# held by the request being profiled, tracemalloc tracing and its snapshots are shared by the process
+profiling = threading.Lock()
+
+
+# query recorder of the request being served, copied into the threads sync_to_async runs queries in
+request_recorder = ContextVar('request_recorder', default=None)
+
+
+def record_request_queries(execute, sql, params, many, context):
+    recorder = request_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def add_request_recorder(sender, connection, **kwargs):
+    if record_request_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_request_queries)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # connections opened before this module was loaded
+        for alias in connections:
+            add_request_recorder(None, connections[alias])
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        token = request_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            request_recorder.reset(token)
+        self.observe(request, recorder, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        token = request_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_recorder.reset(token)
+        self.observe(request, recorder, time.perf_counter() - start)
+        return response
+
+    def observe(self, request, recorder, elapsed):
+        request_queries.observe(recorder.queries)
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.url_name in RESULTS_VIEWS:
+            results_view_seconds.labels(match.url_name).observe(elapsed)
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not waffle.flag_is_active(request, PROFILE_FLAG):
+            return self.get_response(request)
+        return self.profile(request, self.get_response)
+
+    async def __acall__(self, request):
+        # the flag may be read from the database
+        if not await sync_to_async(waffle.flag_is_active)(request, PROFILE_FLAG):
+            return await self.get_response(request)
+        # cProfile only sees the thread it is enabled in, the view's sync_to_async calls come back to this one
+        return await sync_to_async(self.profile)(request, async_to_sync(self.get_response))
+
+    def profile(self, request, get_response):
+        """Serve the request under cProfile and tracemalloc, unprofiled while another request is"""
+        if not profiling.acquire(blocking=False):
+            # another request is being profiled
+            return get_response(request)
+        try:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # a profiler not started here is running, e.g. the whole process runs under cProfile
+                return get_response(request)
+            tracing = tracemalloc.is_tracing()
+            if not tracing:
+                tracemalloc.start()
+            start = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                elapsed = time.perf_counter() - start
+                profile.disable()
+                snapshot = tracemalloc.take_snapshot()
+                if not tracing:
+                    tracemalloc.stop()
+        finally:
+            profiling.release()
+        response['X-Profile'] = self.save(request, response, profile, snapshot, elapsed)
+        return response
+
+    def save(self, request, response, profile, snapshot, elapsed):
+        """Write the profile and the report, return their name"""
+        calc_id = self.get_calc_id(request)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{calc_id or 'none'}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(settings.CALC_PROFILE_DIR, exist_ok=True)
+        path = os.path.join(settings.CALC_PROFILE_DIR, name)
+        profile.dump_stats(path + '.prof')
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        report = {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'user': request.user.pk if hasattr(request, 'user') else None,
+            'status': response.status_code,
+            'elapsed_ms': round(elapsed * 1000, 3),
+            'calc_id': calc_id,
+            'composition': self.get_composition(calc_id),
+            'allocations': [
+                {'site': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", 'size': stat.size, 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:settings.CALC_PROFILE_ALLOCATIONS]
+            ],
+        }
+        with open(path + '.json', 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        return name
+
+    def get_calc_id(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return None
+        if 'calc_id' in match.kwargs:
+            return match.kwargs['calc_id']
+        # pk is the calculation on every calc page except the person ones
+        if 'pk' in match.kwargs and match.url_name in ('detail', 'results', 'new_results', 'calc_update', 'delete'):
+            return match.kwargs['pk']
+        return None
+
+    def get_composition(self, calc_id):
+        calc = Calculation.objects.filter(pk=calc_id).first() if calc_id else None
+        if calc is None:
+            return None
+        return {
+            'deceased_sex': calc.deceased_sex or None,
+            'estate': calc.deceased_set.values_list('estate', flat=True).first(),
+            'heirs': dict(calc.get_heir_counts()),
+        }
@@ -0,0 +1,23 @@
+# Generated by Django 3.0.5 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calc', '0022_calculation_common_quote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calculation',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='computed_version',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.0.5 on 2026-10-18 11:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calc', '0023_calculation_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Result',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.JSONField(default=dict)),
+                ('calc', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='result', to='calc.Calculation')),
+            ],
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.0.5 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+ROLES = {
+    'father': 'Father',
+    'mother': 'Mother',
+    'husband': 'Husband',
+    'wife': 'Wife',
+    'daughter': 'Daughter',
+    'son': 'Son',
+    'brother': 'Brother',
+    'sister': 'Sister',
+    'grandfather': 'GrandFather',
+    'grandmother': 'GrandMother',
+    'sonofson': 'SonOfSon',
+    'daughterofson': 'DaughterOfSon',
+    'paternalsister': 'PaternalSister',
+    'paternalbrother': 'PaternalBrother',
+    'maternalsister': 'MaternalSister',
+    'maternalbrother': 'MaternalBrother',
+    'sonofbrother': 'SonOfBrother',
+    'sonofpaternalbrother': 'SonOfPaternalBrother',
+    'uncle': 'Uncle',
+    'paternaluncle': 'PaternalUncle',
+    'sonofuncle': 'SonOfUncle',
+    'sonofpaternaluncle': 'SonOfPaternalUncle',
+}
+
+
+def set_roles(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Heir = apps.get_model('calc', 'Heir')
+    for content_type in ContentType.objects.filter(app_label='calc', model__in=ROLES):
+        Heir.objects.filter(polymorphic_ctype_id=content_type.id).update(role=ROLES[content_type.model])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('calc', '0024_result'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='heir',
+            name='role',
+            field=models.CharField(blank=True, choices=[('Father', 'Father'), ('Mother', 'Mother'), ('Husband', 'Husband'), ('Wife', 'Wife'), ('Daughter', 'Daughter'), ('Son', 'Son'), ('Brother', 'Brother'), ('Sister', 'Sister'), ('GrandFather', 'GrandFather'), ('GrandMother', 'GrandMother'), ('SonOfSon', 'SonOfSon'), ('DaughterOfSon', 'DaughterOfSon'), ('PaternalSister', 'PaternalSister'), ('PaternalBrother', 'PaternalBrother'), ('MaternalSister', 'MaternalSister'), ('MaternalBrother', 'MaternalBrother'), ('SonOfBrother', 'SonOfBrother'), ('SonOfPaternalBrother', 'SonOfPaternalBrother'), ('Uncle', 'Uncle'), ('PaternalUncle', 'PaternalUncle'), ('SonOfUncle', 'SonOfUncle'), ('SonOfPaternalUncle', 'SonOfPaternalUncle')], default='', max_length=20),
+        ),
+        migrations.RunPython(set_roles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.0.5 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calc', '0025_heir_role'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='heir',
+            index=models.Index(fields=['calc', 'role'], name='calc_heir_calc_role_idx'),
+        ),
+    ]
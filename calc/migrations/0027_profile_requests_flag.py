@@ -0,0 +1,21 @@
+# Generated by Django 3.0.5 on 2026-10-18 16:20
+
+from django.db import migrations
+
+
+def create_flag(apps, schema_editor):
+    # inactive until turned on for a user, created here so checking it never writes
+    Flag = apps.get_model('waffle', 'Flag')
+    Flag.objects.get_or_create(name='profile_requests')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('waffle', '0001_initial'),
+        ('calc', '0026_heir_calc_role_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_flag, migrations.RunPython.noop),
+    ]
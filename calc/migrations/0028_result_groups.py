@@ -0,0 +1,49 @@
+# Generated by Django 3.0.5 on 2026-10-18 17:05
+
+from django.db import migrations
+
+PERSON_FIELDS = ('id', 'first_name', 'last_name')
+
+
+def group_heirs(apps, schema_editor):
+    # an entry per heir becomes a group per heir type with the names of its heirs
+    Result = apps.get_model('calc', 'Result')
+    for result in Result.objects.all().iterator():
+        if 'heirs' not in result.data:
+            continue
+        groups = {}
+        for heir in result.data.pop('heirs'):
+            group = groups.get(heir['kind'])
+            if group is None:
+                group = groups[heir['kind']] = {field: value for field, value in heir.items() if field not in PERSON_FIELDS}
+                group.update(count=0, names=[])
+            group['count'] += 1
+            group['names'].append([heir.get(field) for field in PERSON_FIELDS])
+        result.data['groups'] = list(groups.values())
+        result.save(update_fields=['data'])
+
+
+def ungroup_heirs(apps, schema_editor):
+    Result = apps.get_model('calc', 'Result')
+    for result in Result.objects.all().iterator():
+        if 'groups' not in result.data:
+            continue
+        heirs = []
+        for group in result.data.pop('groups'):
+            names = group.pop('names', None) or [[None, f"{group['kind']} {i + 1}", ""] for i in range(group['count'])]
+            del group['count']
+            heirs.extend(dict(group, **dict(zip(PERSON_FIELDS, name))) for name in names)
+        heirs.sort(key=lambda heir: heir['id'] or 0)
+        result.data['heirs'] = heirs
+        result.save(update_fields=['data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calc', '0027_profile_requests_flag'),
+    ]
+
+    operations = [
+        migrations.RunPython(group_heirs, ungroup_heirs),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.0.5 on 2026-10-18 18:20
+
+from decimal import Decimal
+from fractions import Fraction
+
+from django.db import migrations, models
+
+QUOTE_PLACES = Decimal(10) ** -10
+
+
+def split_quotes(apps, schema_editor):
+    # the decimal quotes were rounded to 10 places, the closest small fraction is the exact one
+    Heir = apps.get_model('calc', 'Heir')
+    for quote in Heir.objects.exclude(quote=0).values_list('quote', flat=True).distinct():
+        fraction = Fraction(quote).limit_denominator()
+        Heir.objects.filter(quote=quote).update(quote_numerator=fraction.numerator, quote_denominator=fraction.denominator)
+
+
+def join_quotes(apps, schema_editor):
+    Heir = apps.get_model('calc', 'Heir')
+    for numerator, denominator in Heir.objects.exclude(quote_numerator=0).values_list('quote_numerator', 'quote_denominator').distinct():
+        quote = (Decimal(numerator) / Decimal(denominator)).quantize(QUOTE_PLACES)
+        Heir.objects.filter(quote_numerator=numerator, quote_denominator=denominator).update(quote=quote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calc', '0028_result_groups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='heir',
+            name='quote_numerator',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='heir',
+            name='quote_denominator',
+            field=models.BigIntegerField(default=1),
+        ),
+        migrations.RunPython(split_quotes, join_quotes),
+        migrations.RemoveField(
+            model_name='heir',
+            name='quote',
+        ),
+    ]
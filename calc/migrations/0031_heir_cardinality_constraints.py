@@ -0,0 +1,56 @@
+# Generated by Django 3.0.5 on 2026-10-18 19:40
+
+from django.db import migrations, models
+from django.db.models import Count
+
+SINGLE_ROLES = ('Father', 'Mother', 'Husband', 'GrandFather')
+MAX_WIVES = 4
+
+
+def number_wives(apps, schema_editor):
+    # the count checks in the views could be raced, the constraints need clean data
+    Heir = apps.get_model('calc', 'Heir')
+    Deceased = apps.get_model('calc', 'Deceased')
+    duplicates = sorted(
+        {row['calc'] for row in Heir.objects.filter(role__in=SINGLE_ROLES).values('calc', 'role').annotate(total=Count('pk')).filter(total__gt=1)}
+        | {row['calc'] for row in Deceased.objects.values('calc').annotate(total=Count('pk')).filter(calc__isnull=False, total__gt=1)}
+        | {row['calc'] for row in Heir.objects.filter(role='Wife').values('calc').annotate(total=Count('pk')).filter(total__gt=MAX_WIVES)}
+    )
+    if duplicates:
+        raise RuntimeError(f"Calculations over the heir limits, fix them before migrating: {duplicates}")
+    slots = {}
+    for pk, calc_id in Heir.objects.filter(role='Wife', calc__isnull=False).order_by('pk').values_list('pk', 'calc'):
+        slots[calc_id] = slots.get(calc_id, 0) + 1
+        Heir.objects.filter(pk=pk).update(slot=slots[calc_id])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calc', '0030_heir_reason_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='heir',
+            name='slot',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(number_wives, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='heir',
+            constraint=models.UniqueConstraint(condition=models.Q(role__in=SINGLE_ROLES), fields=('calc', 'role'), name='calc_heir_single_role'),
+        ),
+        migrations.AddConstraint(
+            model_name='heir',
+            constraint=models.UniqueConstraint(fields=('calc', 'slot'), name='calc_heir_calc_slot'),
+        ),
+        migrations.AddConstraint(
+            model_name='heir',
+            constraint=models.CheckConstraint(check=models.Q(slot__gte=1, slot__lte=MAX_WIVES) | models.Q(slot__isnull=True), name='calc_heir_slot_range'),
+        ),
+        migrations.AddConstraint(
+            model_name='deceased',
+            constraint=models.UniqueConstraint(fields=('calc',), name='calc_deceased_one_per_calc'),
+        ),
+    ]
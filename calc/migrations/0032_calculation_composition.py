@@ -0,0 +1,146 @@
+# Generated by Django 3.0.5 on 2026-10-18 20:15
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_heirs(apps, schema_editor):
+    Calculation = apps.get_model('calc', 'Calculation')
+    Heir = apps.get_model('calc', 'Heir')
+    Deceased = apps.get_model('calc', 'Deceased')
+    fields = {field.name for field in Calculation._meta.fields if field.name.endswith('_count')}
+    counts = {}
+    for calc_id, role, total in Heir.objects.filter(calc__isnull=False).values_list('calc', 'role').annotate(total=Count('pk')).order_by():
+        field = ''.join('_' + c.lower() if c.isupper() and i else c.lower() for i, c in enumerate(role)).replace('grand_', 'grand') + '_count'
+        if field in fields:
+            counts.setdefault(calc_id, {})[field] = total
+    for calc_id, values in counts.items():
+        Calculation.objects.filter(pk=calc_id).update(**values)
+    for calc_id, sex in Deceased.objects.filter(calc__isnull=False).values_list('calc', 'sex'):
+        Calculation.objects.filter(pk=calc_id).update(deceased_sex=sex or "")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calc', '0031_heir_cardinality_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calculation',
+            name='deceased_sex',
+            field=models.CharField(blank=True, default='', max_length=1),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='father_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='mother_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='husband_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='wife_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='daughter_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='son_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='brother_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='sister_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='grandfather_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='grandmother_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='son_of_son_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='daughter_of_son_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='paternal_sister_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='paternal_brother_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='maternal_sister_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='maternal_brother_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='son_of_brother_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='son_of_paternal_brother_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='uncle_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='paternal_uncle_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='son_of_uncle_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calculation',
+            name='son_of_paternal_uncle_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(count_heirs, migrations.RunPython.noop),
+    ]
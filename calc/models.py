@@ -1,17 +1,65 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from polymorphic.models import PolymorphicModel
 from polymorphic.managers import PolymorphicManager
 from django.urls import reverse
-from django.utils.translation import gettext as _
+from django.utils.translation import gettext as _, gettext_noop
 from polymorphic.managers import PolymorphicManager, PolymorphicQuerySet
 from fractions import Fraction
+from decimal import Decimal
 from functools import reduce
+from collections import Counter, defaultdict
 import math
-from django.db.models import Count
+import time
+from django.db.models import Case, Count, Value, When
+from django.contrib.contenttypes.models import ContentType
+from .engine import HEIR_SEX, HEIR_TYPES, CALC_FIELDS, HEIR_FIELDS
+from .fields import FractionField
+from .reasons import get_code, get_reason
+from .cache import get_share_table
+from .table import HEIR_FLAGS, HEIR_INTS
+from .instrumentation import PhaseRecorder, emit, phase
+from .metrics import compute_seconds, get_outcome, heir_rows_written
+from django.conf import settings
 
 
 
 from django.contrib.auth.models import User
+AMOUNT_PLACES = Decimal(10) ** -2
+ROLE_CHOICES = [(kind, kind) for kind in HEIR_TYPES]
+# composition columns of Calculation, a count per heir type
+HEIR_COUNT_FIELDS = {
+    'Father': 'father_count',
+    'Mother': 'mother_count',
+    'Husband': 'husband_count',
+    'Wife': 'wife_count',
+    'Daughter': 'daughter_count',
+    'Son': 'son_count',
+    'Brother': 'brother_count',
+    'Sister': 'sister_count',
+    'GrandFather': 'grandfather_count',
+    'GrandMother': 'grandmother_count',
+    'SonOfSon': 'son_of_son_count',
+    'DaughterOfSon': 'daughter_of_son_count',
+    'PaternalSister': 'paternal_sister_count',
+    'PaternalBrother': 'paternal_brother_count',
+    'MaternalSister': 'maternal_sister_count',
+    'MaternalBrother': 'maternal_brother_count',
+    'SonOfBrother': 'son_of_brother_count',
+    'SonOfPaternalBrother': 'son_of_paternal_brother_count',
+    'Uncle': 'uncle_count',
+    'PaternalUncle': 'paternal_uncle_count',
+    'SonOfUncle': 'son_of_uncle_count',
+    'SonOfPaternalUncle': 'son_of_paternal_uncle_count',
+}
+SINGLE_ROLES = ('Father', 'Mother', 'Husband', 'GrandFather')  # at most one heir of these types per calculation
+MAX_WIVES = 4
+COMPOSITION_FIELDS = ('deceased_sex', *HEIR_COUNT_FIELDS.values())
+# heir columns holding the computed state, the quote is kept in two integer columns and the reason as its code
+HEIR_COLUMNS = tuple(
+    column for field in HEIR_FIELDS
+    for column in {'quote': ('quote_numerator', 'quote_denominator'), 'quote_reason': ('reason',)}.get(field, (field,))
+)
+
 def NON_POLYMORPHIC_CASCADE(collector, field, sub_objs, using):
     return models.CASCADE(collector, field, sub_objs.non_polymorphic(), using)
 
@@ -74,24 +122,18 @@ class Person(PolymorphicModel):
             return mother
 
     def add_husband(self, husband):
-        #check for existing marriages
-        if self.male_marriages.count() == 0:
-            m = Marriage.objects.create()
-            m.add_male(husband)
-            m.add_female(self)
-            return m
-        else:
-             raise _("Husband already exist")
+        # one husband per calculation is enforced by the heir constraints
+        m = Marriage.objects.create()
+        m.add_male(husband)
+        m.add_female(self)
+        return m
 
     def add_wife(self, wife):
-        #check for existing marriages
-        if self.female_marriages.count() < 4:
-            m = Marriage.objects.create()
-            m.add_male(self)
-            m.add_female(wife)
-            return m
-        else:
-            raise _("Can't have more than 4 wives")
+        # at most MAX_WIVES wives per calculation is enforced by the heir constraints
+        m = Marriage.objects.create()
+        m.add_male(self)
+        m.add_female(wife)
+        return m
 
     def add_daughter(self, daughter, mother, father):
 
@@ -225,6 +267,36 @@ class Calculation(models.Model):
 
     user = models.ForeignKey(User,on_delete=models.CASCADE,null=True)
     name = models.CharField(max_length=200)
+    version = models.PositiveIntegerField(default=0)      # bumped when the heirs or the deceased change
+    computed_version = models.PositiveIntegerField(null=True, blank=True)  # version the stored results belong to
+    # composition vector, kept by F() updates when heirs and the deceased are saved or deleted (calc.signals),
+    # `manage.py rebuild_compositions` repairs it from the heir table
+    deceased_sex = models.CharField(max_length=1, blank=True, default="")
+    father_count = models.PositiveSmallIntegerField(default=0)
+    mother_count = models.PositiveSmallIntegerField(default=0)
+    husband_count = models.PositiveSmallIntegerField(default=0)
+    wife_count = models.PositiveSmallIntegerField(default=0)
+    daughter_count = models.PositiveSmallIntegerField(default=0)
+    son_count = models.PositiveSmallIntegerField(default=0)
+    brother_count = models.PositiveSmallIntegerField(default=0)
+    sister_count = models.PositiveSmallIntegerField(default=0)
+    grandfather_count = models.PositiveSmallIntegerField(default=0)
+    grandmother_count = models.PositiveSmallIntegerField(default=0)
+    son_of_son_count = models.PositiveSmallIntegerField(default=0)
+    daughter_of_son_count = models.PositiveSmallIntegerField(default=0)
+    paternal_sister_count = models.PositiveSmallIntegerField(default=0)
+    paternal_brother_count = models.PositiveSmallIntegerField(default=0)
+    maternal_sister_count = models.PositiveSmallIntegerField(default=0)
+    maternal_brother_count = models.PositiveSmallIntegerField(default=0)
+    son_of_brother_count = models.PositiveSmallIntegerField(default=0)
+    son_of_paternal_brother_count = models.PositiveSmallIntegerField(default=0)
+    uncle_count = models.PositiveSmallIntegerField(default=0)
+    paternal_uncle_count = models.PositiveSmallIntegerField(default=0)
+    son_of_uncle_count = models.PositiveSmallIntegerField(default=0)
+    son_of_paternal_uncle_count = models.PositiveSmallIntegerField(default=0)
+
+    composition = None   # heir counts snapshot, only set while compute_steps() runs
+    phases = None        # timings of the last instrumented compute(), see calc.instrumentation
 
     def add_father(self, father):
         return father.add(calc=self)
@@ -327,6 +399,28 @@ class Calculation(models.Model):
     def __str__(self):
         return str(self.name)
 
+    def save(self, *args, **kwargs):
+        # the composition columns are only written by F() updates, a stale loaded instance must not write them back
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COMPOSITION_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def mark_stale(pk, **changes):
+        """Bump the version of a calculation so its stored results get recomputed, in the same UPDATE as changes"""
+        Calculation.objects.filter(pk=pk).update(version=models.F('version') + 1, **changes)
+
+    def is_stale(self):
+        return self.computed_version != self.version
+
+    def compute_if_stale(self):
+        """Compute only when the stored results are older than the heirs"""
+        if self.is_stale() or not hasattr(self, 'result'):
+            self.compute()
+
     def get_quotes(self):
         for heir in self.heir_set.all().order_by('polymorphic_ctype_id'):
             heir.get_quote(self)
@@ -337,74 +431,104 @@ class Calculation(models.Model):
     def lcm_list(self, list):
         return reduce(lambda a, b : self.lcm(a, b), list)
 
+    def get_heir_counts(self):
+        """Number of heirs per role from the composition columns as loaded, without a query"""
+        return Counter({kind: getattr(self, field) for kind, field in HEIR_COUNT_FIELDS.items() if getattr(self, field)})
+
+    def get_heir_total(self):
+        return sum(getattr(self, field) for field in HEIR_COUNT_FIELDS.values())
+
+    def get_composition(self):
+        """Number of heirs per role, read fresh with the deceased sex from the composition columns of the calculation row"""
+        if self.composition is not None:
+            return self.composition
+        self.refresh_from_db(fields=list(COMPOSITION_FIELDS))
+        return self.get_heir_counts()
+
+    def rebuild_composition(self):
+        """Recount the composition columns from the heir and deceased tables, True when they had drifted"""
+        rows = Counter(dict(self.heir_set.non_polymorphic().order_by().values_list('role').annotate(total=Count('pk'))))
+        deceased = self.deceased_set.order_by('pk').values_list('sex', flat=True).first()
+        values = {field: rows[kind] for kind, field in HEIR_COUNT_FIELDS.items()}
+        values['deceased_sex'] = deceased or ""
+        drifted = Calculation.objects.filter(pk=self.pk).exclude(**values).update(**values) > 0
+        for field, value in values.items():
+            setattr(self, field, value)
+        return drifted
+
+    def count_heirs(self, *models):
+        """Number of heirs of the given types"""
+        composition = self.get_composition()
+        return sum(composition[model.__name__] for model in models)
+
     def has_descendent(self):
-        return self.heir_set.instance_of(Son).count() > 0 or self.heir_set.instance_of(Daughter).count() > 0 or self.heir_set.instance_of(SonOfSon).count() > 0 or self.heir_set.instance_of(DaughterOfSon).count() > 0
+        return self.count_heirs(Son, Daughter, SonOfSon, DaughterOfSon) > 0
 
     def has_male_descendent(self):
-        return self.heir_set.instance_of(Son).count() > 0 or self.heir_set.instance_of(SonOfSon).count() > 0
+        return self.count_heirs(Son, SonOfSon) > 0
 
     def has_female_descendent(self):
-        return self.heir_set.instance_of(Daughter).count() > 0 or self.heir_set.instance_of(DaughterOfSon).count() > 0
+        return self.count_heirs(Daughter, DaughterOfSon) > 0
 
     def has_siblings(self):
-        return self.heir_set.instance_of(Brother).count() + self.heir_set.instance_of(PaternalBrother).count() + self.heir_set.instance_of(MaternalBrother).count() + self.heir_set.instance_of(Sister).count() + self.heir_set.instance_of(PaternalSister).count() + self.heir_set.instance_of(MaternalSister).count() > 1
+        return self.count_heirs(Brother, PaternalBrother, MaternalBrother, Sister, PaternalSister, MaternalSister) > 1
 
     def has_spouse(self):
-        return self.heir_set.instance_of(Wife, Husband).count() > 0
+        return self.count_heirs(Wife, Husband) > 0
 
     def has_asaba(self):
         return self.heir_set.filter(asaba=True).count() > 0
 
     def has_father(self):
-        return self.heir_set.instance_of(Father).count() > 0
+        return self.count_heirs(Father) > 0
 
     def has_grandFather(self):
-        return self.heir_set.instance_of(GrandFather).count() > 0
+        return self.count_heirs(GrandFather) > 0
 
     def has_mohter(self):
-        return self.heir_set.instance_of(Mother).count() > 0
+        return self.count_heirs(Mother) > 0
 
     def has_son(self):
-        return self.heir_set.instance_of(Son).count() > 0
+        return self.count_heirs(Son) > 0
 
     def has_brother(self):
-        return self.heir_set.instance_of(Brother).count() > 0
+        return self.count_heirs(Brother) > 0
 
     def has_sister(self):
-        return self.heir_set.instance_of(Sister).count() > 0
+        return self.count_heirs(Sister) > 0
 
     def has_grandFather(self):
-        return self.heir_set.instance_of(GrandFather).count() > 0
+        return self.count_heirs(GrandFather) > 0
 
     def has_sonOfSon(self):
-        return self.heir_set.instance_of(SonOfSon).count() > 0
+        return self.count_heirs(SonOfSon) > 0
 
     def has_paternalBrother(self):
-        return self.heir_set.instance_of(PaternalBrother).count() > 0
+        return self.count_heirs(PaternalBrother) > 0
 
     def has_sonOfBrother(self):
-        return self.heir_set.instance_of(PaternalBrother).count() > 0
+        return self.count_heirs(PaternalBrother) > 0
 
     def has_sonOfPaternalBrother(self):
-        return self.heir_set.instance_of(SonOfPaternalBrother).count() > 0
+        return self.count_heirs(SonOfPaternalBrother) > 0
 
     def has_uncle(self):
-        return self.heir_set.instance_of(Uncle).count() > 0
+        return self.count_heirs(Uncle) > 0
 
     def has_paternalUncle(self):
-        return self.heir_set.instance_of(PaternalUncle).count() > 0
+        return self.count_heirs(PaternalUncle) > 0
 
     def has_sonOfUncle(self):
-        return self.heir_set.instance_of(SonOfUncle).count() > 0
+        return self.count_heirs(SonOfUncle) > 0
 
     def has_daughter(self):
-        return self.heir_set.instance_of(Daughter).count() > 0
+        return self.count_heirs(Daughter) > 0
 
     def has_maternalSister(self):
-        return self.heir_set.instance_of(MaternalSister).count() > 0
+        return self.count_heirs(MaternalSister) > 0
 
     def has_maternalBrother(self):
-        return self.heir_set.instance_of(MaternalBrother).count() > 0
+        return self.count_heirs(MaternalBrother) > 0
 
     def get_father(self):
         return self.heir_set.instance_of(Father).first()
@@ -505,8 +629,8 @@ class Calculation(models.Model):
                 shares = self.shares_shorted
             else:
                 shares = self.shares
-            correction_set = self.heir_set.filter(correction=True).values('polymorphic_ctype_id','quote').annotate(total=Count('id'))
-            asaba_set = self.heir_set.filter(asaba=True, correction=True).values('polymorphic_ctype_id','quote').annotate(total=Count('id'))
+            correction_set = self.heir_set.filter(correction=True).values('polymorphic_ctype_id','quote_numerator','quote_denominator').annotate(total=Count('id'))
+            asaba_set = self.heir_set.filter(asaba=True, correction=True).values('polymorphic_ctype_id','quote_numerator','quote_denominator').annotate(total=Count('id'))
             if self.common_quote == True:
                 heir_share = self.heir_set.filter(correction=True).first().share
                 count = self.heir_set.filter(correction=True).count()
@@ -523,7 +647,7 @@ class Calculation(models.Model):
                     self.shares_corrected = count * shares
             elif asaba_set.count() == 2:
                 factors = set()
-                correction_set_without_asaba = self.heir_set.filter(correction=True, asaba=False).values('polymorphic_ctype_id','quote').annotate(total=Count('id'))
+                correction_set_without_asaba = self.heir_set.filter(correction=True, asaba=False).values('polymorphic_ctype_id','quote_numerator','quote_denominator').annotate(total=Count('id'))
                 males = self.heir_set.filter(asaba=True, sex='M').count()
                 females = self.heir_set.filter(asaba=True, sex='F').count()
                 asaba_count = males * 2 + females
@@ -534,7 +658,7 @@ class Calculation(models.Model):
                     else:
                         factors.add(asaba_count)
                 for result in correction_set_without_asaba:
-                    heir_share = Fraction(result["quote"]).limit_denominator().numerator
+                    heir_share = result["quote_numerator"]
                     count = result["total"]
                     if heir_share != 0:
                         if heir_share % count == 0:
@@ -545,7 +669,7 @@ class Calculation(models.Model):
             else:
                 factors = set()
                 for result in correction_set:
-                    heir_share = Fraction(result["quote"]).limit_denominator().numerator
+                    heir_share = result["quote_numerator"]
                     count = result["total"]
                     if heir_share != 0:
                         if heir_share % count == 0:
@@ -580,7 +704,7 @@ class Calculation(models.Model):
             self.save()
     def set_asaba_quotes(self):
         #check for asaba exclude father with quote
-        asaba = self.heir_set.filter(asaba=True).exclude(quote__gt=0)
+        asaba = self.heir_set.filter(asaba=True).exclude(Heir.quote.gt(0))
         if asaba:
             #check for residual_shares
             if self.residual_shares > 0 or self.common_quote == True:
@@ -680,7 +804,7 @@ class Calculation(models.Model):
 
     def check_common_quote(self):
         # check for common_quote
-        if self.heir_set.instance_of(MaternalSister, MaternalBrother).filter(quote__gt=0).count() > 1 and self.heir_set.instance_of(Brother).filter(asaba=True).count() >= 1 and self.heir_set.instance_of(Husband).filter(quote__gt=1/4) and self.heir_set.instance_of(Mother).filter(quote__gt=0) :
+        if self.heir_set.instance_of(MaternalSister, MaternalBrother).filter(Heir.quote.gt(0)).count() > 1 and self.heir_set.instance_of(Brother).filter(asaba=True).count() >= 1 and self.heir_set.instance_of(Husband).filter(Heir.quote.gt(Fraction(1, 4))) and self.heir_set.instance_of(Mother).filter(Heir.quote.gt(0)) :
             self.common_quote = True
             self.save()
 
@@ -702,28 +826,114 @@ class Calculation(models.Model):
             heir.clear()
         self.save()
 
-    def compute(self):
+    def compute(self, instrument=None):
+        """Compute the calculation from the cached share table of its composition and persist what changed, instrument defaults to CALC_INSTRUMENT"""
+        if instrument is None:
+            instrument = settings.CALC_INSTRUMENT
+        recorder = PhaseRecorder() if instrument else None
+        start = time.perf_counter()
+        # the load and the names of the result snapshot are read in the same transaction as the writes
+        with transaction.atomic():
+            with phase(recorder, 'load'):
+                # the share table key comes from the composition columns, read with the estate, the heir rows only give the stored states
+                row = Calculation.objects.values(*COMPOSITION_FIELDS, estate=models.F('deceased__estate')).get(pk=self.pk)
+                estate = row.pop('estate') or 0
+                for field, value in row.items():
+                    setattr(self, field, value)
+                composition = self.get_heir_counts()
+                # one row per heir type and stored state, however many heirs there are
+                stored = defaultdict(list)
+                counts = Counter()
+                for row in self.heir_set.non_polymorphic().order_by().values('role', 'polymorphic_ctype_id', *HEIR_COLUMNS).annotate(total=Count('pk')):
+                    stored[row['role']].append(row)
+                    counts[row['role']] += row['total']
+                if counts != composition:
+                    # the count columns drifted from the heir rows, the share table is keyed on the recounted ones
+                    self.rebuild_composition()
+                    composition = self.get_heir_counts()
+            with phase(recorder, 'share_table'):
+                table = get_share_table(composition, self.deceased_sex or None, heir_order(), recorder)
+            with phase(recorder, 'apply'):
+                calc_fields = [field for field in CALC_FIELDS if getattr(self, field) != getattr(table, field)]
+                for field in calc_fields:
+                    setattr(self, field, getattr(table, field))
+                if self.computed_version != self.version:
+                    self.computed_version = self.version
+                    calc_fields.append('computed_version')
+                heir_fields = set()
+                changed = {}
+                for kind in composition:
+                    values = Heir.get_state_values(table.rows[kind], table.amount(kind, estate))
+                    fields = {column for row in stored[kind] for column in HEIR_COLUMNS if row[column] != values[column]}
+                    if fields:
+                        heir_fields.update(fields)
+                        changed[kind] = values
+            with phase(recorder, 'persist'):
+                if changed:
+                    # a single UPDATE of the changed types, every heir of a type gets the same values
+                    Heir.objects.filter(calc=self, role__in=list(changed)).update(**{
+                        field: Case(
+                            *(When(role=kind, then=Value(values[field], output_field=Heir._meta.get_field(field))) for kind, values in changed.items()),
+                            output_field=Heir._meta.get_field(field),
+                        )
+                        for field in HEIR_COLUMNS if field in heir_fields
+                    })
+                    heir_rows_written.inc(sum(composition[kind] for kind in changed))
+                if calc_fields:
+                    self.save(update_fields=calc_fields)
+                if calc_fields or changed or not hasattr(self, 'result'):
+                    self.result, created = Result.objects.update_or_create(calc=self, defaults={'data': self.get_result_data(stored, table, estate)})
+        compute_seconds.labels(get_outcome(table)).observe(time.perf_counter() - start)
+        if recorder is not None:
+            self.phases = recorder.phases
+            emit(self, self.phases)
+        return table
+
+    def get_result_data(self, stored, table, estate):
+        """Snapshot of the computed calculation and a group per heir type, what the results pages render"""
+        names = defaultdict(list)
+        for kind, pk, first_name, last_name in self.heir_set.non_polymorphic().order_by('pk').values_list('role', 'pk', 'first_name', 'last_name'):
+            names[kind].append([pk, first_name, last_name])
+        if Counter({kind: len(heirs) for kind, heirs in names.items()}) != self.get_heir_counts():
+            # an heir was added or removed since the load, the next read recomputes
+            Calculation.mark_stale(self.pk)
+        return {
+            'estate': estate,
+            'calc': {field: getattr(self, field) for field in CALC_FIELDS},
+            'groups': [
+                get_group_data(table.rows[kind], len(names[kind]), table.amount(kind, estate), stored[kind][0]['polymorphic_ctype_id'], names[kind])
+                for kind in HEIR_TYPES if names[kind] and kind in table.rows and stored[kind]
+            ],
+        }
+
+    def compute_steps(self):
+        """Compute the calculation step by step through the ORM, the reference for the engine"""
         self.clear()
-        self.get_quotes()
-        self.check_common_quote()
-        self.set_calc_shares()
-        self.set_shares()
-        self.set_remainder()
-        self.set_asaba_quotes()
-        self.set_asaba_shares()
-        self.get_shares()
-        self.set_calc_excess()
-        self.set_calc_shortage()
-        self.set_shortage_shares()
-        if self.shortage_calc:
-            self.set_shortage_calc_shares()
-            self.set_shortage_calc_share()
-            self.set_shortage_union_shares()
-            self.set_shortage_union_share()
-        self.set_calc_correction()
-        self.get_corrected_shares()
-        self.set_amounts()
-        self.save()
+        # the heirs don't change while computing, answer every has_* from one snapshot
+        self.composition = self.get_composition()
+        try:
+            self.get_quotes()
+            self.check_common_quote()
+            self.set_calc_shares()
+            self.set_shares()
+            self.set_remainder()
+            self.set_asaba_quotes()
+            self.set_asaba_shares()
+            self.get_shares()
+            self.set_calc_excess()
+            self.set_calc_shortage()
+            self.set_shortage_shares()
+            if self.shortage_calc:
+                self.set_shortage_calc_shares()
+                self.set_shortage_calc_share()
+                self.set_shortage_union_shares()
+                self.set_shortage_union_share()
+            self.set_calc_correction()
+            self.get_corrected_shares()
+            self.set_amounts()
+            self.save()
+        finally:
+            self.composition = None
 
     def get_absolute_url(self):
         return reverse('calc:detail', args=[self.id])
@@ -731,11 +941,69 @@ class Deceased(Person):
     """Deceased class"""
     estate = models.IntegerField()
     calc = models.ForeignKey(Calculation, on_delete=NON_POLYMORPHIC_CASCADE,null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['calc'], name='calc_deceased_one_per_calc'),
+        ]
     def get_absolute_url(self):
         return reverse('calc:detail', args=[self.calc.id])
+class Result(models.Model):
+    """Denormalized snapshot of the last compute of a calculation"""
+    calc = models.OneToOneField(Calculation, on_delete=models.CASCADE, related_name='result')
+    data = models.JSONField(default=dict)
+
+    def get_heirs(self):
+        """One ResultHeir per heir of the groups, in pk order when the heirs were named"""
+        heirs = []
+        for group in self.data.get('groups', []):
+            names = group.get('names') or [[None, f"{group['kind']} {i + 1}", ""] for i in range(group['count'])]
+            heirs.extend(ResultHeir(group, pk, first_name, last_name) for pk, first_name, last_name in names)
+        heirs.sort(key=lambda heir: heir.id or 0)
+        return heirs
+
+    def get_estate(self):
+        return self.data.get('estate', 0)
+
+def get_group_data(state, count, amount, polymorphic_ctype_id, names=None):
+    """A group of heirs as stored in a Result snapshot, names are [id, first_name, last_name] and the quote reason is kept as its code"""
+    data = {field: int(getattr(state, field)) for field in HEIR_INTS}
+    data.update({field: bool(getattr(state, field)) for field in HEIR_FLAGS})
+    data.update(
+        kind=state.kind,
+        count=count,
+        polymorphic_ctype_id=polymorphic_ctype_id,
+        sex=HEIR_SEX[state.kind],
+        quote=[state.quote.numerator, state.quote.denominator],
+        amount=str(Decimal(amount).quantize(AMOUNT_PLACES)),
+        reason=get_code(state.quote_reason),
+    )
+    if names:
+        data['names'] = names
+    return data
+
+class ResultHeir:
+    """An heir of a Result snapshot group, with the attributes the results templates use"""
+    def __init__(self, group, id, first_name, last_name):
+        for field, value in group.items():
+            if field not in ('count', 'names'):
+                setattr(self, field, value)
+        self.id = id
+        self.first_name = first_name
+        self.last_name = last_name
+        self.quote = Fraction(*group['quote'])
+        self.amount = Decimal(group['amount'])
+
+    @property
+    def quote_reason(self):
+        return get_reason(self.reason)
+
+    def get_fraction(self):
+        return self.quote
+
 class Heir(Person):
     """Heir class"""
-    quote = models.DecimalField(max_digits=11, decimal_places=10, default=0)  #prescribed share
+    quote = FractionField(default=0)  #prescribed share, stored exactly in quote_numerator and quote_denominator
     shared_quote = models.BooleanField(default=False)    #prescribed share is shared with other heir like 2 daughters
     share = models.IntegerField(default=0)
     corrected_share = models.IntegerField(default=0)
@@ -743,13 +1011,36 @@ class Heir(Person):
     amount = models.DecimalField(max_digits=20, decimal_places=2, default=0)
     asaba = models.BooleanField(default=False)           #agnate or residuary
     blocked = models.BooleanField(default=False)         # restricted from inheritance
-    quote_reason = models.CharField(max_length=255, default="")
+    reason = models.PositiveSmallIntegerField(default=0)  # code of the quote reason in calc.reasons.REASONS
     correction = models.BooleanField(default=False)
     shortage_calc = models.BooleanField(default = False)
     shortage_calc_share = models.IntegerField(default=0)
     shortage_union_share = models.IntegerField(default=0)
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES, blank=True, default="")  # concrete heir type, kept on this table so hot paths skip the child tables
+    slot = models.PositiveSmallIntegerField(null=True, blank=True)  # 1 to MAX_WIVES for wives, unique per calculation
     abstract = True
     calc = models.ForeignKey(Calculation, on_delete=NON_POLYMORPHIC_CASCADE,null=True)
+
+    class Meta:
+        # heir queries are scoped to a calculation and the calc index already narrows them to a
+        # handful of rows, only the composition GROUP BY gains from a covering index,
+        # see `manage.py benchmark_heir_queries`
+        indexes = [
+            models.Index(fields=['calc', 'role'], name='calc_heir_calc_role_idx'),
+        ]
+        # the database keeps the counts right, also for concurrent submits
+        constraints = [
+            models.UniqueConstraint(fields=['calc', 'role'], condition=models.Q(role__in=SINGLE_ROLES), name='calc_heir_single_role'),
+            models.UniqueConstraint(fields=['calc', 'slot'], name='calc_heir_calc_slot'),
+            models.CheckConstraint(check=models.Q(slot__gte=1, slot__lte=MAX_WIVES) | models.Q(slot__isnull=True), name='calc_heir_slot_range'),
+        ]
+    @property
+    def quote_reason(self):
+        """Quote reason in the active language"""
+        return get_reason(self.reason)
+    @quote_reason.setter
+    def quote_reason(self, reason):
+        self.reason = get_code(reason)
     def get_absolute_url(self):
         return reverse('calc:detail', args=[self.calc.id])
     def __str__(self):
@@ -762,14 +1053,14 @@ class Heir(Person):
             if self.shared_quote == True:
                 if calc.maternal_quote == True:
                     if calc.common_quote == True:
-                        count = calc.heir_set.instance_of(MaternalSister, MaternalBrother, Sister, Brother).count()
+                        count = calc.count_heirs(MaternalSister, MaternalBrother, Sister, Brother)
                     else:
-                        count = calc.heir_set.instance_of(MaternalSister, MaternalBrother).count()
+                        count = calc.count_heirs(MaternalSister, MaternalBrother)
                 elif calc.common_quote == True:
-                        count = calc.heir_set.instance_of(MaternalSister, MaternalBrother, Sister, Brother).count()
+                        count = calc.count_heirs(MaternalSister, MaternalBrother, Sister, Brother)
 
                 else:
-                    count = calc.heir_set.filter(polymorphic_ctype_id=self.polymorphic_ctype_id).count()
+                    count = calc.count_heirs(self.__class__)
                 if share % count == 0:
                     self.share = share // count
                     self.save()
@@ -793,7 +1084,7 @@ class Heir(Person):
                 shorted_types = calc.heir_set.not_instance_of(Husband, Wife).values('polymorphic_ctype_id','share').annotate(total=Count('id'))
                 if shorted_types.count() == 1:
                     if self.shared_quote == True:
-                        count = calc.heir_set.filter(polymorphic_ctype_id=self.polymorphic_ctype_id).count()
+                        count = calc.count_heirs(self.__class__)
                         if remainder % count == 0:
                             self.shorted_share = remainder // count
                         else:
@@ -816,7 +1107,7 @@ class Heir(Person):
         if self.shortage_calc == True:
             share = calc.shortage_calc_shares * self.get_fraction().numerator // self.get_fraction().denominator
             if self.shared_quote == True:
-                count = calc.heir_set.filter(polymorphic_ctype_id=self.polymorphic_ctype_id).count()
+                count = calc.count_heirs(self.__class__)
                 if share % count == 0:
                     self.shortage_calc_share = share // count
                     self.save()
@@ -838,7 +1129,7 @@ class Heir(Person):
         if self.asaba == True:
             if calc.common_quote == True:
                 share = calc.shares * self.get_fraction().numerator // self.get_fraction().denominator
-                count = calc.heir_set.instance_of(MaternalSister, MaternalBrother, Sister, Brother).count()
+                count = calc.count_heirs(MaternalSister, MaternalBrother, Sister, Brother)
                 if share % count == 0:
                     self.share = share // count
                     self.save()
@@ -884,22 +1175,22 @@ class Heir(Person):
         shares =  calc.shares
         if remainder > 0 and shares > 0:
             if self.quote == 0:
-                quote = remainder / calc.shares
+                quote = Fraction(remainder, calc.shares)
                 self.quote = quote
                 self.save()
             else:
-                quote = (remainder + self.share )/calc.shares
+                quote = Fraction(remainder + self.share, calc.shares)
                 self.quote = quote
                 self.save()
         elif calc.common_quote == True:
-            self.quote = 1/3
-            self.quote_reason = _("Asaba with maternal siblings share 1/3")
+            self.quote = Fraction(1, 3)
+            self.quote_reason = gettext_noop("Asaba with maternal siblings share 1/3")
             self.shared_quote = True
             self.save()
 
     def get_corrected_share(self, calc):
-        correction_set = calc.heir_set.filter(correction=True).values('polymorphic_ctype_id','quote').annotate(total=Count('id'))
-        asaba_set = calc.heir_set.filter(asaba=True).values('polymorphic_ctype_id','quote').annotate(total=Count('id'))
+        correction_set = calc.heir_set.filter(correction=True).values('polymorphic_ctype_id','quote_numerator','quote_denominator').annotate(total=Count('id'))
+        asaba_set = calc.heir_set.filter(asaba=True).values('polymorphic_ctype_id','quote_numerator','quote_denominator').annotate(total=Count('id'))
         if calc.correction==True and calc.shares_corrected != 0:
             if calc.excess == True:
                 multiplier = calc.shares_corrected // calc.shares_excess
@@ -927,7 +1218,7 @@ class Heir(Person):
                 else:
                     self.corrected_share = share * multiplier // (2 * males + females)
             else :
-                count = calc.heir_set.filter(polymorphic_ctype_id=self.polymorphic_ctype_id).count()
+                count = calc.count_heirs(self.__class__)
                 if self.shared_quote == True:
                     self.corrected_share = share * multiplier // count
                 else:
@@ -954,7 +1245,48 @@ class Heir(Person):
         self.amount = amount
         self.save()
     def get_fraction(self):
-        return Fraction(self.quote).limit_denominator()
+        return self.quote
+    @property
+    def kind(self):
+        """Name of the concrete heir type, also for heirs fetched non polymorphic"""
+        return self.role or ContentType.objects.get_for_id(self.polymorphic_ctype_id).model_class().__name__
+    def save(self, *args, **kwargs):
+        if self.__class__.__name__ in HEIR_TYPES:
+            self.role = self.__class__.__name__
+        if self.role == 'Wife' and self.slot is None and self.calc_id is not None:
+            self.save_wife(*args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
+    def save_wife(self, *args, **kwargs):
+        """Save a new wife in the first free slot, in the next one when a concurrent submit takes it first"""
+        pks = {model._meta.pk.attname: getattr(self, model._meta.pk.attname) for model in (type(self), *self._meta.get_parent_list())}
+        for attempt in range(MAX_WIVES):
+            # past MAX_WIVES the slot check rejects the wife
+            taken = set(Heir.objects.filter(calc_id=self.calc_id, slot__isnull=False).values_list('slot', flat=True))
+            self.slot = next(slot for slot in range(1, MAX_WIVES + 2) if slot not in taken)
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                # the rolled back parent rows left their ids on the instance
+                for attname, value in pks.items():
+                    setattr(self, attname, value)
+                self._state.adding = True
+                if attempt == MAX_WIVES - 1 or not Heir.objects.filter(calc_id=self.calc_id, slot=self.slot).exists():
+                    raise
+    @staticmethod
+    def get_state_values(state, amount=None):
+        """Column values of the heirs of a computed engine HeirState, as they are stored"""
+        values = {field: getattr(state, field) for field in HEIR_FIELDS if field not in ('quote', 'quote_reason')}
+        values.update(quote_numerator=state.quote.numerator, quote_denominator=state.quote.denominator)
+        values['amount'] = Decimal(state.amount if amount is None else amount).quantize(AMOUNT_PLACES)
+        values['reason'] = get_code(state.quote_reason)
+        return values
+    def set_state(self, state, amount=None):
+        """Copy a computed engine HeirState onto this heir"""
+        for column, value in self.get_state_values(state, amount).items():
+            setattr(self, column, value)
     def clear(self):
         self.quote = 0
         self.shared_quote = False
@@ -977,15 +1309,15 @@ class Father(Heir):
         calc.deceased_set.first().add_father(father=self)
     def get_quote(self, calc):
         if calc.has_male_descendent():
-            self.quote = 1/6
-            self.quote_reason = _("father gets 1/6 prescribed share because of male descendant")
+            self.quote = Fraction(1, 6)
+            self.quote_reason = gettext_noop("father gets 1/6 prescribed share because of male descendant")
         elif calc.has_female_descendent():
-            self.quote = 1/6
+            self.quote = Fraction(1, 6)
             #self.asaba = True
-            self.quote_reason = _("father gets 1/6 plus remainder because of female descendant")
+            self.quote_reason = gettext_noop("father gets 1/6 plus remainder because of female descendant")
         else:
             self.asaba = True
-            self.quote_reason = _("father gets the remainder because there is no descendant")
+            self.quote_reason = gettext_noop("father gets the remainder because there is no descendant")
         self.save()
         return self.quote
 
@@ -997,21 +1329,21 @@ class Mother(Heir):
 
     def get_quote(self, calc):
         if calc.has_descendent():
-            self.quote = 1/6
-            self.quote_reason = _("mother gets 1/6 because of descendant")
+            self.quote = Fraction(1, 6)
+            self.quote_reason = gettext_noop("mother gets 1/6 because of descendant")
         elif calc.has_siblings():
-            self.quote = 1/6
-            self.quote_reason = _("mother gets 1/6 because of siblings")
+            self.quote = Fraction(1, 6)
+            self.quote_reason = gettext_noop("mother gets 1/6 because of siblings")
         elif calc.has_spouse() and calc.has_father():
             if calc.deceased_set.first().sex == 'M':
-                self.quote = 1/4
-                self.quote_reason = _("mother gets 1/3 of the remainder which is 1/4.")
+                self.quote = Fraction(1, 4)
+                self.quote_reason = gettext_noop("mother gets 1/3 of the remainder which is 1/4.")
             else:
-                self.quote = 1/6
-                self.quote_reason = _("mother gets 1/3 of the remainder which is 1/6")
+                self.quote = Fraction(1, 6)
+                self.quote_reason = gettext_noop("mother gets 1/3 of the remainder which is 1/6")
         else:
-            self.quote = 1/3
-            self.quote_reason = _("mother gets 1/3 because no descendant or siblings")
+            self.quote = Fraction(1, 3)
+            self.quote_reason = gettext_noop("mother gets 1/3 because no descendant or siblings")
         self.save()
         return self.quote
 
@@ -1024,11 +1356,11 @@ class Husband(Heir):
 
     def get_quote(self, calc):
         if calc.has_descendent():
-            self.quote = 1/4
-            self.quote_reason = _("husband gets 1/4 becuase of descendant")
+            self.quote = Fraction(1, 4)
+            self.quote_reason = gettext_noop("husband gets 1/4 becuase of descendant")
         else:
-            self.quote = 1/2
-            self.quote_reason = _("husband gets 1/2 becuase there is no descendant")
+            self.quote = Fraction(1, 2)
+            self.quote_reason = gettext_noop("husband gets 1/2 becuase there is no descendant")
         self.save()
         return self.quote
 
@@ -1038,20 +1370,20 @@ class Wife(Heir):
         calc.deceased_set.first().add_wife(wife=self)
 
     def get_quote(self, calc):
-        if calc.heir_set.instance_of(Wife).count() == 1:
+        if calc.count_heirs(Wife) == 1:
             if calc.has_descendent():
-                self.quote = 1/8
-                self.quote_reason = _("wife gets 1/8 becuase of descendant")
+                self.quote = Fraction(1, 8)
+                self.quote_reason = gettext_noop("wife gets 1/8 becuase of descendant")
             else:
-                self.quote = 1/4
-                self.quote_reason = _("wife gets 1/4 becuase there is no descendant")
+                self.quote = Fraction(1, 4)
+                self.quote_reason = gettext_noop("wife gets 1/4 becuase there is no descendant")
         else:
             if calc.has_descendent():
-                self.quote = 1/8
-                self.quote_reason = _("wives share the qoute of 1/8 becuase of descendant")
+                self.quote = Fraction(1, 8)
+                self.quote_reason = gettext_noop("wives share the qoute of 1/8 becuase of descendant")
             else:
-                self.quote = 1/4
-                self.quote_reason = _("wives share the quote of 1/4 becuase there is no descendant")
+                self.quote = Fraction(1, 4)
+                self.quote_reason = gettext_noop("wives share the quote of 1/4 becuase there is no descendant")
             self.shared_quote = True
         self.save()
         return self.quote
@@ -1064,16 +1396,16 @@ class Daughter(Heir):
     def get_quote(self, calc):
         if calc.has_son():
             self.asaba = True
-            self.quote_reason = _("Daughter/s with Son/s share the residuary. The son will receive a share of two daughters.")
-            if calc.heir_set.instance_of(Daughter).count() > 1:
+            self.quote_reason = gettext_noop("Daughter/s with Son/s share the residuary. The son will receive a share of two daughters.")
+            if calc.count_heirs(Daughter) > 1:
                 self.shared_quote = True
-        elif calc.heir_set.instance_of(Daughter).count() == 1:
-            self.quote = 1/2
-            self.quote_reason = _("Daughter gets 1/2 when she has no other sibling/s")
+        elif calc.count_heirs(Daughter) == 1:
+            self.quote = Fraction(1, 2)
+            self.quote_reason = gettext_noop("Daughter gets 1/2 when she has no other sibling/s")
         else:
-            self.quote = 2/3
+            self.quote = Fraction(2, 3)
             self.shared_quote = True
-            self.quote_reason = _("Daughters share the quote of 2/3 when there is no son/s")
+            self.quote_reason = gettext_noop("Daughters share the quote of 2/3 when there is no son/s")
         self.save()
         return self.quote
 
@@ -1083,10 +1415,10 @@ class Son(Heir):
         calc.deceased_set.first().add_son(son=self, mother=mother, father=father)
 
     def get_quote(self, calc):
-        if calc.heir_set.instance_of(Son).count() > 1:
+        if calc.count_heirs(Son) > 1:
             self.shared_quote = True
         self.asaba =  True
-        self.quote_reason = _("Son/s share the remainder or all amount if no other heir exist")
+        self.quote_reason = gettext_noop("Son/s share the remainder or all amount if no other heir exist")
         self.save()
         return self.quote
 
@@ -1096,21 +1428,21 @@ class Brother(Heir):
         calc.deceased_set.first().add_brother(brother=self)
 
     def get_quote(self, calc):
-        brothers = calc.heir_set.instance_of(Brother)
-        if brothers.count() > 1:
+        brothers = calc.count_heirs(Brother)
+        if brothers > 1:
             self.shared_quote = True
         if calc.has_male_descendent():
             self.blocked = True
-            self.quote_reason = _("Bother/s are blocked by male descendant")
+            self.quote_reason = gettext_noop("Bother/s are blocked by male descendant")
         elif calc.has_father():
             self.blocked = True
-            self.quote_reason = _("Brother/s are blocked by father")
+            self.quote_reason = gettext_noop("Brother/s are blocked by father")
         elif calc.has_grandFather():
             self.blocked = True
-            self.quote_reason = _("Brother/s are blocked by grandfather")
+            self.quote_reason = gettext_noop("Brother/s are blocked by grandfather")
         else:
             self.asaba =  True
-            self.quote_reason = _("Brother/s share the remainder or all amount if no other heir exist")
+            self.quote_reason = gettext_noop("Brother/s share the remainder or all amount if no other heir exist")
         self.save()
         return self.quote
 
@@ -1120,31 +1452,31 @@ class Sister(Heir):
         calc.deceased_set.first().add_sister(sister=self)
 
     def get_quote(self, calc):
-        sisters = calc.heir_set.instance_of(Sister)
-        if sisters.count() > 1:
+        sisters = calc.count_heirs(Sister)
+        if sisters > 1:
             self.shared_quote = True
         if calc.has_male_descendent():
             self.blocked = True
-            self.quote_reason = _("Sister/s are blocked by male descendant")
+            self.quote_reason = gettext_noop("Sister/s are blocked by male descendant")
         elif calc.has_father():
             self.blocked = True
-            self.quote_reason = _("Sister/s are blocked by father")
+            self.quote_reason = gettext_noop("Sister/s are blocked by father")
         elif calc.has_grandFather():
             self.blocked = True
-            self.quote_reason = _("Sister/s are blocked by grandfather")
+            self.quote_reason = gettext_noop("Sister/s are blocked by grandfather")
         elif calc.has_brother():
             self.asaba = True
-            self.quote_reason = _("Sister/s with borther/s share the remainder or all the amount if no other heir exist. The brother will receive a share of two sisters")
+            self.quote_reason = gettext_noop("Sister/s with borther/s share the remainder or all the amount if no other heir exist. The brother will receive a share of two sisters")
         elif calc.has_female_descendent():
             self.asaba = True
-            self.quote_reason = _("Sister/s with female descendant share the remainder")
+            self.quote_reason = gettext_noop("Sister/s with female descendant share the remainder")
         else:
-            if sisters.count() == 1:
-                self.quote = 1/2
-                self.quote_reason = _("Sister gets half when no father or son. ")
+            if sisters == 1:
+                self.quote = Fraction(1, 2)
+                self.quote_reason = gettext_noop("Sister gets half when no father or son. ")
             else:
-                self.quote = 2/3
-                self.quote_reason = _("Sisters share 2/3 when no father or son.")
+                self.quote = Fraction(2, 3)
+                self.quote_reason = gettext_noop("Sisters share 2/3 when no father or son.")
         self.save()
         return self.quote
 
@@ -1156,17 +1488,17 @@ class GrandFather(Heir):
     def get_quote(self, calc):
         if calc.has_father():
             self.blocked = True
-            self.quote_reason = _("Grandfather is blocked by father")
+            self.quote_reason = gettext_noop("Grandfather is blocked by father")
         elif calc.has_male_descendent():
-            self.quote = 1/6
-            self.quote_reason = _("Grandfather gets 1/6 prescribed share because of male descendant")
+            self.quote = Fraction(1, 6)
+            self.quote_reason = gettext_noop("Grandfather gets 1/6 prescribed share because of male descendant")
         elif calc.has_female_descendent():
-            self.quote = 1/6
+            self.quote = Fraction(1, 6)
             #self.asaba = True
-            self.quote_reason = _("Grandfather gets 1/6 plus remainder because of female descendant")
+            self.quote_reason = gettext_noop("Grandfather gets 1/6 plus remainder because of female descendant")
         else:
             self.asaba = True
-            self.quote_reason = _("Grandfather gets the remainder because there is no descendant")
+            self.quote_reason = gettext_noop("Grandfather gets the remainder because there is no descendant")
         self.save()
         return self.quote
 
@@ -1178,13 +1510,13 @@ class GrandMother(Heir):
     def get_quote(self, calc):
         if calc.has_mohter():
             self.blocked = True
-            self.quote_reason = _("Grandmother is blocked by mother")
+            self.quote_reason = gettext_noop("Grandmother is blocked by mother")
         else:
-            grandmothers = calc.heir_set.instance_of(GrandMother)
-            if grandmothers.count() > 1:
+            grandmothers = calc.count_heirs(GrandMother)
+            if grandmothers > 1:
                 self.shared_quote = True
-            self.quote = 1/6
-            self.quote_reason = _("Grandmother gets 1/6 if no mother")
+            self.quote = Fraction(1, 6)
+            self.quote_reason = gettext_noop("Grandmother gets 1/6 if no mother")
         self.save()
         return self.quote
 
@@ -1196,12 +1528,12 @@ class SonOfSon(Heir):
     def get_quote(self, calc):
         if calc.has_son():
             self.blocked = True
-            self.quote_reason = _("Son of son is blocked by Son")
+            self.quote_reason = gettext_noop("Son of son is blocked by Son")
         else:
-            if calc.heir_set.instance_of(SonOfSon).count() > 1:
+            if calc.count_heirs(SonOfSon) > 1:
                 self.shared_quote = True
             self.asaba = True
-            self.quote_reason = _("Son of son share the remainder or all amount if no other heir exist")
+            self.quote_reason = gettext_noop("Son of son share the remainder or all amount if no other heir exist")
         self.save()
         return self.quote
 
@@ -1211,29 +1543,29 @@ class DaughterOfSon(Heir):
         calc.deceased_set.first().add_daughterOfSon(daughter=self)
 
     def get_quote(self, calc):
-        daughtersOfSon = calc.heir_set.instance_of(DaughterOfSon)
-        if daughtersOfSon.count() > 1:
+        daughtersOfSon = calc.count_heirs(DaughterOfSon)
+        if daughtersOfSon > 1:
             self.shared_quote = True
         if calc.has_son():
             self.blocked = True
-            self.quote_reason = _("Daughter of son is blocked by son")
+            self.quote_reason = gettext_noop("Daughter of son is blocked by son")
         elif calc.has_sonOfSon():
             self.asaba = True
-            self.quote_reason = _("Daughter/s of son with Son/s of son share the residuary. The son of son will receive a share of two daughters of son.")
+            self.quote_reason = gettext_noop("Daughter/s of son with Son/s of son share the residuary. The son of son will receive a share of two daughters of son.")
         elif calc.has_daughter():
-            daughters = calc.heir_set.instance_of(Daughter)
-            if daughters.count()==1:
-                self.quote = 1/6
-                self.quote_reason = _("Daughter of son get 1/6, with daughter")
+            daughters = calc.count_heirs(Daughter)
+            if daughters==1:
+                self.quote = Fraction(1, 6)
+                self.quote_reason = gettext_noop("Daughter of son get 1/6, with daughter")
             else:
                 self.blocked = True
-                self.quote_reason = _("Daughter/s of son are blocked by daugters")
-        elif daughtersOfSon.count() == 1:
-            self.quote = 1/2
-            self.quote_reason = _("Daughter of son gets 1/2 when she has no other sibling/s")
+                self.quote_reason = gettext_noop("Daughter/s of son are blocked by daugters")
+        elif daughtersOfSon == 1:
+            self.quote = Fraction(1, 2)
+            self.quote_reason = gettext_noop("Daughter of son gets 1/2 when she has no other sibling/s")
         else:
-            self.quote = 2/3
-            self.quote_reason = _("Daughters of son share the quote of 2/3 when there is no son/s of son")
+            self.quote = Fraction(2, 3)
+            self.quote_reason = gettext_noop("Daughters of son share the quote of 2/3 when there is no son/s of son")
         self.save()
         return self.quote
 
@@ -1244,41 +1576,41 @@ class PaternalSister(Heir):
         calc.deceased_set.first().add_paternalSister(sister=self)
 
     def get_quote(self, calc):
-        paternalSisters = calc.heir_set.instance_of(PaternalSister)
-        if paternalSisters.count() > 1:
+        paternalSisters = calc.count_heirs(PaternalSister)
+        if paternalSisters > 1:
             self.shared_quote = True
         if calc.has_male_descendent():
             self.blocked = True
-            self.quote_reason = _("Paternal sister/s are blocked by male descendant")
+            self.quote_reason = gettext_noop("Paternal sister/s are blocked by male descendant")
         elif calc.has_father():
             self.blocked = True
-            self.quote_reason = _("Paternal sister/s are blocked by father")
+            self.quote_reason = gettext_noop("Paternal sister/s are blocked by father")
         elif calc.has_grandFather():
             self.blocked = True
-            self.quote_reason = _("Paternal sister/s are blocked by grandfather")
+            self.quote_reason = gettext_noop("Paternal sister/s are blocked by grandfather")
         elif calc.has_brother():
             self.blocked = True
-            self.quote_reason = _("Paternal sister/s are blocked by borther/s")
+            self.quote_reason = gettext_noop("Paternal sister/s are blocked by borther/s")
         elif calc.has_paternalBrother():
             self.asaba = True
-            self.quote_reason = _("Paternal sister/s with paternal half borther/s share the remainder or all the amount if no other heir exist. The brother will receive a share of two sisters")
+            self.quote_reason = gettext_noop("Paternal sister/s with paternal half borther/s share the remainder or all the amount if no other heir exist. The brother will receive a share of two sisters")
         elif calc.has_sister():
-            sisters= calc.heir_set.instance_of(Sister)
-            if sisters.count()==1:
-                self.quote = 1/6
-                self.quote_reason = _("Paternal sister/s get 1/6 with sister")
+            sisters= calc.count_heirs(Sister)
+            if sisters==1:
+                self.quote = Fraction(1, 6)
+                self.quote_reason = gettext_noop("Paternal sister/s get 1/6 with sister")
             else:
                 self.blocked = True
-                self.quote_reason = _("Paternal sisters/s are blocked by sisters")
+                self.quote_reason = gettext_noop("Paternal sisters/s are blocked by sisters")
         elif calc.has_female_descendent():
             self.asaba = True
-            self.quote_reason = _("Paternal sister/s with female descendant share the remainder")
-        elif paternalSisters.count() == 1:
-            self.quote = 1/2
-            self.quote_reason = _("Paternal sister gets half when no father or son. ")
+            self.quote_reason = gettext_noop("Paternal sister/s with female descendant share the remainder")
+        elif paternalSisters == 1:
+            self.quote = Fraction(1, 2)
+            self.quote_reason = gettext_noop("Paternal sister gets half when no father or son. ")
         else:
-            self.quote = 2/3
-            self.quote_reason = _("Paternal sisters share 2/3 when no father or son.")
+            self.quote = Fraction(2, 3)
+            self.quote_reason = gettext_noop("Paternal sisters share 2/3 when no father or son.")
         self.save()
         return self.quote
 
@@ -1288,32 +1620,32 @@ class PaternalBrother(Heir):
         calc.deceased_set.first().add_paternalBrother(brother=self)
 
     def get_quote(self, calc):
-        paternalBrothers = calc.heir_set.instance_of(PaternalBrother)
-        if paternalBrothers.count() > 1:
+        paternalBrothers = calc.count_heirs(PaternalBrother)
+        if paternalBrothers > 1:
             self.shared_quote = True
         if calc.has_male_descendent():
             self.blocked = True
-            self.quote_reason = _("Paternal brother/s are blocked by male descendant")
+            self.quote_reason = gettext_noop("Paternal brother/s are blocked by male descendant")
         elif calc.has_father():
             self.blocked = True
-            self.quote_reason = _("Paternal brother/s are blocked by father")
+            self.quote_reason = gettext_noop("Paternal brother/s are blocked by father")
         elif calc.has_grandFather():
             self.blocked = True
-            self.quote_reason = _("Paternal brother/s are blocked by grandfather")
+            self.quote_reason = gettext_noop("Paternal brother/s are blocked by grandfather")
         elif calc.has_brother():
             self.blocked = True
-            self.quote_reason = _("Paternal brother/s are blocked by brothers")
+            self.quote_reason = gettext_noop("Paternal brother/s are blocked by brothers")
         elif calc.has_sister():
             asaba = calc.get_sisters().filter(asaba=True)
             if asaba:
                 self.blocked = True
-                self.quote_reason = _("Paternal brother/s are blocked by sisters")
+                self.quote_reason = gettext_noop("Paternal brother/s are blocked by sisters")
             else:
                 self.asaba = True
-                self.quote_reason = _("Paternal brother/s share the remainder or all amount if no other heir exist")
+                self.quote_reason = gettext_noop("Paternal brother/s share the remainder or all amount if no other heir exist")
         else:
             self.asaba =  True
-            self.quote_reason = _("Paternal brother/s share the remainder or all amount if no other heir exist")
+            self.quote_reason = gettext_noop("Paternal brother/s share the remainder or all amount if no other heir exist")
         self.save()
         return self.quote
 
@@ -1323,30 +1655,30 @@ class MaternalSister(Heir):
         calc.deceased_set.first().add_maternalSister(sister=self)
 
     def get_quote(self, calc):
-        maternalSisters = calc.heir_set.instance_of(MaternalSister)
-        if maternalSisters.count() > 1:
+        maternalSisters = calc.count_heirs(MaternalSister)
+        if maternalSisters > 1:
             self.shared_quote = True
         if calc.has_descendent():
             self.blocked = True
-            self.quote_reason = _("Maternal sister/s are blocked by descendant")
+            self.quote_reason = gettext_noop("Maternal sister/s are blocked by descendant")
         elif calc.has_father():
             self.blocked = True
-            self.quote_reason = _("Maternal sister/s are blocked by father")
+            self.quote_reason = gettext_noop("Maternal sister/s are blocked by father")
         elif calc.has_grandFather():
             self.blocked = True
-            self.quote_reason = _("Maternal sister/s are blocked by grandfather")
+            self.quote_reason = gettext_noop("Maternal sister/s are blocked by grandfather")
         elif calc.has_maternalBrother():
             calc.maternal_quote = True
             calc.save()
             self.shared_quote = True
-            self.quote = 1/3
-            self.quote_reason = _("Maternal sister/s with maternal brother/s share 1/3")
-        elif maternalSisters.count() == 1:
-            self.quote =  1/6
-            self.quote_reason = _("Maternal sister get 1/6")
+            self.quote = Fraction(1, 3)
+            self.quote_reason = gettext_noop("Maternal sister/s with maternal brother/s share 1/3")
+        elif maternalSisters == 1:
+            self.quote = Fraction(1, 6)
+            self.quote_reason = gettext_noop("Maternal sister get 1/6")
         else:
-            self.quote = 1/3
-            self.quote_reason = _("Maternal sisters share 1/3")
+            self.quote = Fraction(1, 3)
+            self.quote_reason = gettext_noop("Maternal sisters share 1/3")
         self.save()
         return self.quote
 
@@ -1356,30 +1688,30 @@ class MaternalBrother(Heir):
         calc.deceased_set.first().add_maternalBrother(brother=self)
 
     def get_quote(self, calc):
-        MaternalBrothers = calc.heir_set.instance_of(MaternalBrother)
-        if MaternalBrothers.count() > 1:
+        MaternalBrothers = calc.count_heirs(MaternalBrother)
+        if MaternalBrothers > 1:
             self.shared_quote = True
         if calc.has_descendent():
             self.blocked = True
-            self.quote_reason = _("Maternal brother/s are blocked by descendant")
+            self.quote_reason = gettext_noop("Maternal brother/s are blocked by descendant")
         elif calc.has_father():
             self.blocked = True
-            self.quote_reason = _("Maternal brother/s are blocked by father")
+            self.quote_reason = gettext_noop("Maternal brother/s are blocked by father")
         elif calc.has_grandFather():
             self.blocked = True
-            self.quote_reason = _("Maternal brother/s are blocked by grandfather")
+            self.quote_reason = gettext_noop("Maternal brother/s are blocked by grandfather")
         elif calc.has_maternalSister():
             calc.maternal_quote = True
             calc.save()
             self.shared_quote = True
-            self.quote = 1/3
-            self.quote_reason = _("Maternal brother/s with maternal sister/s share 1/3")
-        elif MaternalBrothers.count() == 1:
-            self.quote =  1/6
-            self.quote_reason = _("Maternal brother get 1/6")
+            self.quote = Fraction(1, 3)
+            self.quote_reason = gettext_noop("Maternal brother/s with maternal sister/s share 1/3")
+        elif MaternalBrothers == 1:
+            self.quote = Fraction(1, 6)
+            self.quote_reason = gettext_noop("Maternal brother get 1/6")
         else:
-            self.quote = 1/3
-            self.quote_reason = _("Maternal brothers share 1/3")
+            self.quote = Fraction(1, 3)
+            self.quote_reason = gettext_noop("Maternal brothers share 1/3")
         self.save()
         return self.quote
 
@@ -1389,33 +1721,33 @@ class SonOfBrother(Heir):
         calc.deceased_set.first().add_sonOfBrother(sonOfBrother=self)
 
     def get_quote(self, calc):
-        sonsOfBrother = calc.heir_set.instance_of(SonOfBrother)
-        if sonsOfBrother.count() > 1:
+        sonsOfBrother = calc.count_heirs(SonOfBrother)
+        if sonsOfBrother > 1:
             self.shared_quote = True
         if calc.has_male_descendent():
             self.blocked = True
-            self.quote_reason = _("Son/s of Brother are blocked by male descendant")
+            self.quote_reason = gettext_noop("Son/s of Brother are blocked by male descendant")
         elif calc.has_father():
             self.blocked = True
-            self.quote_reason = _("Son/s of Brother are blocked by father")
+            self.quote_reason = gettext_noop("Son/s of Brother are blocked by father")
         elif calc.has_grandFather():
             self.blocked = True
-            self.quote_reason = _("Son/s of Brother are blocked by grandfather")
+            self.quote_reason = gettext_noop("Son/s of Brother are blocked by grandfather")
         elif calc.has_brother():
             self.blocked = True
-            self.quote_reason = _("Son/s of Brother are blocked by brother/s")
+            self.quote_reason = gettext_noop("Son/s of Brother are blocked by brother/s")
         elif calc.get_sisters().filter(asaba=True):
             self.blocked = True
-            self.quote_reason = _("Son/s of Brother are blocked by sisters")
+            self.quote_reason = gettext_noop("Son/s of Brother are blocked by sisters")
         elif calc.has_paternalBrother():
             self.blocked = True
-            self.quote_reason = _("Son/s of Brother are blocked by paternal brother/s")
+            self.quote_reason = gettext_noop("Son/s of Brother are blocked by paternal brother/s")
         elif calc.get_paternalSisters().filter(asaba=True):
             self.blocked = True
-            self.quote_reason = _("Son/s of Brother are blocked by paternal sister/s")
+            self.quote_reason = gettext_noop("Son/s of Brother are blocked by paternal sister/s")
         else:
             self.asaba =  True
-            self.quote_reason = _("Son/s of Brother share the remainder or all amount if no other heir exist")
+            self.quote_reason = gettext_noop("Son/s of Brother share the remainder or all amount if no other heir exist")
         self.save()
         return self.quote
 
@@ -1425,36 +1757,36 @@ class SonOfPaternalBrother(Heir):
         calc.deceased_set.first().add_sonOfPaternalBrother(sonOfPaternalBrother=self)
 
     def get_quote(self, calc):
-        sonsOfPaternalBrother = calc.heir_set.instance_of(SonOfPaternalBrother)
-        if sonsOfPaternalBrother.count() > 1:
+        sonsOfPaternalBrother = calc.count_heirs(SonOfPaternalBrother)
+        if sonsOfPaternalBrother > 1:
             self.shared_quote = True
         if calc.has_male_descendent():
             self.blocked = True
-            self.quote_reason = _("Son/s of Paternal Brother are blocked by male descendant")
+            self.quote_reason = gettext_noop("Son/s of Paternal Brother are blocked by male descendant")
         elif calc.has_father():
             self.blocked = True
-            self.quote_reason = _("Son/s of Paternal Brother are blocked by father")
+            self.quote_reason = gettext_noop("Son/s of Paternal Brother are blocked by father")
         elif calc.has_grandFather():
             self.blocked = True
-            self.quote_reason = _("Son/s of Paternal Brother are blocked by grandfather")
+            self.quote_reason = gettext_noop("Son/s of Paternal Brother are blocked by grandfather")
         elif calc.has_brother():
             self.blocked = True
-            self.quote_reason = _("Son/s of Paternal Brother are blocked by brother/s")
+            self.quote_reason = gettext_noop("Son/s of Paternal Brother are blocked by brother/s")
         elif calc.get_sisters().filter(asaba=True):
             self.blocked = True
-            self.quote_reason = _("Son/s of Paternal Brother are blocked by sisters")
+            self.quote_reason = gettext_noop("Son/s of Paternal Brother are blocked by sisters")
         elif calc.has_paternalBrother():
             self.blocked = True
-            self.quote_reason = _("Son/s of Paternal Brother are blocked by paternal brother/s")
+            self.quote_reason = gettext_noop("Son/s of Paternal Brother are blocked by paternal brother/s")
         elif calc.get_paternalSisters().filter(asaba=True):
             self.blocked = True
-            self.quote_reason = _("Son/s of Paternal Brother are blocked by paternal sister/s")
+            self.quote_reason = gettext_noop("Son/s of Paternal Brother are blocked by paternal sister/s")
         elif calc.has_sonOfBrother():
             self.blocked = True
-            self.quote_reason = _("Son/s of Paternal Brother are blocked by sons of brother")
+            self.quote_reason = gettext_noop("Son/s of Paternal Brother are blocked by sons of brother")
         else:
             self.asaba =  True
-            self.quote_reason = _("Son/s of Paternal Brother share the remainder or all amount if no other heir exist")
+            self.quote_reason = gettext_noop("Son/s of Paternal Brother share the remainder or all amount if no other heir exist")
         self.save()
         return self.quote
 
@@ -1464,39 +1796,39 @@ class Uncle(Heir):
         calc.deceased_set.first().add_uncle(uncle=self)
 
     def get_quote(self, calc):
-        uncles = calc.heir_set.instance_of(Uncle)
-        if uncles.count() > 1:
+        uncles = calc.count_heirs(Uncle)
+        if uncles > 1:
             self.shared_quote = True
         if calc.has_male_descendent():
             self.blocked = True
-            self.quote_reason = _("Uncle/s are blocked by male descendant")
+            self.quote_reason = gettext_noop("Uncle/s are blocked by male descendant")
         elif calc.has_father():
             self.blocked = True
-            self.quote_reason = _("Uncle/s are blocked by father")
+            self.quote_reason = gettext_noop("Uncle/s are blocked by father")
         elif calc.has_grandFather():
             self.blocked = True
-            self.quote_reason = _("Uncle/s are blocked by grandfather")
+            self.quote_reason = gettext_noop("Uncle/s are blocked by grandfather")
         elif calc.has_brother():
             self.blocked = True
-            self.quote_reason = _("Uncle/s are blocked by brother/s")
+            self.quote_reason = gettext_noop("Uncle/s are blocked by brother/s")
         elif calc.get_sisters().filter(asaba=True):
             self.blocked = True
-            self.quote_reason = _("Uncle/s are blocked by sisters")
+            self.quote_reason = gettext_noop("Uncle/s are blocked by sisters")
         elif calc.has_paternalBrother():
             self.blocked = True
-            self.quote_reason = _("Uncle/s are blocked by paternal brother/s")
+            self.quote_reason = gettext_noop("Uncle/s are blocked by paternal brother/s")
         elif calc.get_paternalSisters().filter(asaba=True):
             self.blocked = True
-            self.quote_reason = _("Uncle/s are blocked by paternal sister/s")
+            self.quote_reason = gettext_noop("Uncle/s are blocked by paternal sister/s")
         elif calc.has_sonOfBrother():
             self.blocked = True
-            self.quote_reason = _("Uncle/s are blocked by sons of brother")
+            self.quote_reason = gettext_noop("Uncle/s are blocked by sons of brother")
         elif calc.has_sonOfPaternalBrother():
             self.blocked = True
-            self.quote_reason = _("Uncle/s are blocked by sons of paternal brother")
+            self.quote_reason = gettext_noop("Uncle/s are blocked by sons of paternal brother")
         else:
             self.asaba =  True
-            self.quote_reason = _("Uncle/s share the remainder or all amount if no other heir exist")
+            self.quote_reason = gettext_noop("Uncle/s share the remainder or all amount if no other heir exist")
         self.save()
         return self.quote
 
@@ -1506,42 +1838,42 @@ class PaternalUncle(Heir):
         calc.deceased_set.first().add_paternalUncle(uncle=self)
 
     def get_quote(self, calc):
-        paternalUncles = calc.heir_set.instance_of(PaternalUncle)
-        if paternalUncles.count() > 1:
+        paternalUncles = calc.count_heirs(PaternalUncle)
+        if paternalUncles > 1:
             self.shared_quote = True
         if calc.has_male_descendent():
             self.blocked = True
-            self.quote_reason = _("Paternal Uncle/s are blocked by male descendant")
+            self.quote_reason = gettext_noop("Paternal Uncle/s are blocked by male descendant")
         elif calc.has_father():
             self.blocked = True
-            self.quote_reason = _("Paternal Uncle/s are blocked by father")
+            self.quote_reason = gettext_noop("Paternal Uncle/s are blocked by father")
         elif calc.has_grandFather():
             self.blocked = True
-            self.quote_reason = _("Paternal Uncle/s are blocked by grandfather")
+            self.quote_reason = gettext_noop("Paternal Uncle/s are blocked by grandfather")
         elif calc.has_brother():
             self.blocked = True
-            self.quote_reason = _("Paternal Uncle/s are blocked by brother/s")
+            self.quote_reason = gettext_noop("Paternal Uncle/s are blocked by brother/s")
         elif calc.get_sisters().filter(asaba=True):
             self.blocked = True
-            self.quote_reason = _("Paternal Uncle/s are blocked by sisters")
+            self.quote_reason = gettext_noop("Paternal Uncle/s are blocked by sisters")
         elif calc.has_paternalBrother():
             self.blocked = True
-            self.quote_reason = _("Paternal Uncle/s are blocked by paternal brother/s")
+            self.quote_reason = gettext_noop("Paternal Uncle/s are blocked by paternal brother/s")
         elif calc.get_paternalSisters().filter(asaba=True):
             self.blocked = True
-            self.quote_reason = _("Paternal Uncle/s are blocked by paternal sister/s")
+            self.quote_reason = gettext_noop("Paternal Uncle/s are blocked by paternal sister/s")
         elif calc.has_sonOfBrother():
             self.blocked = True
-            self.quote_reason = _("Paternal Uncle/s are blocked by sons of brother")
+            self.quote_reason = gettext_noop("Paternal Uncle/s are blocked by sons of brother")
         elif calc.has_sonOfPaternalBrother():
             self.blocked = True
-            self.quote_reason = _("Paternal Uncle/s are blocked by sons of paternal brother")
+            self.quote_reason = gettext_noop("Paternal Uncle/s are blocked by sons of paternal brother")
         elif calc.has_uncle():
             self.blocked = True
-            self.quote_reason = _("Paternal Uncle/s are blocked by uncle/s")
+            self.quote_reason = gettext_noop("Paternal Uncle/s are blocked by uncle/s")
         else:
             self.asaba =  True
-            self.quote_reason = _("Paternal Uncle/s share the remainder or all amount if no other heir exist")
+            self.quote_reason = gettext_noop("Paternal Uncle/s share the remainder or all amount if no other heir exist")
         self.save()
         return self.quote
 
@@ -1551,45 +1883,45 @@ class SonOfUncle(Heir):
         calc.deceased_set.first().add_sonOfUncle(sonOfUncle=self)
 
     def get_quote(self, calc):
-        sonsOfUncle = calc.heir_set.instance_of(SonOfUncle)
-        if sonsOfUncle.count() > 1:
+        sonsOfUncle = calc.count_heirs(SonOfUncle)
+        if sonsOfUncle > 1:
             self.shared_quote = True
         if calc.has_male_descendent():
             self.blocked = True
-            self.quote_reason = _("Son/s of uncle are blocked by male descendant")
+            self.quote_reason = gettext_noop("Son/s of uncle are blocked by male descendant")
         elif calc.has_father():
             self.blocked = True
-            self.quote_reason = _("Son/s of Uncle/s are blocked by father")
+            self.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by father")
         elif calc.has_grandFather():
             self.blocked = True
-            self.quote_reason = _("Son/s of Uncle/s are blocked by grandfather")
+            self.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by grandfather")
         elif calc.has_brother():
             self.blocked = True
-            self.quote_reason = _("Son/s of Uncle/s are blocked by brother/s")
+            self.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by brother/s")
         elif calc.get_sisters().filter(asaba=True):
             self.blocked = True
-            self.quote_reason = _("Son/s of Uncle/s are blocked by sisters")
+            self.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by sisters")
         elif calc.has_paternalBrother():
             self.blocked = True
-            self.quote_reason = _("Son/s of Uncle/s are blocked by paternal brother/s")
+            self.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by paternal brother/s")
         elif calc.get_paternalSisters().filter(asaba=True):
             self.blocked = True
-            self.quote_reason = _("Son/s of Uncle/s are blocked by paternal sister/s")
+            self.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by paternal sister/s")
         elif calc.has_sonOfBrother():
             self.blocked = True
-            self.quote_reason = _("Son/s of Uncle/s are blocked by sons of brother")
+            self.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by sons of brother")
         elif calc.has_sonOfPaternalBrother():
             self.blocked = True
-            self.quote_reason = _("Son/s of Uncle/s are blocked by sons of paternal brother")
+            self.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by sons of paternal brother")
         elif calc.has_uncle():
             self.blocked = True
-            self.quote_reason = _("Son/s of Uncle/s are blocked by uncle/s")
+            self.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by uncle/s")
         elif calc.has_paternalUncle():
             self.blocked = True
-            self.quote_reason = _("Son/s of Uncle/s are blocked by paternal uncle/s")
+            self.quote_reason = gettext_noop("Son/s of Uncle/s are blocked by paternal uncle/s")
         else:
             self.asaba =  True
-            self.quote_reason = _("Son/s of Uncle/s share the remainder or all amount if no other heir exist")
+            self.quote_reason = gettext_noop("Son/s of Uncle/s share the remainder or all amount if no other heir exist")
         self.save()
         return self.quote
 
@@ -1599,47 +1931,54 @@ class SonOfPaternalUncle(Heir):
         calc.deceased_set.first().add_sonOfPaternalUncle(sonOfPaternalUncle=self)
 
     def get_quote(self, calc):
-        sonsOfPaternalUncle = calc.heir_set.instance_of(SonOfPaternalUncle)
-        if sonsOfPaternalUncle.count() > 1:
+        sonsOfPaternalUncle = calc.count_heirs(SonOfPaternalUncle)
+        if sonsOfPaternalUncle > 1:
             self.shared_quote = True
         if calc.has_male_descendent():
             self.blocked = True
-            self.quote_reason = _("Son/s of paternal uncle are blocked by male descendant")
+            self.quote_reason = gettext_noop("Son/s of paternal uncle are blocked by male descendant")
         elif calc.has_father():
             self.blocked = True
-            self.quote_reason = _("Son/s of paternal Uncle/s are blocked by father")
+            self.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by father")
         elif calc.has_grandFather():
             self.blocked = True
-            self.quote_reason = _("Son/s of paternal Uncle/s are blocked by grandfather")
+            self.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by grandfather")
         elif calc.has_brother():
             self.blocked = True
-            self.quote_reason = _("Son/s of paternal Uncle/s are blocked by brother/s")
+            self.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by brother/s")
         elif calc.get_sisters().filter(asaba=True):
             self.blocked = True
-            self.quote_reason = _("Son/s of paternal Uncle/s are blocked by sisters")
+            self.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by sisters")
         elif calc.has_paternalBrother():
             self.blocked = True
-            self.quote_reason = _("Son/s of paternal Uncle/s are blocked by paternal brother/s")
+            self.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by paternal brother/s")
         elif calc.get_paternalSisters().filter(asaba=True):
             self.blocked = True
-            self.quote_reason = _("Son/s of paternal Uncle/s are blocked by paternal sister/s")
+            self.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by paternal sister/s")
         elif calc.has_sonOfBrother():
             self.blocked = True
-            self.quote_reason = _("Son/s of paternal Uncle/s are blocked by sons of brother")
+            self.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by sons of brother")
         elif calc.has_sonOfPaternalBrother():
             self.blocked = True
-            self.quote_reason = _("Son/s of paternal Uncle/s are blocked by sons of paternal brother")
+            self.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by sons of paternal brother")
         elif calc.has_uncle():
             self.blocked = True
-            self.quote_reason = _("Son/s of paternal Uncle/s are blocked by uncle/s")
+            self.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by uncle/s")
         elif calc.has_paternalUncle():
             self.blocked = True
-            self.quote_reason = _("Son/s of paternal Uncle/s are blocked by paternal uncle/s")
+            self.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by paternal uncle/s")
         elif calc.has_sonOfUncle():
             self.blocked = True
-            self.quote_reason = _("Son/s of paternal Uncle/s are blocked by son/s of uncle/s")
+            self.quote_reason = gettext_noop("Son/s of paternal Uncle/s are blocked by son/s of uncle/s")
         else:
             self.asaba =  True
-            self.quote_reason = _("Son/s of paternal Uncle/s share the remainder or all amount if no other heir exist")
+            self.quote_reason = gettext_noop("Son/s of paternal Uncle/s share the remainder or all amount if no other heir exist")
         self.save()
         return self.quote
+
+
+def heir_order():
+    """Heir types in polymorphic_ctype_id order, the order get_quotes() visits them in"""
+    heir_models = {kind: globals()[kind] for kind in HEIR_TYPES}
+    content_types = ContentType.objects.get_for_models(*heir_models.values())
+    return tuple(sorted(HEIR_TYPES, key=lambda kind: content_types[heir_models[kind]].id))
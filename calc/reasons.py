@@ -0,0 +1,175 @@
+"""
+Quote reason codes.
+
+A reason is stored as its index in REASONS, a small integer, on every heir
+row and Result snapshot group. The text is looked up at render time in the
+active language, from a tuple of every reason translated once per language,
+so stored results don't depend on the language of the request that computed
+them. REASONS only grows at the end: a stored code must keep its meaning.
+"""
+from functools import lru_cache
+
+from django.utils import translation
+from django.utils.translation import gettext, gettext_noop
+
+
+REASONS = (
+    "",
+    gettext_noop("father gets 1/6 prescribed share because of male descendant"),
+    gettext_noop("father gets 1/6 plus remainder because of female descendant"),
+    gettext_noop("father gets the remainder because there is no descendant"),
+    gettext_noop("mother gets 1/6 because of descendant"),
+    gettext_noop("mother gets 1/6 because of siblings"),
+    gettext_noop("mother gets 1/3 of the remainder which is 1/4."),
+    gettext_noop("mother gets 1/3 of the remainder which is 1/6"),
+    gettext_noop("mother gets 1/3 because no descendant or siblings"),
+    gettext_noop("husband gets 1/4 becuase of descendant"),
+    gettext_noop("husband gets 1/2 becuase there is no descendant"),
+    gettext_noop("wife gets 1/8 becuase of descendant"),
+    gettext_noop("wife gets 1/4 becuase there is no descendant"),
+    gettext_noop("wives share the qoute of 1/8 becuase of descendant"),
+    gettext_noop("wives share the quote of 1/4 becuase there is no descendant"),
+    gettext_noop("Daughter/s with Son/s share the residuary. The son will receive a share of two daughters."),
+    gettext_noop("Daughter gets 1/2 when she has no other sibling/s"),
+    gettext_noop("Daughters share the quote of 2/3 when there is no son/s"),
+    gettext_noop("Son/s share the remainder or all amount if no other heir exist"),
+    gettext_noop("Bother/s are blocked by male descendant"),
+    gettext_noop("Brother/s are blocked by father"),
+    gettext_noop("Brother/s are blocked by grandfather"),
+    gettext_noop("Brother/s share the remainder or all amount if no other heir exist"),
+    gettext_noop("Sister/s are blocked by male descendant"),
+    gettext_noop("Sister/s are blocked by father"),
+    gettext_noop("Sister/s are blocked by grandfather"),
+    gettext_noop("Sister/s with borther/s share the remainder or all the amount if no other heir exist. The brother will receive a share of two sisters"),
+    gettext_noop("Sister/s with female descendant share the remainder"),
+    gettext_noop("Sister gets half when no father or son. "),
+    gettext_noop("Sisters share 2/3 when no father or son."),
+    gettext_noop("Grandfather is blocked by father"),
+    gettext_noop("Grandfather gets 1/6 prescribed share because of male descendant"),
+    gettext_noop("Grandfather gets 1/6 plus remainder because of female descendant"),
+    gettext_noop("Grandfather gets the remainder because there is no descendant"),
+    gettext_noop("Grandmother is blocked by mother"),
+    gettext_noop("Grandmother gets 1/6 if no mother"),
+    gettext_noop("Son of son is blocked by Son"),
+    gettext_noop("Son of son share the remainder or all amount if no other heir exist"),
+    gettext_noop("Daughter of son is blocked by son"),
+    gettext_noop("Daughter/s of son with Son/s of son share the residuary. The son of son will receive a share of two daughters of son."),
+    gettext_noop("Daughter of son get 1/6, with daughter"),
+    gettext_noop("Daughter/s of son are blocked by daugters"),
+    gettext_noop("Daughter of son gets 1/2 when she has no other sibling/s"),
+    gettext_noop("Daughters of son share the quote of 2/3 when there is no son/s of son"),
+    gettext_noop("Paternal sister/s are blocked by male descendant"),
+    gettext_noop("Paternal sister/s are blocked by father"),
+    gettext_noop("Paternal sister/s are blocked by grandfather"),
+    gettext_noop("Paternal sister/s are blocked by borther/s"),
+    gettext_noop("Paternal sister/s with paternal half borther/s share the remainder or all the amount if no other heir exist. The brother will receive a share of two sisters"),
+    gettext_noop("Paternal sister/s get 1/6 with sister"),
+    gettext_noop("Paternal sisters/s are blocked by sisters"),
+    gettext_noop("Paternal sister/s with female descendant share the remainder"),
+    gettext_noop("Paternal sister gets half when no father or son. "),
+    gettext_noop("Paternal sisters share 2/3 when no father or son."),
+    gettext_noop("Paternal brother/s are blocked by male descendant"),
+    gettext_noop("Paternal brother/s are blocked by father"),
+    gettext_noop("Paternal brother/s are blocked by grandfather"),
+    gettext_noop("Paternal brother/s are blocked by brothers"),
+    gettext_noop("Paternal brother/s are blocked by sisters"),
+    gettext_noop("Paternal brother/s share the remainder or all amount if no other heir exist"),
+    gettext_noop("Maternal sister/s are blocked by descendant"),
+    gettext_noop("Maternal sister/s are blocked by father"),
+    gettext_noop("Maternal sister/s are blocked by grandfather"),
+    gettext_noop("Maternal sister/s with maternal brother/s share 1/3"),
+    gettext_noop("Maternal sister get 1/6"),
+    gettext_noop("Maternal sisters share 1/3"),
+    gettext_noop("Maternal brother/s are blocked by descendant"),
+    gettext_noop("Maternal brother/s are blocked by father"),
+    gettext_noop("Maternal brother/s are blocked by grandfather"),
+    gettext_noop("Maternal brother/s with maternal sister/s share 1/3"),
+    gettext_noop("Maternal brother get 1/6"),
+    gettext_noop("Maternal brothers share 1/3"),
+    gettext_noop("Son/s of Brother are blocked by male descendant"),
+    gettext_noop("Son/s of Brother are blocked by father"),
+    gettext_noop("Son/s of Brother are blocked by grandfather"),
+    gettext_noop("Son/s of Brother are blocked by brother/s"),
+    gettext_noop("Son/s of Brother are blocked by sisters"),
+    gettext_noop("Son/s of Brother are blocked by paternal brother/s"),
+    gettext_noop("Son/s of Brother are blocked by paternal sister/s"),
+    gettext_noop("Son/s of Brother share the remainder or all amount if no other heir exist"),
+    gettext_noop("Son/s of Paternal Brother are blocked by male descendant"),
+    gettext_noop("Son/s of Paternal Brother are blocked by father"),
+    gettext_noop("Son/s of Paternal Brother are blocked by grandfather"),
+    gettext_noop("Son/s of Paternal Brother are blocked by brother/s"),
+    gettext_noop("Son/s of Paternal Brother are blocked by sisters"),
+    gettext_noop("Son/s of Paternal Brother are blocked by paternal brother/s"),
+    gettext_noop("Son/s of Paternal Brother are blocked by paternal sister/s"),
+    gettext_noop("Son/s of Paternal Brother are blocked by sons of brother"),
+    gettext_noop("Son/s of Paternal Brother share the remainder or all amount if no other heir exist"),
+    gettext_noop("Uncle/s are blocked by male descendant"),
+    gettext_noop("Uncle/s are blocked by father"),
+    gettext_noop("Uncle/s are blocked by grandfather"),
+    gettext_noop("Uncle/s are blocked by brother/s"),
+    gettext_noop("Uncle/s are blocked by sisters"),
+    gettext_noop("Uncle/s are blocked by paternal brother/s"),
+    gettext_noop("Uncle/s are blocked by paternal sister/s"),
+    gettext_noop("Uncle/s are blocked by sons of brother"),
+    gettext_noop("Uncle/s are blocked by sons of paternal brother"),
+    gettext_noop("Uncle/s share the remainder or all amount if no other heir exist"),
+    gettext_noop("Paternal Uncle/s are blocked by male descendant"),
+    gettext_noop("Paternal Uncle/s are blocked by father"),
+    gettext_noop("Paternal Uncle/s are blocked by grandfather"),
+    gettext_noop("Paternal Uncle/s are blocked by brother/s"),
+    gettext_noop("Paternal Uncle/s are blocked by sisters"),
+    gettext_noop("Paternal Uncle/s are blocked by paternal brother/s"),
+    gettext_noop("Paternal Uncle/s are blocked by paternal sister/s"),
+    gettext_noop("Paternal Uncle/s are blocked by sons of brother"),
+    gettext_noop("Paternal Uncle/s are blocked by sons of paternal brother"),
+    gettext_noop("Paternal Uncle/s are blocked by uncle/s"),
+    gettext_noop("Paternal Uncle/s share the remainder or all amount if no other heir exist"),
+    gettext_noop("Son/s of uncle are blocked by male descendant"),
+    gettext_noop("Son/s of Uncle/s are blocked by father"),
+    gettext_noop("Son/s of Uncle/s are blocked by grandfather"),
+    gettext_noop("Son/s of Uncle/s are blocked by brother/s"),
+    gettext_noop("Son/s of Uncle/s are blocked by sisters"),
+    gettext_noop("Son/s of Uncle/s are blocked by paternal brother/s"),
+    gettext_noop("Son/s of Uncle/s are blocked by paternal sister/s"),
+    gettext_noop("Son/s of Uncle/s are blocked by sons of brother"),
+    gettext_noop("Son/s of Uncle/s are blocked by sons of paternal brother"),
+    gettext_noop("Son/s of Uncle/s are blocked by uncle/s"),
+    gettext_noop("Son/s of Uncle/s are blocked by paternal uncle/s"),
+    gettext_noop("Son/s of Uncle/s share the remainder or all amount if no other heir exist"),
+    gettext_noop("Son/s of paternal uncle are blocked by male descendant"),
+    gettext_noop("Son/s of paternal Uncle/s are blocked by father"),
+    gettext_noop("Son/s of paternal Uncle/s are blocked by grandfather"),
+    gettext_noop("Son/s of paternal Uncle/s are blocked by brother/s"),
+    gettext_noop("Son/s of paternal Uncle/s are blocked by sisters"),
+    gettext_noop("Son/s of paternal Uncle/s are blocked by paternal brother/s"),
+    gettext_noop("Son/s of paternal Uncle/s are blocked by paternal sister/s"),
+    gettext_noop("Son/s of paternal Uncle/s are blocked by sons of brother"),
+    gettext_noop("Son/s of paternal Uncle/s are blocked by sons of paternal brother"),
+    gettext_noop("Son/s of paternal Uncle/s are blocked by uncle/s"),
+    gettext_noop("Son/s of paternal Uncle/s are blocked by paternal uncle/s"),
+    gettext_noop("Son/s of paternal Uncle/s are blocked by son/s of uncle/s"),
+    gettext_noop("Son/s of paternal Uncle/s share the remainder or all amount if no other heir exist"),
+    gettext_noop("Asaba with maternal siblings share 1/3"),
+)
+
+REASON_CODES = {reason: code for code, reason in enumerate(REASONS)}
+
+
+def get_code(reason):
+    """Code of an untranslated reason"""
+    try:
+        return REASON_CODES[reason]
+    except KeyError:
+        raise ValueError(f"Unknown quote reason {reason!r}") from None
+
+
+@lru_cache(maxsize=None)
+def get_texts(language):
+    """Every reason translated to language, by code"""
+    with translation.override(language):
+        return tuple(gettext(reason) if reason else "" for reason in REASONS)
+
+
+def get_reason(code):
+    """Text of a reason code in the active language"""
+    return get_texts(translation.get_language())[code]
@@ -0,0 +1,36 @@
+"""
+Catalogue of canonical heir compositions.
+
+From small families up to large counts of sons, wives and uncles, covering
+the special cases of the distribution: excess (awl), shortage (radd), the
+shortage with a spouse, correction (tashih) and the common quote
+(musharraka). `flags` are the calculation fields each scenario is expected
+to set, the tests keep the catalogue honest.
+"""
+from .engine import HEIR_SEX, HEIR_TYPES
+from . import models
+
+SCENARIOS = [
+    {'name': 'parents_son', 'deceased_sex': 'M', 'heirs': {'Father': 1, 'Mother': 1, 'Son': 1}, 'flags': ()},
+    {'name': 'husband_son', 'deceased_sex': 'F', 'heirs': {'Husband': 1, 'Son': 1}, 'flags': ()},
+    {'name': 'spouse_children', 'deceased_sex': 'M', 'heirs': {'Wife': 1, 'Daughter': 2, 'Son': 2}, 'flags': ('correction',)},
+    {'name': 'excess_minbariyya', 'deceased_sex': 'M', 'heirs': {'Wife': 1, 'Father': 1, 'Mother': 1, 'Daughter': 2}, 'flags': ('excess',)},
+    {'name': 'excess_husband_sisters', 'deceased_sex': 'F', 'heirs': {'Husband': 1, 'Sister': 2}, 'flags': ('excess',)},
+    {'name': 'shortage_mother_daughter', 'deceased_sex': 'M', 'heirs': {'Mother': 1, 'Daughter': 1}, 'flags': ('shortage',)},
+    {'name': 'shortage_with_spouse', 'deceased_sex': 'M', 'heirs': {'Wife': 1, 'Mother': 1, 'Daughter': 1}, 'flags': ('shortage', 'shortage_calc')},
+    {'name': 'correction_wives_brothers', 'deceased_sex': 'M', 'heirs': {'Wife': 3, 'Brother': 2}, 'flags': ('correction',)},
+    {'name': 'common_quote', 'deceased_sex': 'F', 'heirs': {'Husband': 1, 'Mother': 1, 'MaternalBrother': 2, 'Brother': 1}, 'flags': ('correction', 'common_quote')},
+    {'name': 'large_sons', 'deceased_sex': 'M', 'heirs': {'Wife': 4, 'Son': 200, 'Daughter': 100, 'Uncle': 50}, 'flags': ('correction',)},
+    {'name': 'large_uncles', 'deceased_sex': 'M', 'heirs': {'Wife': 4, 'Uncle': 200}, 'flags': ('correction',)},
+    {'name': 'large_grandchildren', 'deceased_sex': 'F', 'heirs': {'Husband': 1, 'SonOfSon': 60, 'DaughterOfSon': 40, 'PaternalUncle': 100}, 'flags': ('correction',)},
+]
+
+
+def build_scenario(scenario, user=None, estate=1000000):
+    """Create a calculation with the deceased and the heirs of a scenario"""
+    calc = models.Calculation.objects.create(name=scenario['name'], user=user)
+    models.Deceased.objects.create(first_name="Deceased", sex=scenario['deceased_sex'], estate=estate, calc=calc)
+    for kind in HEIR_TYPES:
+        for i in range(scenario['heirs'].get(kind, 0)):
+            getattr(models, kind).objects.create(first_name=f"{kind} {i + 1}", sex=HEIR_SEX[kind], calc=calc)
+    return calc
@@ -0,0 +1,27 @@
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from .models import HEIR_COUNT_FIELDS, Calculation, Deceased, Heir
+
+
+def get_composition_changes(sender, instance, signal, created):
+    """F() updates of the composition columns for a saved or deleted heir or deceased"""
+    field = HEIR_COUNT_FIELDS.get(sender.__name__)
+    if field and signal is post_delete:
+        return {field: F(field) - 1}
+    if field and created:
+        return {field: F(field) + 1}
+    if sender is Deceased:
+        return {'deceased_sex': "" if signal is post_delete else instance.sex}
+    return {}
+
+
+def person_changed(sender, instance, signal, created=False, **kwargs):
+    # any change to the heirs or the deceased, names included, makes the stored results stale
+    if instance.calc_id:
+        Calculation.mark_stale(instance.calc_id, **get_composition_changes(sender, instance, signal, created))
+
+
+# only the concrete types, a deleted heir also sends post_delete for its Heir and Person parent rows
+for model in (Deceased, *Heir.__subclasses__()):
+    post_save.connect(person_changed, sender=model)
+    post_delete.connect(person_changed, sender=model)
@@ -0,0 +1,207 @@
+"""
+Precomputed lookup table of bounded heir compositions.
+
+`python manage.py build_lookup_table` runs the engine once for every valid
+composition within the configured bounds and writes the share tables to a
+binary file. At runtime the file is memory mapped read only, the pages are
+shared by every worker process through the page cache and a lookup is an
+index computation and a few struct unpacks.
+
+Layout: a header (magic and metadata length), JSON metadata (the bounded
+heir types with their maximum count, the quote order the table was built
+with and the quote reasons), then one fixed size record per composition
+indexed by the deceased sex and the counts in mixed radix.
+"""
+from fractions import Fraction
+from itertools import product
+import json
+import mmap
+import struct
+
+from django.conf import settings
+
+from .engine import Engine, HeirState, ShareTable, HEIR_TYPES, CALC_FIELDS, MAX_COUNTS, is_valid
+
+MAGIC = b'MWRTBL01'
+HEADER = struct.Struct('<8sI')
+
+SEXES = ('M', 'F')
+
+DEFAULT_BOUNDS = {
+    'Father': 1,
+    'Mother': 1,
+    'Husband': 1,
+    'Wife': 4,
+    'Daughter': 4,
+    'Son': 4,
+}
+
+CALC_FLAGS = ('excess', 'shortage', 'correction', 'shortage_calc', 'maternal_quote', 'common_quote')
+CALC_INTS = tuple(field for field in CALC_FIELDS if field not in CALC_FLAGS)
+HEIR_FLAGS = ('shared_quote', 'asaba', 'blocked', 'correction', 'shortage_calc')
+HEIR_INTS = ('share', 'corrected_share', 'shorted_share', 'shortage_calc_share', 'shortage_union_share')
+
+# valid flag and calculation flags, calculation shares
+CALC_RECORD = struct.Struct('<B%dq' % len(CALC_INTS))
+# quote, heir shares, heir flags and quote reason index
+HEIR_RECORD = struct.Struct('<2q%dqBH' % len(HEIR_INTS))
+
+
+def parse_bounds(values):
+    """Bounds of TYPE=COUNT strings, each count capped at what the type allows"""
+    bounds = {}
+    for value in values:
+        kind, sep, count = value.partition('=')
+        if kind not in HEIR_TYPES or not count.isdigit():
+            raise ValueError(f"Invalid bound {value}, expected TYPE=COUNT with TYPE one of {', '.join(HEIR_TYPES)}")
+        bounds[kind] = min(int(count), MAX_COUNTS.get(kind, int(count)))
+    return bounds
+
+
+def pack_flags(obj, fields):
+    return sum(1 << i for i, field in enumerate(fields) if getattr(obj, field))
+
+
+def as_int(value):
+    if value != int(value):
+        raise ValueError(f"{value} is not a whole number of shares")
+    return int(value)
+
+
+def build_table(path, bounds=DEFAULT_BOUNDS, order=HEIR_TYPES):
+    """Compute every valid composition within bounds and write the table to path, return the number of records"""
+    kinds = [kind for kind in HEIR_TYPES if kind in bounds]
+    reasons = ['']
+    reason_index = {'': 0}
+    records = []
+    for deceased_sex in SEXES:
+        for counts in product(*(range(bounds[kind] + 1) for kind in kinds)):
+            composition = dict(zip(kinds, counts))
+            records.append(pack_record(composition, deceased_sex, kinds, order, reasons, reason_index))
+    metadata = json.dumps({
+        'types': [[kind, bounds[kind]] for kind in kinds],
+        'order': list(order),
+        'reasons': reasons,
+    }).encode()
+    with open(path, 'wb') as table:
+        table.write(HEADER.pack(MAGIC, len(metadata)))
+        table.write(metadata)
+        for record in records:
+            table.write(record)
+    return len(records)
+
+
+def pack_record(composition, deceased_sex, kinds, order, reasons, reason_index):
+    size = CALC_RECORD.size + HEIR_RECORD.size * len(kinds)
+    if not is_valid(composition, deceased_sex):
+        return bytes(size)
+    try:
+        engine = Engine.from_composition(composition, deceased_sex=deceased_sex, order=order).compute()
+        rows = ShareTable(engine, engine.heirs).rows
+        record = [CALC_RECORD.pack(1 | pack_flags(engine, CALC_FLAGS) << 1, *(as_int(getattr(engine, field)) for field in CALC_INTS))]
+        for kind in kinds:
+            row = rows.get(kind)
+            if row is None:
+                record.append(bytes(HEIR_RECORD.size))
+                continue
+            if row.quote_reason not in reason_index:
+                reason_index[row.quote_reason] = len(reasons)
+                reasons.append(row.quote_reason)
+            record.append(HEIR_RECORD.pack(
+                row.quote.numerator, row.quote.denominator,
+                *(as_int(getattr(row, field)) for field in HEIR_INTS),
+                pack_flags(row, HEIR_FLAGS), reason_index[row.quote_reason],
+            ))
+    except (ArithmeticError, ValueError):
+        # left out of the table, computed by the engine at runtime
+        return bytes(size)
+    return b''.join(record)
+
+
+class LookupTable:
+    """Read only, memory mapped lookup table"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as table:
+            self.buffer = mmap.mmap(table.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, length = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a lookup table")
+        metadata = json.loads(self.buffer[HEADER.size:HEADER.size + length])
+        self.kinds = [kind for kind, bound in metadata['types']]
+        self.bounds = dict(metadata['types'])
+        self.order = tuple(metadata['order'])
+        self.reasons = metadata['reasons']
+        self.offset = HEADER.size + length
+        self.record_size = CALC_RECORD.size + HEIR_RECORD.size * len(self.kinds)
+
+    def index(self, composition, deceased_sex):
+        """Record index of a composition, None when it is out of the table bounds"""
+        if deceased_sex not in SEXES:
+            return None
+        for kind, count in composition.items():
+            if count and count > self.bounds.get(kind, 0):
+                return None
+        index = SEXES.index(deceased_sex)
+        for kind in self.kinds:
+            index = index * (self.bounds[kind] + 1) + composition.get(kind, 0)
+        return index
+
+    def lookup(self, composition, deceased_sex, order=HEIR_TYPES):
+        """Share table of a composition, None when the table can't answer it"""
+        if tuple(order) != self.order:
+            return None
+        index = self.index(composition, deceased_sex)
+        if index is None:
+            return None
+        offset = self.offset + index * self.record_size
+        flags, *values = CALC_RECORD.unpack_from(self.buffer, offset)
+        if not flags & 1:
+            return None
+        calc = Record(CALC_FLAGS, flags >> 1, CALC_INTS, values)
+        heirs = []
+        offset += CALC_RECORD.size
+        for kind in self.kinds:
+            if composition.get(kind):
+                numerator, denominator, *values = HEIR_RECORD.unpack_from(self.buffer, offset)
+                reason = values.pop()
+                flags = values.pop()
+                heir = HeirState(kind)
+                heir.quote = Fraction(numerator, denominator)
+                heir.quote_reason = self.reasons[reason]
+                for i, field in enumerate(HEIR_FLAGS):
+                    setattr(heir, field, bool(flags >> i & 1))
+                for field, value in zip(HEIR_INTS, values):
+                    setattr(heir, field, value)
+                heirs.append(heir)
+            offset += HEIR_RECORD.size
+        return ShareTable(calc, heirs)
+
+    def close(self):
+        self.buffer.close()
+
+
+class Record:
+    """Calculation fields unpacked from a table record"""
+
+    def __init__(self, flag_fields, flags, int_fields, values):
+        for i, field in enumerate(flag_fields):
+            setattr(self, field, bool(flags >> i & 1))
+        for field, value in zip(int_fields, values):
+            setattr(self, field, value)
+
+
+lookup_table = None
+
+
+def get_lookup_table():
+    """The lookup table configured by CALC_LOOKUP_TABLE, opened on first use"""
+    global lookup_table
+    if lookup_table is None:
+        path = getattr(settings, 'CALC_LOOKUP_TABLE', '')
+        try:
+            lookup_table = LookupTable(path) if path else False
+        except (OSError, ValueError):
+            # a missing or stale table only means everything goes through the engine
+            lookup_table = False
+    return lookup_table or None
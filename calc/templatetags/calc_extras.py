@@ -7,4 +7,4 @@ register = template.Library()
 
 @register.filter
 def get_class(obj):
-    return _(obj.__class__.__name__)
+    return _(getattr(obj, 'kind', obj.__class__.__name__))
@@ -1,7 +1,38 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, AsyncRequestFactory, RequestFactory
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import AnonymousUser
 from calc.models import *
+from calc.engine import compute
+from calc.cache import ResultCache, composition_key, results
+from calc.table import LookupTable
+from calc.views import MotherCreate, get_heir_context
+from calc.scenarios import SCENARIOS
+from calc.instrumentation import compute_instrumented
+from calc.middleware import MetricsMiddleware, ProfilingMiddleware
+from waffle.testutils import override_flag
+from prometheus_client import REGISTRY
+from calc.engine import HEIR_FIELDS
+from django.apps import apps as django_apps
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from calc.checker import Checker, enumerate_compositions
+from calc.reasons import REASONS, get_code
+from django.utils import translation
+import csv
+import importlib
+import io
+import json
+import os
+import pstats
+import re
+import tempfile
+import tracemalloc
+import warnings
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
+from django.http import HttpResponse
 from django.http.request import HttpRequest
 from django.urls import reverse
 
@@ -760,12 +791,12 @@ class CalculationSetCalcCorrectionTestCase(TestCase):
         self.assertEqual(calc2.get_sons().first().get_quote(calc2), 7/8)
         self.assertEqual(calc2.get_fractions(calc2.heir_set.all()), {Fraction(1,8),Fraction(7,8)})
         self.assertEqual(calc2.get_sons().first().share, 7)
-        self.assertEqual(calc2.heir_set.filter(correction=True).values('polymorphic_ctype_id','quote').annotate(total=Count('id'))[0]["total"],2)
-        self.assertEqual(calc2.heir_set.filter(correction=True).values('polymorphic_ctype_id','quote').annotate(total=Count('id'))[1]["total"],3)
+        self.assertEqual(calc2.heir_set.filter(correction=True).values('polymorphic_ctype_id','quote_numerator','quote_denominator').annotate(total=Count('id'))[0]["total"],2)
+        self.assertEqual(calc2.heir_set.filter(correction=True).values('polymorphic_ctype_id','quote_numerator','quote_denominator').annotate(total=Count('id'))[1]["total"],3)
         self.assertEqual(calc2.set_calc_correction(),48)
         self.assertEqual(calc2.get_wives().first().shared_quote,True)
         self.assertEqual(calc2.get_sons().first().shared_quote,True)
-        self.assertEqual(calc2.heir_set.filter(correction=True).values('polymorphic_ctype_id','quote').annotate(total=Count('id')).count(), 2)
+        self.assertEqual(calc2.heir_set.filter(correction=True).values('polymorphic_ctype_id','quote_numerator','quote_denominator').annotate(total=Count('id')).count(), 2)
         self.assertEqual(calc2.get_wives().first().corrected_share,2)
 
 class CalculationSetCalcExcessTestCase(TestCase):
@@ -898,3 +929,987 @@ class CalculationSonOfUncleTestCase(TestCase):
         self.assertEqual(calc1.shares, 24)
         self.assertEqual(calc1.shares_corrected, 0)
         self.assertEqual(calc1.heir_set.filter(asaba=True).count(), 1)
+
+class EngineTestCase(TestCase):
+
+    def setUp(self):
+        user1 = User.objects.create_user('john', 'lennon@thebeatles.com', 'johnpassword')
+        calc1 = Calculation.objects.create(name='calc1', user=user1)
+        deceased = Deceased.objects.create(first_name="Deceased", last_name="test", sex="M",estate="8100",calc=calc1)
+        mother = Mother.objects.create(first_name="Mother", last_name="test", sex="F", calc=calc1)
+        calc1.add_mother(mother)
+        father = Father.objects.create(first_name="Father", last_name="test", sex="M", calc=calc1)
+        calc1.add_father(father)
+        for i in range(3):
+            daughter = Daughter.objects.create(first_name=f"Daughter{i}", last_name="test", sex="F", calc=calc1)
+            calc1.add_daughter(daughter, mother=None, father=None)
+        wife = Wife.objects.create(first_name="Wife", last_name="test", sex='F', calc=calc1)
+        calc1.add_wife(wife)
+
+    def test_engine_compute(self):
+        engine = compute({'Mother': 1, 'Father': 1, 'Daughter': 3, 'Wife': 1}, deceased_sex='M', estate=8100)
+        daughter = engine.filter('Daughter')[0]
+        self.assertEqual(engine.shares, 24)
+        self.assertEqual(engine.excess, True)
+        self.assertEqual(engine.shares_excess, 27)
+        self.assertEqual(engine.shares_corrected, 81)
+        self.assertEqual(daughter.quote, Fraction(2,3))
+        self.assertEqual(daughter.corrected_share, 16)
+        self.assertEqual(daughter.amount, 1600)
+        self.assertEqual(engine.filter('Wife')[0].amount, 900)
+
+    def test_compute_matches_steps(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        calc1.compute_steps()
+        expected = [(heir.share, heir.corrected_share, heir.amount, heir.quote_reason) for heir in calc1.heir_set.order_by('pk')]
+        calc1 = Calculation.objects.get(name="calc1")
+        calc1.compute()
+        result = [(heir.share, heir.corrected_share, heir.amount, heir.quote_reason) for heir in calc1.heir_set.order_by('pk')]
+        self.assertEqual(result, expected)
+        self.assertEqual(calc1.shares_corrected, 81)
+
+class ResultCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.cache = ResultCache(maxsize=2, ttl=60, timer=lambda: self.now)
+        self.now = 0
+        results.clear()
+
+    def test_lru_and_ttl(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.cache.set('c', 3)
+        self.assertIsNone(self.cache.get('b'))
+        self.now = 61
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.stats(), {'size': 1, 'maxsize': 2, 'hits': 1, 'misses': 2, 'evictions': 2})
+
+    def test_same_composition_is_shared(self):
+        user1 = User.objects.create_user('john', 'lennon@thebeatles.com', 'johnpassword')
+        for name, estate in (('calc1', 8100), ('calc2', 810)):
+            calc = Calculation.objects.create(name=name, user=user1)
+            Deceased.objects.create(first_name="Deceased", last_name="test", sex="M", estate=estate, calc=calc)
+            calc.add_mother(Mother.objects.create(first_name="Mother", last_name="test", sex="F", calc=calc))
+            calc.add_wife(Wife.objects.create(first_name="Wife", last_name="test", sex='F', calc=calc))
+            calc.compute()
+        self.assertEqual(results.stats()['misses'], 1)
+        self.assertEqual(results.stats()['hits'], 1)
+        calc2 = Calculation.objects.get(name="calc2")
+        self.assertEqual(calc2.heir_set.instance_of(Wife).first().amount, 810 / 4)
+
+class LookupTableTestCase(TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        call_command('build_lookup_table', output=self.path, bound=['Mother=1', 'Wife=2', 'Daughter=2', 'Son=1'], stdout=io.StringIO())
+        self.table = LookupTable(self.path)
+
+    def tearDown(self):
+        self.table.close()
+        os.remove(self.path)
+
+    def test_lookup_matches_engine(self):
+        order = heir_order()
+        for composition in ({'Mother': 1, 'Wife': 2, 'Daughter': 2}, {'Wife': 1, 'Son': 1, 'Daughter': 1}, {'Mother': 1, 'Daughter': 1}):
+            engine = compute(composition, deceased_sex='M', estate=2400, order=order)
+            table = self.table.lookup(composition, 'M', order)
+            fields = [field for field in HEIR_FIELDS if field != 'amount']
+            for row in engine.heirs:
+                self.assertEqual([getattr(table.rows[row.kind], field) for field in fields], [getattr(row, field) for field in fields])
+                self.assertEqual(table.amount(row.kind, 2400), row.amount)
+            self.assertEqual(table.shares, engine.shares)
+
+    def test_lookup_out_of_table(self):
+        order = heir_order()
+        self.assertIsNone(self.table.lookup({'Wife': 3}, 'M', order))
+        self.assertIsNone(self.table.lookup({'Father': 1}, 'M', order))
+        self.assertIsNone(self.table.lookup({'Wife': 1}, 'F', order))
+        self.assertIsNone(self.table.lookup({'Mother': 1}, 'M', tuple(reversed(order))))
+
+class CompositionTestCase(TestCase):
+
+    def setUp(self):
+        user1 = User.objects.create_user('john', 'lennon@thebeatles.com', 'johnpassword')
+        calc1 = Calculation.objects.create(name='calc1', user=user1)
+        Deceased.objects.create(first_name="Deceased", last_name="test", sex="M",estate="8100",calc=calc1)
+        calc1.add_mother(Mother.objects.create(first_name="Mother", last_name="test", sex="F", calc=calc1))
+        for i in range(2):
+            daughter = Daughter.objects.create(first_name=f"Daughter{i}", last_name="test", sex="F", calc=calc1)
+            calc1.add_daughter(daughter, mother=None, father=None)
+        calc1.add_brother(Brother.objects.create(first_name="Brother", last_name="test", sex="M", calc=calc1))
+
+    def test_composition_snapshot(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        ContentType.objects.get_for_models(Daughter, Son, Brother, Mother, Father)
+        with self.assertNumQueries(1):
+            self.assertEqual(calc1.count_heirs(Daughter), 2)
+        calc1.composition = calc1.get_composition()
+        with self.assertNumQueries(0):
+            self.assertTrue(calc1.has_descendent())
+            self.assertFalse(calc1.has_male_descendent())
+            self.assertFalse(calc1.has_father())
+            self.assertFalse(calc1.has_siblings())
+            self.assertEqual(calc1.count_heirs(Daughter, Brother, Mother), 4)
+
+    def test_compute_steps_clears_snapshot(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        calc1.compute_steps()
+        self.assertIsNone(calc1.composition)
+        self.assertEqual(calc1.heir_set.instance_of(Brother).first().asaba, True)
+
+    def test_composition_vector(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        self.assertEqual(calc1.get_heir_counts(), Counter({'Daughter': 2, 'Mother': 1, 'Brother': 1}))
+        self.assertEqual((calc1.deceased_sex, calc1.get_heir_total()), ('M', 4))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(calc1.get_composition()['Daughter'], 2)
+        self.assertFalse([query for query in queries if 'calc_heir' in query['sql']])
+        calc1.heir_set.instance_of(Daughter).first().delete()
+        Son.objects.create(first_name="Son", last_name="test", sex="M", calc=calc1)
+        # a stale instance saved in full keeps the counts of the signals
+        calc1.name = "renamed"
+        calc1.save()
+        calc1 = Calculation.objects.get(pk=calc1.pk)
+        self.assertEqual(calc1.get_heir_counts(), Counter({'Daughter': 1, 'Son': 1, 'Mother': 1, 'Brother': 1}))
+        calc1.deceased_set.first().delete()
+        calc1.heir_set.all().delete()
+        calc1 = Calculation.objects.get(pk=calc1.pk)
+        self.assertEqual((calc1.deceased_sex, calc1.get_heir_total()), ("", 0))
+
+    def test_rebuild_compositions(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        Calculation.objects.filter(pk=calc1.pk).update(daughter_count=5, deceased_sex="F")
+        out = io.StringIO()
+        call_command('rebuild_compositions', stdout=out)
+        self.assertIn("1 had drifted", out.getvalue())
+        calc1 = Calculation.objects.get(pk=calc1.pk)
+        self.assertEqual((calc1.daughter_count, calc1.deceased_sex), (2, 'M'))
+        out = io.StringIO()
+        call_command('rebuild_compositions', calc=[calc1.pk], stdout=out)
+        self.assertIn("Rebuilt 1 calculations, 0 had drifted", out.getvalue())
+
+    def test_one_update_per_change(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        for change in (
+            lambda: calc1.heir_set.instance_of(Daughter).first().delete(),
+            lambda: Son.objects.create(first_name="Son", last_name="test", sex="M", calc=calc1),
+            lambda: calc1.deceased_set.first().delete(),
+        ):
+            with CaptureQueriesContext(connection) as queries:
+                change()
+            self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE "calc_calculation"')]), 1)
+        calc1 = Calculation.objects.get(pk=calc1.pk)
+        self.assertEqual((calc1.deceased_sex, calc1.get_heir_counts()), ("", Counter({'Daughter': 1, 'Son': 1, 'Mother': 1, 'Brother': 1})))
+
+    def test_compute_reads_vector(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        results.clear()
+        calc1.compute()
+        self.assertEqual(list(results.entries), [composition_key(Counter({'Daughter': 2, 'Mother': 1, 'Brother': 1}), 'M', heir_order())])
+        # columns that drifted from the heir rows are recounted before the key is taken
+        results.clear()
+        Calculation.objects.filter(pk=calc1.pk).update(daughter_count=3, son_count=1)
+        calc1 = Calculation.objects.get(pk=calc1.pk)
+        calc1.compute()
+        self.assertEqual(list(results.entries), [composition_key(Counter({'Daughter': 2, 'Mother': 1, 'Brother': 1}), 'M', heir_order())])
+        calc1 = Calculation.objects.select_related('result').get(pk=calc1.pk)
+        self.assertEqual((calc1.daughter_count, calc1.son_count), (2, 0))
+        self.assertEqual([(group['kind'], group['count']) for group in calc1.result.data['groups']], [('Mother', 1), ('Daughter', 2), ('Brother', 1)])
+
+    def test_heir_added_while_computing(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        added = []
+
+        def add_before_names(execute, sql, params, many, context):
+            if '"first_name"' in sql and 'calc_heir' in sql and not added:
+                # a concurrent submit adds a son after the load, before the names of the snapshot are read
+                added.append(Son(first_name="Son", last_name="test", sex="M", calc=calc1))
+                added[0].save()
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(add_before_names):
+            calc1.compute()
+        calc1 = Calculation.objects.select_related('result').get(pk=calc1.pk)
+        self.assertNotIn('Son', [group['kind'] for group in calc1.result.data['groups']])
+        self.assertTrue(calc1.is_stale())
+        calc1.compute_if_stale()
+        calc1 = Calculation.objects.select_related('result').get(pk=calc1.pk)
+        self.assertFalse(calc1.is_stale())
+        self.assertIn('Son', [group['kind'] for group in calc1.result.data['groups']])
+
+    def test_save_semantics(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        # a new instance with an explicit pk is a plain insert, composition columns included
+        copy = Calculation(pk=calc1.pk + 100, name="copy", user=calc1.user, daughter_count=2, deceased_sex="F")
+        copy.save()
+        copy = Calculation.objects.get(pk=copy.pk)
+        self.assertEqual((copy.daughter_count, copy.deceased_sex), (2, "F"))
+        calc1.daughter_count = 7
+        calc1.save(update_fields=['name', 'daughter_count'])
+        self.assertEqual(Calculation.objects.get(pk=calc1.pk).daughter_count, 7)
+
+class UnitOfWorkTestCase(TestCase):
+
+    def setUp(self):
+        user1 = User.objects.create_user('john', 'lennon@thebeatles.com', 'johnpassword')
+        calc1 = Calculation.objects.create(name='calc1', user=user1)
+        Deceased.objects.create(first_name="Deceased", last_name="test", sex="M",estate="1000",calc=calc1)
+        calc1.add_mother(Mother.objects.create(first_name="Mother", last_name="test", sex="F", calc=calc1))
+        for i in range(3):
+            daughter = Daughter.objects.create(first_name=f"Daughter{i}", last_name="test", sex="F", calc=calc1)
+            calc1.add_daughter(daughter, mother=None, father=None)
+
+    def writes(self, calc):
+        with CaptureQueriesContext(connection) as queries:
+            calc.compute()
+        return [query['sql'].split('"')[1] for query in queries if query['sql'].startswith('UPDATE')]
+
+    def test_compute_writes_once(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        self.assertEqual(self.writes(calc1), ['calc_heir', 'calc_calculation'])
+        daughter = calc1.heir_set.instance_of(Daughter).first()
+        self.assertEqual(daughter.amount, Decimal('266.67'))
+        self.assertEqual(daughter.shared_quote, True)
+
+    def test_compute_skips_unchanged(self):
+        Calculation.objects.get(name="calc1").compute()
+        self.assertEqual(self.writes(Calculation.objects.get(name="calc1")), [])
+
+class StaleResultsTestCase(TestCase):
+
+    def setUp(self):
+        user1 = User.objects.create_user('john', 'lennon@thebeatles.com', 'johnpassword')
+        calc1 = Calculation.objects.create(name='calc1', user=user1)
+        Deceased.objects.create(first_name="Deceased", last_name="test", sex="M",estate="1000",calc=calc1)
+        calc1.add_mother(Mother.objects.create(first_name="Mother", last_name="test", sex="F", calc=calc1))
+        calc1.add_wife(Wife.objects.create(first_name="Wife", last_name="test", sex='F', calc=calc1))
+
+    def test_compute_if_stale(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        self.assertTrue(calc1.is_stale())
+        calc1.compute_if_stale()
+        calc1 = Calculation.objects.select_related('result').get(name="calc1")
+        self.assertFalse(calc1.is_stale())
+        with self.assertNumQueries(0):
+            calc1.compute_if_stale()
+
+    def test_heir_changes_mark_stale(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        calc1.compute()
+        wife = calc1.heir_set.instance_of(Wife).first()
+        wife.first_name = "Renamed"
+        wife.save()
+        self.assertTrue(Calculation.objects.get(name="calc1").is_stale())
+        Calculation.objects.get(name="calc1").compute()
+        wife.delete()
+        self.assertTrue(Calculation.objects.get(name="calc1").is_stale())
+        Calculation.objects.get(name="calc1").compute()
+        calc1.add_daughter(Daughter.objects.create(first_name="Daughter", last_name="test", sex="F", calc=calc1), mother=None, father=None)
+        self.assertTrue(Calculation.objects.get(name="calc1").is_stale())
+        Calculation.objects.get(name="calc1").compute()
+        deceased = calc1.deceased_set.first()
+        deceased.estate = 2000
+        deceased.save()
+        self.assertTrue(Calculation.objects.get(name="calc1").is_stale())
+
+class ResultSnapshotTestCase(TestCase):
+
+    def setUp(self):
+        user1 = User.objects.create_user('john', 'lennon@thebeatles.com', 'johnpassword')
+        calc1 = Calculation.objects.create(name='calc1', user=user1)
+        Deceased.objects.create(first_name="Deceased", last_name="test", sex="M",estate="8100",calc=calc1)
+        calc1.add_mother(Mother.objects.create(first_name="Mother", last_name="test", sex="F", calc=calc1))
+        calc1.add_father(Father.objects.create(first_name="Father", last_name="test", sex="M", calc=calc1))
+        for i in range(3):
+            daughter = Daughter.objects.create(first_name=f"Daughter{i}", last_name="test", sex="F", calc=calc1)
+            calc1.add_daughter(daughter, mother=None, father=None)
+        calc1.add_wife(Wife.objects.create(first_name="Wife", last_name="test", sex='F', calc=calc1))
+
+    def test_snapshot_matches_heirs(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        calc1.compute()
+        result = Calculation.objects.select_related('result').get(name="calc1").result
+        heirs = list(calc1.heir_set.order_by('pk'))
+        self.assertEqual(result.get_estate(), 8100)
+        self.assertEqual(result.data['calc']['shares_corrected'], 81)
+        for heir, snapshot in zip(heirs, result.get_heirs()):
+            self.assertEqual(snapshot.id, heir.id)
+            self.assertEqual(snapshot.kind, heir.__class__.__name__)
+            self.assertEqual(snapshot.get_fraction(), heir.get_fraction())
+            self.assertEqual((snapshot.corrected_share, snapshot.amount, snapshot.quote_reason), (heir.corrected_share, heir.amount, heir.quote_reason))
+
+class HeirContextTestCase(TestCase):
+
+    def setUp(self):
+        user1 = User.objects.create_user('john', 'lennon@thebeatles.com', 'johnpassword')
+        calc1 = Calculation.objects.create(name='calc1', user=user1)
+        Deceased.objects.create(first_name="Deceased", last_name="test", sex="M",estate="8100",calc=calc1)
+        calc1.add_mother(Mother.objects.create(first_name="Mother", last_name="test", sex="F", calc=calc1))
+        for i in range(2):
+            calc1.add_wife(Wife.objects.create(first_name=f"Wife{i}", last_name="test", sex='F', calc=calc1))
+            Son.objects.create(first_name=f"Son{i}", last_name="test", sex="M", calc=calc1)
+
+    def test_one_fetch(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        calc1.compute()
+        ContentType.objects.get_for_models(Mother, Wife, Son)
+        with self.assertNumQueries(1):
+            context = get_heir_context(list(calc1.heir_set.non_polymorphic().order_by('pk')))
+        self.assertEqual(context['Wife'].count, 2)
+        self.assertEqual(context['Father'].count, 0)
+        self.assertEqual([heir.first_name for heir in context['asaba']], ["Son0", "Son1"])
+        self.assertEqual(context['Spouse'].count, 2)
+        self.assertEqual(context['No_Spouse'].count, 3)
+        self.assertFalse(context['female_asaba'])
+
+class HeirRoleTestCase(TestCase):
+
+    def setUp(self):
+        user1 = User.objects.create_user('john', 'lennon@thebeatles.com', 'johnpassword')
+        calc1 = Calculation.objects.create(name='calc1', user=user1)
+        Deceased.objects.create(first_name="Deceased", last_name="test", sex="F",estate="1200",calc=calc1)
+        calc1.add_husband(Husband.objects.create(first_name="Husband", last_name="test", sex="M", calc=calc1))
+        SonOfPaternalUncle.objects.create(first_name="Cousin", last_name="test", sex="M", calc=calc1)
+
+    def test_role_is_stored(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        self.assertEqual([heir.role for heir in calc1.heir_set.non_polymorphic().order_by('pk')], ['Husband', 'SonOfPaternalUncle'])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(calc1.count_heirs(Husband, SonOfPaternalUncle), 2)
+        self.assertNotIn('calc_person', queries[0]['sql'])
+
+    def test_compute_from_heir_table(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        calc1.compute()
+        heirs = calc1.heir_set.order_by('pk')
+        self.assertEqual([heir.amount for heir in heirs], [600, 600])
+        self.assertTrue(heirs[1].asaba)
+
+class ApiComputeTestCase(TestCase):
+
+    def setUp(self):
+        self.data = {'deceased_sex': 'M', 'estate': 1200, 'heirs': {'Wife': 1, 'Daughter': 2, 'Son': 1, 'Brother': 2}}
+
+    def post(self, data):
+        return self.client.post('/api/compute/', json.dumps(data), content_type='application/json', secure=True)
+
+    def test_compute_without_writes(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(self.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if not query['sql'].startswith('SELECT')])
+        result = response.json()
+        self.assertEqual(result['shares'], 8)
+        self.assertTrue(result['correction'])
+        self.assertEqual(result['shares_corrected'], 32)
+        heirs = {heir['type']: heir for heir in result['heirs']}
+        self.assertEqual(heirs['Wife']['quote'], '1/8')
+        self.assertEqual(heirs['Wife']['amount'], 150)
+        self.assertEqual(heirs['Daughter']['amount'], 262.5)
+        self.assertEqual(heirs['Son']['amount'], 525)
+        self.assertTrue(heirs['Brother']['blocked'])
+        self.assertEqual(heirs['Brother']['amount'], 0)
+        self.assertFalse(Calculation.objects.exists())
+
+    def test_invalid_composition(self):
+        for data in (
+            {'deceased_sex': 'M', 'estate': 1200, 'heirs': {'Husband': 1}},
+            {'deceased_sex': 'F', 'estate': 1200, 'heirs': {'Mother': 2}},
+            {'deceased_sex': 'F', 'estate': -1, 'heirs': {'Son': 1}},
+            {'deceased_sex': 'F', 'estate': float('nan'), 'heirs': {'Son': 1}},
+            {'deceased_sex': 'F', 'estate': float('inf'), 'heirs': {'Son': 1}},
+            {'deceased_sex': 'F', 'estate': 1200, 'heirs': {'Cousin': 1}},
+            {'deceased_sex': 'F', 'estate': 1200, 'heirs': {}},
+            [],
+        ):
+            response = self.post(data)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+        response = self.client.post('/api/compute/', 'not json', content_type='application/json', secure=True)
+        self.assertEqual(response.status_code, 400)
+        for estate in ('NaN', 'Infinity', '1e400'):
+            body = f'{{"deceased_sex": "F", "estate": {estate}, "heirs": {{"Son": 1}}}}'
+            response = self.client.post('/api/compute/', body, content_type='application/json', secure=True)
+            self.assertEqual(response.status_code, 400)
+            response = self.client.post('/api/compute/batch/', body + '\n', content_type='application/x-ndjson', secure=True)
+            self.assertIn('error', json.loads(b''.join(response.streaming_content)))
+        response = self.client.get('/api/compute/', secure=True)
+        self.assertEqual(response.status_code, 405)
+
+    def test_grandmothers(self):
+        data = {'deceased_sex': 'M', 'estate': 1200, 'heirs': {'GrandMother': 2, 'Son': 1}}
+        response = self.post(data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(heir['type'], heir['count']) for heir in response.json()['heirs']], [('Son', 1), ('GrandMother', 2)])
+        response = self.client.post('/api/compute/batch/', json.dumps(data) + '\n', content_type='application/x-ndjson', secure=True)
+        self.assertNotIn('error', json.loads(b''.join(response.streaming_content)))
+        request = AsyncRequestFactory().post('/api/compute/', json.dumps(data), content_type='application/json', secure=True)
+        self.assertEqual(async_to_sync(views.api_compute_async)(request).status_code, 200)
+
+    def test_batch_streams_a_line_per_input(self):
+        body = '\n'.join([json.dumps(self.data), '{"deceased_sex": "M"', '', json.dumps(dict(self.data, estate=2400))]) + '\n'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/compute/batch/', body, content_type='application/x-ndjson', secure=True)
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertFalse([query for query in queries if not query['sql'].startswith('SELECT')])
+        self.assertEqual([line['line'] for line in lines], [1, 2, 4])
+        self.assertEqual(lines[0]['heirs'][0]['amount'], 150)
+        self.assertIn('error', lines[1])
+        self.assertEqual(lines[2]['heirs'][0]['amount'], 300)
+
+class AsyncViewsTestCase(TestCase):
+
+    def setUp(self):
+        user1 = User.objects.create_user('john', 'lennon@thebeatles.com', 'johnpassword')
+        calc1 = Calculation.objects.create(name='calc1', user=user1)
+        Deceased.objects.create(first_name="Deceased", last_name="test", sex="F",estate="1200",calc=calc1)
+        calc1.add_husband(Husband.objects.create(first_name="Husband", last_name="test", sex="M", calc=calc1))
+        calc1.add_mother(Mother.objects.create(first_name="Mother", last_name="test", sex="F", calc=calc1))
+        Son.objects.create(first_name="Son", last_name="test", sex="M", calc=calc1)
+
+    def get_async(self, view, path, user):
+        request = AsyncRequestFactory().get(path, secure=True)
+        request.user = user
+        return async_to_sync(view)(request, pk=int(path.split('/')[2]))
+
+    def test_results_match_sync_view(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        c = Client()
+        c.login(username='john', password='johnpassword')
+        path = f"/en/{calc1.id}/results/"
+        expected = c.get(path, secure=True)
+        response = self.get_async(views.results_async, path, User.objects.get(username='john'))
+        self.assertEqual(response.status_code, 200)
+        csrf_token = re.compile(rb'name="csrfmiddlewaretoken" value="[^"]*"')
+        self.assertEqual(csrf_token.sub(b'', response.content), csrf_token.sub(b'', expected.content))
+
+    def test_results_need_login(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        response = self.get_async(views.results_async, f"/en/{calc1.id}/results/", AnonymousUser())
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Result.objects.exists())
+
+    def test_compute_api(self):
+        request = AsyncRequestFactory().post('/api/compute/', json.dumps({'deceased_sex': 'F', 'estate': 1200, 'heirs': {'Husband': 1, 'Mother': 1, 'Son': 1}}), content_type='application/json', secure=True)
+        response = async_to_sync(views.api_compute_async)(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([heir['amount'] for heir in json.loads(response.content)['heirs']], [200, 300, 700])
+
+    def test_compute_batch_streams(self):
+        body = ''.join(json.dumps({'deceased_sex': 'F', 'estate': 1200, 'heirs': {'Husband': 1, 'Son': sons}}) + '\n' for sons in (1, 2, 3))
+        request = AsyncRequestFactory().post('/api/compute/batch/', body, content_type='application/x-ndjson', secure=True)
+        results.clear()
+
+        async def read():
+            response = await views.api_compute_batch_async(request)
+            self.assertTrue(response.is_async)
+            lines = []
+            # what the ASGI handler does to send a streaming response
+            async for line in response:
+                # a line is computed when it is sent, not the whole batch up front
+                lines.append((json.loads(line)['line'], results.stats()['misses']))
+            return lines
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            lines = async_to_sync(read)()
+        self.assertEqual(lines, [(1, 1), (2, 2), (3, 3)])
+        self.assertFalse([warning for warning in caught if 'iterator' in str(warning.message)])
+
+class BulkComputeTestCase(TestCase):
+
+    def setUp(self):
+        User.objects.create_user('john', 'lennon@thebeatles.com', 'johnpassword')
+        self.directory = tempfile.TemporaryDirectory()
+        self.input = os.path.join(self.directory.name, 'estates.jsonl')
+        with open(self.input, 'w') as lines:
+            lines.write(json.dumps({'name': 'first', 'deceased_sex': 'F', 'estate': 1200, 'heirs': {'Husband': 1, 'Mother': 1, 'Son': 1}}) + '\n')
+            lines.write('{"deceased_sex": "F", "estate": 1200, "heirs": {"Wife": 1}}\n')
+            lines.write(json.dumps({'deceased_sex': 'M', 'estate': 900, 'heirs': {'Daughter': 2, 'Brother': 1}}) + '\n')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_jsonl_to_csv(self):
+        output = os.path.join(self.directory.name, 'results.csv')
+        call_command('bulk_compute', self.input, output, processes=1, chunk_size=2, stdout=io.StringIO())
+        with open(output, newline='') as rows:
+            rows = list(csv.DictReader(rows))
+        self.assertEqual([row['line'] for row in rows], ['1', '2', '3'])
+        self.assertEqual((rows[0]['name'], rows[0]['Husband_amount'], rows[0]['Son_amount']), ('first', '300.0', '700.0'))
+        self.assertTrue(rows[1]['error'])
+        self.assertEqual((rows[2]['Daughter_quote'], rows[2]['Daughter_amount'], rows[2]['Brother_amount']), ('2/3', '300.0', '300.0'))
+        self.assertFalse(Calculation.objects.exists())
+
+    def test_persist(self):
+        output = os.path.join(self.directory.name, 'results.jsonl')
+        call_command('bulk_compute', self.input, output, processes=1, persist=True, user='john', stdout=io.StringIO())
+        self.assertEqual(len(open(output).readlines()), 3)
+        calc1 = Calculation.objects.get(name='first')
+        self.assertEqual(Calculation.objects.filter(user__username='john').count(), 2)
+        self.assertFalse(calc1.is_stale())
+        c = Client()
+        c.login(username='john', password='johnpassword')
+        response = c.get(f"/en/{calc1.id}/results/", secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([heir.amount for heir in response.context['No_Spouse']], [200, 700])
+        self.assertEqual(calc1.result.data['calc']['shares'], 12)
+        # the rows are real calculations, with the deceased, the heirs and the composition columns
+        self.assertEqual((calc1.deceased_set.get().estate, calc1.deceased_sex), (1200, 'F'))
+        self.assertEqual(calc1.get_heir_counts(), Counter({'Husband': 1, 'Mother': 1, 'Son': 1}))
+        self.assertEqual(c.get(f"/en/{calc1.id}/", secure=True).status_code, 200)
+        response = c.post(f"/en/{calc1.id}/son", {'first_name': "Son", 'last_name': "added"}, secure=True)
+        self.assertEqual(response.status_code, 302)
+        calc1 = Calculation.objects.get(pk=calc1.pk)
+        self.assertTrue(calc1.is_stale())
+        calc1.compute_if_stale()
+        self.assertEqual(sorted(heir.amount for heir in calc1.heir_set.all()), [200, 300, 350, 350])
+        self.assertEqual(calc1.result.data['groups'][-1]['count'], 2)
+
+class ScenarioTestCase(TestCase):
+
+    def setUp(self):
+        self.output = tempfile.NamedTemporaryFile(suffix='.json', delete=False).name
+
+    def tearDown(self):
+        os.remove(self.output)
+
+    def test_scenario_flags(self):
+        for scenario in SCENARIOS:
+            engine = compute(scenario['heirs'], scenario['deceased_sex'], order=heir_order())
+            flags = tuple(field for field in ('excess', 'shortage', 'shortage_calc', 'correction', 'common_quote') if getattr(engine, field))
+            self.assertEqual(flags, tuple(scenario['flags']), scenario['name'])
+
+    def test_benchmark_report(self):
+        call_command('benchmark_compute', runs=1, scenario=['excess_minbariyya'], output=self.output)
+        with open(self.output) as report:
+            report = json.load(report)
+        scenario, = report['scenarios']
+        self.assertEqual(scenario['flags'], ['excess'])
+        # sqlite doesn't count the rows of the Result INSERT ... RETURNING
+        self.assertEqual(scenario['measurements']['compute_cold']['rows_written'], 6 if connection.vendor == 'sqlite' else 7)
+        self.assertEqual(scenario['measurements']['compute_warm']['rows_written'], 0)
+        self.assertEqual(scenario['measurements']['results_view']['queries'], 1)
+        self.assertFalse(Calculation.objects.exists())
+        call_command('benchmark_compute', runs=1, scenario=['excess_minbariyya'], output=os.devnull, compare=self.output, tolerance=1000, stderr=io.StringIO())
+
+class InstrumentationTestCase(TestCase):
+
+    def setUp(self):
+        user1 = User.objects.create_user('john', 'lennon@thebeatles.com', 'johnpassword')
+        calc1 = Calculation.objects.create(name='calc1', user=user1)
+        Deceased.objects.create(first_name="Deceased", last_name="test", sex="M",estate="2400",calc=calc1)
+        calc1.add_wife(Wife.objects.create(first_name="Wife", last_name="test", sex='F', calc=calc1))
+        calc1.add_mother(Mother.objects.create(first_name="Mother", last_name="test", sex="F", calc=calc1))
+        calc1.add_father(Father.objects.create(first_name="Father", last_name="test", sex="M", calc=calc1))
+        for i in range(2):
+            Daughter.objects.create(first_name=f"Daughter{i}", last_name="test", sex="F", calc=calc1)
+        results.clear()
+
+    def test_phases(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        received = []
+        def receiver(sender, calc, phases, **kwargs):
+            received.append((calc, phases))
+        compute_instrumented.connect(receiver)
+        try:
+            with self.assertLogs('calc.instrumentation', 'INFO') as logs:
+                calc1.compute(instrument=True)
+        finally:
+            compute_instrumented.disconnect(receiver)
+        self.assertEqual([entry['name'] for entry in calc1.phases if not entry['depth']], ['load', 'share_table', 'apply', 'persist'])
+        self.assertIn('set_calc_excess', [entry['name'] for entry in calc1.phases if entry['depth']])
+        phases = {entry['name']: entry for entry in calc1.phases}
+        self.assertEqual(phases['load']['queries'], 2)
+        self.assertEqual(phases['persist']['rows_written'], 6 if connection.vendor == 'sqlite' else 7)
+        self.assertEqual(phases['apply']['queries'], 0)
+        self.assertEqual(received, [(calc1, calc1.phases)])
+        self.assertIn('persist', logs.output[0])
+        self.assertEqual(phases['share_table']['source'], 'engine')
+        # a cached table has no engine steps under its phase
+        calc1 = Calculation.objects.get(name="calc1")
+        calc1.name = "renamed"
+        calc1.save()
+        calc1.compute(instrument=True)
+        self.assertEqual([(entry['name'], entry.get('source')) for entry in calc1.phases if entry['name'] == 'share_table' or entry['depth']], [('share_table', 'cache')])
+
+    def test_disabled_by_default(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        calc1.compute()
+        self.assertIsNone(calc1.phases)
+
+    def test_results_page(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        c = Client()
+        c.login(username='john', password='johnpassword')
+        with self.settings(CALC_INSTRUMENT=True):
+            response = c.get(f"/en/{calc1.id}/results/", secure=True)
+        self.assertContains(response, "set_calc_excess")
+        response = c.get(f"/en/{calc1.id}/results/", secure=True)
+        self.assertNotContains(response, "set_calc_excess")
+
+class ProfilingTestCase(TestCase):
+
+    def setUp(self):
+        user1 = User.objects.create_user('john', 'lennon@thebeatles.com', 'johnpassword')
+        calc1 = Calculation.objects.create(name='calc1', user=user1)
+        Deceased.objects.create(first_name="Deceased", last_name="test", sex="F",estate="1200",calc=calc1)
+        calc1.add_husband(Husband.objects.create(first_name="Husband", last_name="test", sex="M", calc=calc1))
+        Son.objects.create(first_name="Son", last_name="test", sex="M", calc=calc1)
+        self.directory = tempfile.TemporaryDirectory()
+        self.client.login(username='john', password='johnpassword')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_profile_flagged_request(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        with self.settings(CALC_PROFILE_DIR=self.directory.name), override_flag('profile_requests', active=True):
+            response = self.client.get(f"/en/{calc1.id}/results/", secure=True)
+        self.assertEqual(response.status_code, 200)
+        name = response['X-Profile']
+        self.assertEqual(sorted(os.listdir(self.directory.name)), [name + '.json', name + '.prof'])
+        with open(os.path.join(self.directory.name, name + '.json')) as report:
+            report = json.load(report)
+        self.assertEqual(report['calc_id'], calc1.id)
+        self.assertEqual(report['composition'], {'deceased_sex': 'F', 'estate': 1200, 'heirs': {'Husband': 1, 'Son': 1}})
+        self.assertTrue(report['allocations'])
+        self.assertTrue(pstats.Stats(os.path.join(self.directory.name, name + '.prof')).total_calls)
+
+    def test_not_flagged(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        with self.settings(CALC_PROFILE_DIR=self.directory.name):
+            response = self.client.get(f"/en/{calc1.id}/results/", secure=True)
+        self.assertNotIn('X-Profile', response)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_overlapping_requests(self):
+        inner = []
+
+        def get_response(request):
+            if request.path == '/outer/':
+                # a second flagged request comes in while this one is profiled
+                inner.append(middleware(RequestFactory().get('/inner/')))
+            return HttpResponse()
+
+        middleware = ProfilingMiddleware(get_response)
+        with self.settings(CALC_PROFILE_DIR=self.directory.name), override_flag('profile_requests', active=True):
+            response = middleware(RequestFactory().get('/outer/'))
+            self.assertNotIn('X-Profile', inner[0])
+            name = response['X-Profile']
+            self.assertEqual(sorted(os.listdir(self.directory.name)), [name + '.json', name + '.prof'])
+            self.assertFalse(tracemalloc.is_tracing())
+            # the lock is released, the next flagged request is profiled
+            self.assertIn('X-Profile', middleware(RequestFactory().get('/inner/')))
+
+    def test_async_request(self):
+        calc1 = Calculation.objects.get(name="calc1")
+
+        async def get_response(request):
+            await sync_to_async(calc1.get_heir_counts)()
+            return HttpResponse()
+
+        middleware = ProfilingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        with self.settings(CALC_PROFILE_DIR=self.directory.name):
+            self.assertNotIn('X-Profile', async_to_sync(middleware)(AsyncRequestFactory().get('/')))
+            with override_flag('profile_requests', active=True):
+                response = async_to_sync(middleware)(AsyncRequestFactory().get('/'))
+        name = response['X-Profile']
+        self.assertIn('get_heir_counts', str(pstats.Stats(os.path.join(self.directory.name, name + '.prof')).stats))
+
+class MetricsTestCase(TestCase):
+
+    def setUp(self):
+        user1 = User.objects.create_user('john', 'lennon@thebeatles.com', 'johnpassword')
+        calc1 = Calculation.objects.create(name='calc1', user=user1)
+        Deceased.objects.create(first_name="Deceased", last_name="test", sex="F",estate="1200",calc=calc1)
+        calc1.add_husband(Husband.objects.create(first_name="Husband", last_name="test", sex="M", calc=calc1))
+        for i in range(2):
+            Sister.objects.create(first_name=f"Sister{i}", last_name="test", sex="F", calc=calc1)
+        results.clear()
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_compute_metrics(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        awl = self.sample('calc_compute_seconds_count', outcome='awl')
+        engine = self.sample('calc_share_tables_total', source='engine')
+        cache = self.sample('calc_share_tables_total', source='cache')
+        rows = self.sample('calc_heir_rows_written_total')
+        calc1.compute()
+        Calculation.objects.get(name="calc1").compute()
+        self.assertEqual(self.sample('calc_compute_seconds_count', outcome='awl'), awl + 2)
+        self.assertEqual(self.sample('calc_share_tables_total', source='engine'), engine + 1)
+        self.assertEqual(self.sample('calc_share_tables_total', source='cache'), cache + 1)
+        self.assertEqual(self.sample('calc_heir_rows_written_total'), rows + 3)
+
+    def test_endpoint(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        c = Client()
+        c.login(username='john', password='johnpassword')
+        views = self.sample('calc_results_view_seconds_count', view='results')
+        c.get(f"/en/{calc1.id}/results/", secure=True)
+        self.assertEqual(self.sample('calc_results_view_seconds_count', view='results'), views + 1)
+        response = c.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'calc_request_queries_bucket')
+        self.assertContains(response, 'calc_compute_seconds_bucket{le="0.005",outcome="awl"}')
+        response = c.get('/metrics/', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 404)
+
+    def test_async_request(self):
+        def select():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+
+        async def get_response(request):
+            # in a thread of its own, with another connection
+            await sync_to_async(select, thread_sensitive=False)()
+            await sync_to_async(select)()
+            return HttpResponse()
+        middleware = MetricsMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        count = self.sample('calc_request_queries_count')
+        queries = self.sample('calc_request_queries_sum')
+        async_to_sync(middleware)(RequestFactory().get('/'))
+        self.assertEqual(self.sample('calc_request_queries_count'), count + 1)
+        self.assertEqual(self.sample('calc_request_queries_sum'), queries + 2)
+
+def skewed_compute(composition, deceased_sex='M', estate=0, order=None):
+    """calc.engine.compute() giving a wrong share to daughters when there are two or more"""
+    engine = compute(composition, deceased_sex, estate, order)
+    if composition.get('Daughter', 0) >= 2:
+        engine.filter('Daughter')[0].share += 1
+    return engine
+
+class CheckerTestCase(TestCase):
+
+    def test_engine_agrees(self):
+        checker = Checker()
+        compositions = list(enumerate_compositions({'Husband': 1, 'Mother': 1, 'Daughter': 2, 'Sister': 1}))
+        self.assertIn(({'Husband': 1, 'Daughter': 2}, 'F'), compositions)
+        self.assertNotIn(({'Husband': 1}, 'M'), compositions)
+        self.assertEqual(checker.check_chunk(compositions), [])
+        self.assertFalse(Calculation.objects.exists())
+
+    def test_grandmothers(self):
+        # nothing limits grandmothers, two of them share the 1/6
+        checker = Checker()
+        compositions = list(enumerate_compositions({'GrandMother': 2, 'Husband': 1, 'Son': 1, 'Sister': 1}))
+        self.assertIn(({'GrandMother': 2, 'Son': 1}, 'M'), compositions)
+        self.assertEqual(checker.check_chunk(compositions), [])
+
+    def test_minimal_mismatch(self):
+        checker = Checker(skewed_compute)
+        self.assertEqual(checker.check({'Daughter': 1, 'Son': 1}, 'M'), [])
+        self.assertEqual(checker.shrink({'Husband': 1, 'Mother': 1, 'Daughter': 3, 'Son': 1}, 'F'), {'Daughter': 2})
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'mismatches.jsonl')
+            with self.assertRaises(CommandError):
+                call_command(
+                    'check_engine', bound=['Husband=1', 'Daughter=2', 'Son=1'], engine='calc.tests.skewed_compute',
+                    processes=1, output=output, stdout=io.StringIO(),
+                )
+            mismatches = [json.loads(line) for line in open(output)]
+        self.assertEqual({mismatch['deceased_sex'] for mismatch in mismatches}, {'M', 'F'})
+        self.assertEqual({json.dumps(mismatch['minimal']) for mismatch in mismatches}, {'{"Daughter": 2}'})
+        self.assertEqual(mismatches[0]['differences'][0][0], 'heirs[0].share')
+        out = io.StringIO()
+        call_command('check_engine', bound=['Husband=1', 'Daughter=1'], processes=1, stdout=out)
+        self.assertIn("0 minimal mismatches", out.getvalue())
+
+class LoadTestTestCase(TestCase):
+
+    def test_journeys(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'load.json')
+            call_command('load_test', journeys=3, concurrency=1, scenario=['parents_son', 'spouse_children'], seed=1, output=output, stderr=io.StringIO())
+            with open(output) as report_file:
+                report = json.load(report_file)
+        self.assertEqual((report['journeys'], report['completed'], report['lock_waits']['errors']), (3, 3, 0))
+        steps = report['steps']
+        self.assertEqual(list(steps)[:2], ['new', 'deceased'])
+        self.assertEqual(list(steps)[-3:], ['detail', 'results', 'delete'])
+        self.assertEqual(steps['results']['requests'], 3)
+        self.assertTrue(all(step['errors'] == 0 and step['p50_ms'] <= step['p95_ms'] <= step['p99_ms'] for step in steps.values()))
+        self.assertGreater(steps['results']['mean_queries'], 0)
+        self.assertFalse(Calculation.objects.exists())
+        self.assertFalse(User.objects.filter(username__startswith='load_test_').exists())
+
+class HeirGroupTestCase(TestCase):
+
+    def setUp(self):
+        user1 = User.objects.create_user('john', 'lennon@thebeatles.com', 'johnpassword')
+        calc1 = Calculation.objects.create(name='calc1', user=user1)
+        Deceased.objects.create(first_name="Deceased", last_name="test", sex="M", estate="6300", calc=calc1)
+        Wife.objects.create(first_name="Wife", last_name="test", sex='F', calc=calc1)
+        for i in range(30):
+            Son.objects.create(first_name=f"Son{i}", last_name="test", sex="M", calc=calc1)
+        for i in range(12):
+            Uncle.objects.create(first_name=f"Uncle{i}", last_name="test", sex="M", calc=calc1)
+
+    def test_engine_groups(self):
+        engine = compute({'Wife': 4, 'Son': 200, 'Daughter': 100, 'Uncle': 50}, deceased_sex='M', estate=8000)
+        self.assertEqual([(heir.kind, heir.count) for heir in engine.heirs], [('Wife', 4), ('Daughter', 100), ('Son', 200), ('Uncle', 50)])
+        son, daughter = engine.filter('Son')[0], engine.filter('Daughter')[0]
+        self.assertEqual(engine.shares_corrected, 4000)
+        self.assertEqual((son.corrected_share, daughter.corrected_share), (14, 7))
+        self.assertEqual(sum(heir.amount * heir.count for heir in engine.filter(blocked=False)), 8000)
+
+    def test_compute_per_type(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        with CaptureQueriesContext(connection) as queries:
+            calc1.compute()
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "calc_heir"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Heir.objects.filter(calc=calc1, amount=Decimal('183.75')).count(), 30)
+        self.assertEqual(Heir.objects.filter(calc=calc1, blocked=True).count(), 12)
+        result = Calculation.objects.select_related('result').get(name="calc1").result
+        self.assertEqual([(group['kind'], group['count']) for group in result.data['groups']], [('Wife', 1), ('Son', 30), ('Uncle', 12)])
+        heirs = result.get_heirs()
+        self.assertEqual([heir.id for heir in heirs], list(calc1.heir_set.order_by('pk').values_list('pk', flat=True)))
+        self.assertEqual((heirs[1].first_name, heirs[1].amount, heirs[1].get_fraction()), ("Son0", Decimal('183.75'), Fraction(7, 8)))
+
+    def test_old_snapshots(self):
+        migration = importlib.import_module('calc.migrations.0028_result_groups')
+        calc1 = Calculation.objects.get(name="calc1")
+        calc1.compute()
+        grouped = Result.objects.get(calc=calc1).data
+        migration.ungroup_heirs(django_apps, None)
+        self.assertEqual(len(Result.objects.get(calc=calc1).data['heirs']), 43)
+        migration.group_heirs(django_apps, None)
+        self.assertEqual(Result.objects.get(calc=calc1).data, grouped)
+
+class FractionFieldTestCase(TestCase):
+
+    def setUp(self):
+        calc1 = Calculation.objects.create(name='calc1')
+        Deceased.objects.create(first_name="Deceased", last_name="test", sex="M", estate="7000", calc=calc1)
+        Mother.objects.create(first_name="Mother", last_name="test", sex='F', calc=calc1)
+        Son.objects.create(first_name="Son", last_name="test", sex="M", calc=calc1)
+        for i in range(2):
+            Daughter.objects.create(first_name=f"Daughter{i}", last_name="test", sex="F", calc=calc1)
+
+    def test_exact_quotes(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        calc1.compute()
+        mother = calc1.heir_set.get(role='Mother')
+        self.assertEqual((mother.quote, mother.quote_numerator, mother.quote_denominator), (Fraction(1, 6), 1, 6))
+        son = calc1.heir_set.get(role='Son')
+        mother.quote = 1/3
+        mother.save()
+        self.assertEqual(Heir.objects.get(pk=mother.pk).quote, Fraction(1, 3))
+        son.quote = Fraction(7, 30000000001)
+        son.save()
+        self.assertEqual(Heir.objects.get(pk=son.pk).quote, Fraction(7, 30000000001))
+
+    def test_quote_lookups(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        calc1.compute()
+        heirs = calc1.heir_set.all()
+        # the residuaries share the remainder, 5/6
+        self.assertEqual(heirs.filter(Heir.quote.gt(0)).count(), 4)
+        self.assertEqual(heirs.filter(Heir.quote.exact(Fraction(5, 6))).count(), 3)
+        self.assertEqual(heirs.filter(Heir.quote.gt(Fraction(1, 6))).count(), 3)
+        self.assertEqual(heirs.filter(Heir.quote.lte(Fraction(1, 6))).count(), 1)
+        self.assertEqual(heirs.filter(Heir.quote.gte(Fraction(1, 6)), Heir.quote.lt(Fraction(5, 6))).count(), 1)
+        self.assertEqual(heirs.filter(Heir.quote.lt(0)).count(), 0)
+
+class ReasonCodeTestCase(TestCase):
+
+    def setUp(self):
+        calc1 = Calculation.objects.create(name='calc1')
+        Deceased.objects.create(first_name="Deceased", last_name="test", sex="M", estate="6000", calc=calc1)
+        Mother.objects.create(first_name="Mother", last_name="test", sex='F', calc=calc1)
+        Son.objects.create(first_name="Son", last_name="test", sex="M", calc=calc1)
+
+    def test_codes_stored(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        with translation.override('ar'):
+            calc1.compute()
+        mother = calc1.heir_set.get(role='Mother')
+        self.assertEqual(REASONS[mother.reason], "mother gets 1/6 because of descendant")
+        group = Result.objects.get(calc=calc1).data['groups'][0]
+        self.assertEqual(group['reason'], mother.reason)
+        with self.assertRaises(ValueError):
+            get_code("la mère obtient 1/6 à cause du descendant")
+
+    def test_render_language(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        calc1.compute()
+        mother = calc1.heir_set.get(role='Mother')
+        heirs = Result.objects.get(calc=calc1).get_heirs()
+        with translation.override('fr'):
+            self.assertEqual(mother.quote_reason, "la mère obtient 1/6 à cause du descendant")
+            self.assertEqual(heirs[0].quote_reason, "la mère obtient 1/6 à cause du descendant")
+        with translation.override('en'):
+            self.assertEqual(mother.quote_reason, "mother gets 1/6 because of descendant")
+            self.assertEqual(heirs[0].quote_reason, "mother gets 1/6 because of descendant")
+
+class HeirLimitsTestCase(TestCase):
+
+    def setUp(self):
+        user1 = User.objects.create_user('john', 'lennon@thebeatles.com', 'johnpassword')
+        calc1 = Calculation.objects.create(name='calc1', user=user1)
+        Deceased.objects.create(first_name="Deceased", last_name="test", sex="M", estate="1000", calc=calc1)
+        calc1.add_mother(Mother.objects.create(first_name="Mother", last_name="test", sex='F', calc=calc1))
+
+    def test_single_heirs(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Mother.objects.create(first_name="Mother2", last_name="test", sex='F', calc=calc1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Deceased.objects.create(first_name="Deceased2", last_name="test", sex="M", estate="1000", calc=calc1)
+        Father.objects.create(first_name="Father", last_name="test", sex='M', calc=calc1)
+        self.assertEqual(calc1.heir_set.count(), 2)
+
+    def test_wife_slots(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        wives = [Wife.objects.create(first_name=f"Wife{i}", last_name="test", sex='F', calc=calc1) for i in range(4)]
+        self.assertEqual([wife.slot for wife in wives], [1, 2, 3, 4])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Wife.objects.create(first_name="Wife5", last_name="test", sex='F', calc=calc1)
+        wives[1].delete()
+        self.assertEqual(Wife.objects.create(first_name="Wife5", last_name="test", sex='F', calc=calc1).slot, 2)
+
+    def test_wife_slot_collision(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        Wife.objects.create(first_name="Wife1", last_name="test", sex='F', calc=calc1)
+        rivals = []
+
+        def submit_in_between(execute, sql, params, many, context):
+            if sql.startswith('SAVEPOINT') and not rivals:
+                # a concurrent submit takes slot 2 after this one read the free slots, before it inserts
+                rivals.append(Wife(first_name="Wife2", last_name="test", sex='F', calc=calc1))
+                rivals[0].save()
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(submit_in_between):
+            wife = Wife.objects.create(first_name="Wife3", last_name="test", sex='F', calc=calc1)
+        self.assertEqual((rivals[0].slot, wife.slot), (2, 3))
+        self.assertEqual(Wife.objects.get(pk=wife.pk).first_name, "Wife3")
+        self.assertEqual(calc1.heir_set.instance_of(Wife).count(), 3)
+        self.assertEqual(Calculation.objects.get(pk=calc1.pk).wife_count, 3)
+
+    def test_views(self):
+        calc1 = Calculation.objects.get(name="calc1")
+        request = RequestFactory().get(reverse("calc:mother", args=[calc1.id]))
+        request.user = calc1.user
+        with CaptureQueriesContext(connection) as queries:
+            response = MotherCreate.as_view()(request, calc_id=calc1.id)
+        # the form is shown, the limit is only checked on submit
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+        c = Client()
+        c.force_login(calc1.user)
+        response = c.post(reverse("calc:mother", args=[calc1.id]), {'first_name': "Mother2", 'last_name': "test"}, secure=True)
+        self.assertRedirects(response, reverse('calc:error'), fetch_redirect_response=False)
+        self.assertEqual(calc1.heir_set.instance_of(Mother).count(), 1)
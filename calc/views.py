@@ -1,4 +1,6 @@
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.shortcuts import get_object_or_404, render
 from django.urls import reverse
 from django.views import generic
@@ -9,16 +11,62 @@ from django.views.generic import View
 from django.contrib import messages
 from user_auth.forms import UserCreationForm
 from django.urls import reverse_lazy
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404
+from django.conf import settings
+from asgiref.sync import sync_to_async
 from calc.forms import HeirForm, DeceasedForm
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
-from django.utils.translation import gettext as _
+from django.utils.translation import gettext as _, gettext_noop
+from django.db import IntegrityError, transaction
 from django.views.generic.base import TemplateView
 from .models import *
+from .engine import parse_composition
+from .cache import get_share_table
+from . import metrics as calc_metrics
 from waffle.mixins import WaffleFlagMixin, WaffleSwitchMixin
 
+import json
 import waffle
 
 
+class HeirGroup(list):
+	"""List of heirs that templates can still call `.count` on"""
+	@property
+	def count(self):
+		return len(self)
+
+def get_heir_context(heirs):
+	"""Partition heirs fetched once, in pk order, into the groups the calc templates use"""
+	by_ctype = sorted(heirs, key=lambda heir: heir.polymorphic_ctype_id)
+	context = {kind: HeirGroup(heir for heir in heirs if heir.kind == kind) for kind in ('Father', 'Mother', 'Wife', 'Husband', 'Daughter', 'Son', 'Brother', 'Sister', 'GrandFather')}
+	context['female_asaba'] = HeirGroup(heir for heir in heirs if heir.asaba and heir.sex == "F")
+	context['asaba'] = HeirGroup(heir for heir in by_ctype if heir.asaba)
+	context['Heirs'] = HeirGroup(heir for heir in by_ctype if not heir.asaba)
+	context['Spouse'] = HeirGroup(heir for heir in heirs if heir.kind in ('Husband', 'Wife'))
+	context['No_Spouse'] = HeirGroup(heir for heir in heirs if heir.kind not in ('Husband', 'Wife'))
+	return context
+
+def get_result_context(result):
+	"""Group the heirs of a Result snapshot the way the results templates use them"""
+	context = get_heir_context(result.get_heirs())
+	context['estate'] = result.get_estate()
+	return context
+
+
+class LimitedCreateMixin:
+	"""Send the submit of an heir past its database enforced limit to the error page with limit_message"""
+	limit_message = None
+
+	def post(self, request, *args, **kwargs):
+		try:
+			with transaction.atomic():
+				return super().post(request, *args, **kwargs)
+		except IntegrityError:
+			messages.error(request, _(self.limit_message))
+			return HttpResponseRedirect(reverse('calc:error'))
+
+
 class HomePage(TemplateView):
 	template_name="calc/home.html"
 
@@ -34,8 +82,9 @@ class Privacy(TemplateView):
 	template_name="calc/privacy.html"
 class About(TemplateView):
 	template_name="calc/about.html"
-class DeceasedCreate(CreateView):
+class DeceasedCreate(LimitedCreateMixin, CreateView):
 	model = Deceased
+	limit_message = gettext_noop("Decease already exist")
 	fields = ['first_name','last_name','sex', 'estate']
 
 	def dispatch(self, request, *args, **kwargs):
@@ -44,9 +93,6 @@ class DeceasedCreate(CreateView):
 		before going any further.
 		"""
 		self.calc = get_object_or_404(Calculation, pk=kwargs['calc_id'])
-		if self.calc.deceased_set.count() >= 1:
-			messages.error(request,_("Decease already exist"))
-			return HttpResponseRedirect(reverse( 'calc:error'))
 		return super().dispatch(request, *args, **kwargs)
 	def form_valid(self, form):
 		"""
@@ -75,8 +121,9 @@ class DeceasedDelete(DeleteView):
 			'calc:detail',
 			 kwargs={'pk': calc.id}
 		)
-class MotherCreate(CreateView):
+class MotherCreate(LimitedCreateMixin, CreateView):
 	model = Mother
+	limit_message = gettext_noop("Mother already exist")
 	fields = ['first_name','last_name']
 	template_name = 'calc/heir_form.html'
 
@@ -86,9 +133,6 @@ class MotherCreate(CreateView):
 		before going any further.
 		"""
 		self.calc = get_object_or_404(Calculation, pk=kwargs['calc_id'])
-		if self.calc.heir_set.instance_of(Mother).count() >= 1:
-			messages.error(request,_("Mother already exist"))
-			return HttpResponseRedirect(reverse( 'calc:error'))
 		return super().dispatch(request, *args, **kwargs)
 
 	def form_valid(self, form):
@@ -102,8 +146,9 @@ class MotherCreate(CreateView):
 		form.instance.calc.add_mother(self.object)
 		return super().form_valid(form)
 
-class FatherCreate(CreateView):
+class FatherCreate(LimitedCreateMixin, CreateView):
 	model = Father
+	limit_message = gettext_noop("Father already exist")
 	fields = ['first_name','last_name']
 	template_name = 'calc/heir_form.html'
 
@@ -113,9 +158,6 @@ class FatherCreate(CreateView):
 		before going any further.
 		"""
 		self.calc = get_object_or_404(Calculation, pk=kwargs['calc_id'])
-		if self.calc.heir_set.instance_of(Father).count() >= 1:
-			messages.error(request,_("Father already exist"))
-			return HttpResponseRedirect(reverse( 'calc:error'))
 		return super().dispatch(request, *args, **kwargs)
 
 	def form_valid(self, form):
@@ -129,8 +171,9 @@ class FatherCreate(CreateView):
 		form.instance.calc.add_father(self.object)
 		return super().form_valid(form)
 
-class HusbandCreate(CreateView):
+class HusbandCreate(LimitedCreateMixin, CreateView):
 	model = Husband
+	limit_message = gettext_noop("Husband already exist")
 	fields = ['first_name','last_name']
 	template_name = 'calc/heir_form.html'
 
@@ -140,9 +183,6 @@ class HusbandCreate(CreateView):
 		before going any further.
 		"""
 		self.calc = get_object_or_404(Calculation, pk=kwargs['calc_id'])
-		if self.calc.heir_set.instance_of(Husband).count() >= 1:
-			messages.error(request,_("Husband already exist"))
-			return HttpResponseRedirect(reverse( 'calc:error'))
 		return super().dispatch(request, *args, **kwargs)
 
 	def form_valid(self, form):
@@ -156,8 +196,9 @@ class HusbandCreate(CreateView):
 		form.instance.calc.add_husband(self.object)
 		return super().form_valid(form)
 
-class WifeCreate(CreateView):
+class WifeCreate(LimitedCreateMixin, CreateView):
 	model = Wife
+	limit_message = gettext_noop("Cann't have more than 4 wifes")
 	fields = ['first_name','last_name']
 	template_name = 'calc/heir_form.html'
 
@@ -167,9 +208,6 @@ class WifeCreate(CreateView):
 		before going any further.
 		"""
 		self.calc = get_object_or_404(Calculation, pk=kwargs['calc_id'])
-		if self.calc.heir_set.instance_of(Wife).count() >= 4:
-			messages.error(request,_("Cann't have more than 4 wifes"))
-			return HttpResponseRedirect(reverse( 'calc:error'))
 		return super().dispatch(request, *args, **kwargs)
 
 	def form_valid(self, form):
@@ -309,8 +347,9 @@ class SisterCreate(WaffleFlagMixin, CreateView):
 		form.instance.calc.add_sister(self.object)
 		return super().form_valid(form)
 
-class GrandFatherCreate(WaffleFlagMixin, CreateView):
+class GrandFatherCreate(WaffleFlagMixin, LimitedCreateMixin, CreateView):
 	model = GrandFather
+	limit_message = gettext_noop("Father already exist")
 	fields = ['first_name','last_name']
 	template_name = 'calc/heir_form.html'
 	waffle_flag = "GrandFather"
@@ -321,9 +360,6 @@ class GrandFatherCreate(WaffleFlagMixin, CreateView):
 		before going any further.
 		"""
 		self.calc = get_object_or_404(Calculation, pk=kwargs['calc_id'])
-		if self.calc.heir_set.instance_of(GrandFather).count() >= 1:
-			messages.error(request,_("Father already exist"))
-			return HttpResponseRedirect(reverse( 'calc:error'))
 		return super().dispatch(request, *args, **kwargs)
 
 	def form_valid(self, form):
@@ -706,16 +742,9 @@ class DetailView(LoginRequired, generic.DetailView):
 
 	def get_context_data(self, **kwargs):
 		context = super().get_context_data(**kwargs)
-		context['Father'] = self.object.heir_set.instance_of(Father)
-		context['Mother'] = self.object.heir_set.instance_of(Mother)
-		context['Wife'] = self.object.heir_set.instance_of(Wife)
-		context['Husband'] = self.object.heir_set.instance_of(Husband)
-		context['Daughter'] = self.object.heir_set.instance_of(Daughter)
-		context['Son'] = self.object.heir_set.instance_of(Son)
-		context['Brother'] = self.object.heir_set.instance_of(Brother)
-		context['Sister'] = self.object.heir_set.instance_of(Sister)
-		context['GrandFather'] = self.object.heir_set.instance_of(GrandFather)
-		context['Heirs'] = self.object.heir_set.order_by('polymorphic_ctype_id')
+		heirs = list(self.object.heir_set.non_polymorphic().order_by('pk'))
+		context.update(get_heir_context(heirs))
+		context['Heirs'] = HeirGroup(sorted(heirs, key=lambda heir: heir.polymorphic_ctype_id))
 		return context
 
 class NewResultsView(WaffleFlagMixin, LoginRequired, generic.DetailView):
@@ -723,22 +752,12 @@ class NewResultsView(WaffleFlagMixin, LoginRequired, generic.DetailView):
 	template_name = 'calc/new_results.html'
 	waffle_flag= "new_results"
 
+	def get_object(self, queryset=None):
+		return self.calc
+
 	def get_context_data(self, **kwargs):
 		context = super().get_context_data(**kwargs)
-		context['Father'] = self.object.heir_set.instance_of(Father)
-		context['Mother'] = self.object.heir_set.instance_of(Mother)
-		context['Wife'] = self.object.heir_set.instance_of(Wife)
-		context['Husband'] = self.object.heir_set.instance_of(Husband)
-		context['Daughter'] = self.object.heir_set.instance_of(Daughter)
-		context['Son'] = self.object.heir_set.instance_of(Son)
-		context['Brother'] = self.object.heir_set.instance_of(Brother)
-		context['Sister'] = self.object.heir_set.instance_of(Sister)
-		context['GrandFather'] = self.object.heir_set.instance_of(GrandFather)
-		context['female_asaba'] = self.object.heir_set.filter(asaba=True,sex="F")
-		context['asaba'] = self.object.heir_set.filter(asaba=True).order_by('polymorphic_ctype_id')
-		context['Heirs'] = self.object.heir_set.filter(asaba=False).order_by('polymorphic_ctype_id')
-		context['Spouse'] = self.object.heir_set.instance_of(Husband, Wife)
-		context['No_Spouse'] = self.object.heir_set.not_instance_of(Husband, Wife)
+		context.update(get_result_context(self.object.result))
 		return context
 
 	def dispatch(self, request, *args, **kwargs):
@@ -746,30 +765,20 @@ class NewResultsView(WaffleFlagMixin, LoginRequired, generic.DetailView):
 		Overridden so we can make sure the `calc` instance exists
 		before going any further.
 		"""
-		self.calc = get_object_or_404(Calculation, pk=kwargs['pk'])
-		self.calc.compute()
+		self.calc = get_object_or_404(Calculation.objects.select_related('result'), pk=kwargs['pk'])
+		self.calc.compute_if_stale()
 		return super().dispatch(request, *args, **kwargs)
 
 class ResultsView(LoginRequired, generic.DetailView):
 	model = Calculation
 	template_name = 'calc/results.html'
 
+	def get_object(self, queryset=None):
+		return self.calc
+
 	def get_context_data(self, **kwargs):
 		context = super().get_context_data(**kwargs)
-		context['Father'] = self.object.heir_set.instance_of(Father)
-		context['Mother'] = self.object.heir_set.instance_of(Mother)
-		context['Wife'] = self.object.heir_set.instance_of(Wife)
-		context['Husband'] = self.object.heir_set.instance_of(Husband)
-		context['Daughter'] = self.object.heir_set.instance_of(Daughter)
-		context['Son'] = self.object.heir_set.instance_of(Son)
-		context['Brother'] = self.object.heir_set.instance_of(Brother)
-		context['Sister'] = self.object.heir_set.instance_of(Sister)
-		context['GrandFather'] = self.object.heir_set.instance_of(GrandFather)
-		context['female_asaba'] = self.object.heir_set.filter(asaba=True,sex="F")
-		context['asaba'] = self.object.heir_set.filter(asaba=True).order_by('polymorphic_ctype_id')
-		context['Heirs'] = self.object.heir_set.filter(asaba=False).order_by('polymorphic_ctype_id')
-		context['Spouse'] = self.object.heir_set.instance_of(Husband, Wife)
-		context['No_Spouse'] = self.object.heir_set.not_instance_of(Husband, Wife)
+		context.update(get_result_context(self.object.result))
 		return context
 
 	def dispatch(self, request, *args, **kwargs):
@@ -777,8 +786,8 @@ class ResultsView(LoginRequired, generic.DetailView):
 		Overridden so we can make sure the `calc` instance exists
 		before going any further.
 		"""
-		self.calc = get_object_or_404(Calculation, pk=kwargs['pk'])
-		self.calc.compute()
+		self.calc = get_object_or_404(Calculation.objects.select_related('result'), pk=kwargs['pk'])
+		self.calc.compute_if_stale()
 		return super().dispatch(request, *args, **kwargs)
 
 class CalculationUpdate(UpdateView):
@@ -818,7 +827,107 @@ def delete(request, pk):
 def error(request):
 	return render(request, 'calc/error.html')
 
+def get_api_result(data, order=None):
+	"""Result of a composition given as plain data, computed without touching the database"""
+	composition, deceased_sex, estate = parse_composition(data)
+	result = get_share_table(composition, deceased_sex, order or heir_order()).as_dict(composition, estate)
+	for heir in result['heirs']:
+		heir['reason'] = _(heir['reason'])
+	result['deceased_sex'] = deceased_sex
+	result['estate'] = estate
+	return result
+
+def metrics(request):
+	"""Prometheus metrics, only for the addresses in CALC_METRICS_IPS"""
+	if request.META.get('REMOTE_ADDR') not in settings.CALC_METRICS_IPS:
+		raise Http404
+	content, content_type = calc_metrics.render()
+	return HttpResponse(content, content_type=content_type)
+
+@csrf_exempt
+@require_POST
+def api_compute(request):
+	try:
+		return JsonResponse(get_api_result(json.loads(request.body)))
+	except ValueError as e:
+		return JsonResponse({'error': str(e)}, status=400)
+
+def get_api_line(number, line, order=None):
+	"""JSON line of the result of a batch input line, an error line when it is bad"""
+	try:
+		result = get_api_result(json.loads(line), order)
+	except ValueError as e:
+		result = {'error': str(e)}
+	result['line'] = number
+	return json.dumps(result) + '\n'
+
+def stream_api_results(lines):
+	"""One JSON line per non empty input line, bad lines give an error line and the batch goes on"""
+	for number, line in enumerate(lines, 1):
+		if line.strip():
+			yield get_api_line(number, line)
+
+@csrf_exempt
+@require_POST
+def api_compute_batch(request):
+	# the request is read line by line as the response is consumed
+	return StreamingHttpResponse(stream_api_results(request), content_type='application/x-ndjson')
+
 class SignUp(generic.CreateView):
 	form_class = UserCreationForm
 	success_url = reverse_lazy('login')
 	template_name = 'registration/signup.html'
+
+
+# Async versions of the compute, batch and results views, routed instead of the sync
+# ones when CALC_ASYNC_VIEWS is set (mawareeth.asgi sets it). Queries and
+# template rendering run in a thread through sync_to_async, the computation
+# itself runs on the event loop.
+
+@csrf_exempt
+@require_POST
+async def api_compute_async(request):
+	try:
+		data = json.loads(request.body)
+		# only reads the content types, the shared pool saves starting a thread per request
+		order = await sync_to_async(heir_order, thread_sensitive=False)()
+		return JsonResponse(get_api_result(data, order))
+	except ValueError as e:
+		return JsonResponse({'error': str(e)}, status=400)
+
+async def stream_api_results_async(lines, order):
+	"""stream_api_results() as an async generator, the ASGI handler sends each line as it is computed"""
+	for number, line in enumerate(lines, 1):
+		if line.strip():
+			yield get_api_line(number, line, order)
+
+@csrf_exempt
+@require_POST
+async def api_compute_batch_async(request):
+	order = await sync_to_async(heir_order, thread_sensitive=False)()
+	# the ASGI handler has spooled the body, it is read line by line as the response is sent
+	return StreamingHttpResponse(stream_api_results_async(request, order), content_type='application/x-ndjson')
+
+def load_results(request, pk, waffle_flag=None):
+	"""Check access and return the calculation with an up to date Result, None if the user isn't logged in"""
+	if waffle_flag and not waffle.flag_is_active(request, waffle_flag):
+		raise Http404
+	if not request.user.is_authenticated:
+		return None
+	calc = get_object_or_404(Calculation.objects.select_related('result'), pk=pk)
+	calc.compute_if_stale()
+	return calc
+
+async def render_results(request, pk, template_name, waffle_flag=None):
+	calc = await sync_to_async(load_results)(request, pk, waffle_flag)
+	if calc is None:
+		return redirect_to_login(request.get_full_path())
+	context = get_result_context(calc.result)
+	context.update(object=calc, calculation=calc)
+	return await sync_to_async(render)(request, template_name, context)
+
+async def results_async(request, pk):
+	return await render_results(request, pk, 'calc/results.html')
+
+async def new_results_async(request, pk):
+	return await render_results(request, pk, 'calc/new_results.html', waffle_flag="new_results")
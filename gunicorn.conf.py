@@ -0,0 +1,23 @@
+"""
+gunicorn settings, read from the working directory by the Procfile command.
+
+The workers keep their Prometheus metrics in files of one shared directory
+so /metrics/ reports the whole dyno, see calc.metrics.
+"""
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'mawareeth-metrics'))
+
+
+def on_starting(server):
+    # metric files of an earlier run would be added to this one
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
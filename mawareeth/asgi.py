@@ -2,6 +2,10 @@
 ASGI config for mawareeth project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The configured middleware is used as is. WhiteNoise, added first by
+django_heroku, is sync only, so Django calls it in a thread per request that
+waits while the rest of the chain and the async views run on the event loop,
+the views' sync_to_async calls run in that thread.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
@@ -12,5 +16,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mawareeth.settings')
+os.environ.setdefault('CALC_ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
@@ -13,7 +13,7 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 import os
 import django_heroku
 from django.utils.translation import gettext_lazy as _
-from decouple import config
+from decouple import Csv, config
 
 
 
@@ -57,6 +57,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'calc.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
@@ -67,6 +68,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'social_django.middleware.SocialAuthExceptionMiddleware',
     'waffle.middleware.WaffleMiddleware',
+    'calc.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'mawareeth.urls'
@@ -172,6 +174,8 @@ SERVER_EMAIL = "notifications@mawareeth.com"
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
 SECURE_SSL_REDIRECT = config("SSL_REDIRECT",default=True, cast=bool)
+# scraped over plain http from the same host
+SECURE_REDIRECT_EXEMPT = [r'^metrics/$']
 
 SESSION_COOKIE_SECURE = config("SESSION_COOKIE",default=True, cast=bool)
 
@@ -231,3 +235,18 @@ SOCIAL_AUTH_PIPELINE = (
 WAFFLE_CREATE_MISSING_FLAGS = True
 WAFFLE_CREATE_MISSING_SWITCHES = True
 WAFFLE_CREATE_MISSING_SAMPLES = True
+
+# Results of calculations with the same composition of heirs are shared
+CALC_RESULT_CACHE_SIZE = config("CALC_RESULT_CACHE_SIZE",default=4096, cast=int)
+CALC_RESULT_CACHE_TTL = config("CALC_RESULT_CACHE_TTL",default=3600, cast=int)
+# Built with `python manage.py build_lookup_table`, empty to always use the engine
+CALC_LOOKUP_TABLE = config("CALC_LOOKUP_TABLE",default="")
+# Route the compute API and the results pages to async views, set by mawareeth.asgi
+CALC_ASYNC_VIEWS = config("CALC_ASYNC_VIEWS",default=False, cast=bool)
+# Time every phase of Calculation.compute() into the calc.instrumentation log and the results pages
+CALC_INSTRUMENT = config("CALC_INSTRUMENT",default=False, cast=bool)
+# Profiles of requests with the profile_requests waffle flag active, see calc.middleware
+CALC_PROFILE_DIR = config("CALC_PROFILE_DIR",default=os.path.join(BASE_DIR, 'profiles'))
+CALC_PROFILE_ALLOCATIONS = config("CALC_PROFILE_ALLOCATIONS",default=25, cast=int)
+# Addresses allowed to scrape /metrics/, see calc.metrics
+CALC_METRICS_IPS = config("CALC_METRICS_IPS",default="127.0.0.1,::1", cast=Csv())
@@ -13,18 +13,33 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.conf.urls.i18n import i18n_patterns
 from django.contrib import admin
 from django.urls import include, path
 from calc import views as calc_views
 from user_auth import views as user_auth_views
 
+if settings.CALC_ASYNC_VIEWS:
+    api_compute = calc_views.api_compute_async
+    api_compute_batch = calc_views.api_compute_batch_async
+    results = calc_views.results_async
+    new_results = calc_views.new_results_async
+else:
+    api_compute = calc_views.api_compute
+    api_compute_batch = calc_views.api_compute_batch
+    results = calc_views.ResultsView.as_view()
+    new_results = calc_views.NewResultsView.as_view()
+
 urlpatterns = [
     #path('admin/', admin.site.urls),
     #path('calc/', include('calc.urls')),
     path('i18n/', include('django.conf.urls.i18n')),
     path('accounts/', include('django.contrib.auth.urls')),
     path('social-auth/', include('social_django.urls', namespace="social")),
+    path('api/compute/', api_compute, name='api_compute'),
+    path('api/compute/batch/', api_compute_batch, name='api_compute_batch'),
+    path('metrics/', calc_views.metrics, name='metrics'),
 
 ]
 
@@ -65,8 +80,8 @@ calc_patterns = ([
 	path('<int:calc_id>/paternalUncle', calc_views.PaternalUncleCreate.as_view(), name='paternalUncle'),
 	path('<int:calc_id>/sonOfUncle', calc_views.SonOfUncleCreate.as_view(), name='sonOfUncle'),
 	path('<int:calc_id>/sonOfPaternalUncle', calc_views.SonOfPaternalUncleCreate.as_view(), name='sonOfPaternalUncle'),
-    path('<int:pk>/results/', calc_views.ResultsView.as_view(), name='results'),
-    path('<int:pk>/new-results/', calc_views.NewResultsView.as_view(), name='new_results'),
+    path('<int:pk>/results/', results, name='results'),
+    path('<int:pk>/new-results/', new_results, name='new_results'),
     path('error/', calc_views.error, name='error'),
     path('signup/', calc_views.SignUp.as_view(), name='signup'),
 